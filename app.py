@@ -1,17 +1,51 @@
 #!/usr/bin/env python3
-import re, logging
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import os, re, logging, html, json, time, asyncio
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context, send_file, abort
 from datetime import datetime
-from scraper import extract_book_id, fetch_latest_chapter_webnovel, update_online_chapters_for_all, get_epub_metadata, extract_local_chap
-from db import get_db_conn, get_settings_dict, save_setting, get_db_files, get_epub_files, get_cover_files
+from scraper import get_epub_metadata, extract_local_chap, import_epubs
+from sources import source_for
+from db import get_db_conn, release_db_conn, update_novel, get_settings_dict, get_state, save_settings, get_db_files, get_epub_files, get_cover_files
+from jobs import submit_job, get_job, start_worker
+from scheduler import start_refresher
+from covers import cover_file
+from duplicates import refresh_duplicates, duplicate_report, REPORT_SCORE
+from backup import export_chunks, import_stream, FORMATS, MIMETYPES
+from metrics import begin_request, end_request, render_metrics, start_flusher
 app = Flask(__name__)
 app.secret_key = "supersecretkey12"  # for flash notifications
 
+# Hand the thread's pooled DB connection back, dropping anything left uncommitted
+@app.teardown_request
+def release_db(exc):
+  release_db_conn()
+
+# Every worker process runs queued background jobs, including ones left from before a restart,
+# takes part in the periodic refresh of the novels that are due and flushes its /metrics counts
+@app.before_request
+def ensure_job_worker():
+  start_worker()
+  start_refresher()
+  start_flusher()
+
+# Per-request timing: latency histograms for /metrics and a Server-Timing header
+# splitting the time into sql, epub, http and throttle (the politeness sleep)
+@app.before_request
+def start_request_timer():
+  begin_request()
+
+@app.after_request
+def add_server_timing(resp):
+  route = request.url_rule.rule if request.url_rule else "unmatched"
+  timing = end_request(route, request.method, resp.status_code)
+  if timing:
+    resp.headers["Server-Timing"] = timing
+  return resp
+
 # Regular expression for the expected date format '%Y-%m-%d %H:%M:%S.%f'
 DATE_FORMAT_REGEX = r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{1,}$'
 
 # Remove some logs from repated spam of the log stream
-SPAM_PATHS = ["/status", "/ping", "/health", "/static/img/cover"]
+SPAM_PATHS = ["/status", "/ping", "/health", "/static/img/cover", "/cover/", "/metrics"]
 
 class log_SpamFilter(logging.Filter):
   def filter(self, record):
@@ -48,49 +82,410 @@ def time_difference(latest_time_str):
 
 @app.route('/')
 def index():
+  # The table loads its rows from /api/novels, the page only needs the bounds for the bulk update form
   conn = get_db_conn()
-  cur = conn.cursor()
-  cur.execute("SELECT id, name, url, localchap, onlinechap, latestchaptime, status, source, notes, filepath FROM novels ORDER BY id")
-  novels = cur.fetchall()
+  max_id, novel_count = conn.execute("SELECT MAX(id), COUNT(*) FROM novels").fetchone()
   conn.close()
-  settings_dict = get_settings_dict()
-  return render_template('index.html', novels=novels, settings=settings_dict)
+  # Last bulk time and resume id change with every run, read them fresh
+  settings_dict = {**get_settings_dict(), **get_state()}
+  return render_template('index.html', max_id=max_id or 0, novel_count=novel_count, settings=settings_dict)
+
+# Whole days since the newest chapter, like time_difference(): at least "1", "" without a time
+TIMEAGO_SQL = """
+  CASE
+    WHEN latestchaptime IS NULL OR latestchaptime = '' THEN ''
+    WHEN latestchap_day IS NULL THEN 'Invalid date format'
+    ELSE CAST(MAX(1, CAST(julianday('now', 'localtime') - latestchap_day AS INTEGER)) AS TEXT)
+  END
+"""
+
+# Content hash of the novel's processed cover, sent as ?v= so the cover URL changes with the image
+COVER_VERSION_SQL = "(SELECT hash FROM covers WHERE covers.cover_id = novels.cover_path AND covers.failed = 0)"
+
+NOVEL_FIELDS = f"id, name, url, localchap, onlinechap, latestchaptime, status, source, notes, filepath, epub_exists, author, cover_path, chapter_gap, {TIMEAGO_SQL}, {COVER_VERSION_SQL}"
+
+# DataTables column name -> (SQL expression, reversed order). Only these can be sorted or searched on.
+NOVEL_COLUMNS = {
+  "id": ("id", False),
+  "name": ("name", False),
+  "localchap": ("localchap", False),
+  "onlinechap": ("onlinechap", False),
+  "diff": ("chapter_gap", False),
+  "timeago": ("latestchap_day", True),  # fewer days ago = later time
+  "source": ("source", False),
+  "status": ("status", False),
+  "notes": ("notes", False),
+  "author": ("author", False),
+}
+
+# novels_fts columns matched by the global search box, through the full-text index
+# instead of a LIKE scan. Source and status have their own column filters.
+SEARCH_COLUMNS = ("name", "author", "notes")
+
+def novel_row_dict(r):
+  # diff and timeago come precomputed from SQL, see NOVEL_FIELDS
+  return {
+    "id": r[0],
+    "name": r[1],
+    "url": r[2],
+    "localchap": r[3],
+    "onlinechap": r[4],
+    "latestchaptime": r[5],
+    "diff": r[13],
+    "timeago": r[14],
+    "status": r[6],
+    "source": r[7],
+    "notes": r[8],
+    "filepath": r[9],
+    "epubexists": r[10],
+    "author": r[11],
+    "cover_path": r[12],
+    "cover_version": r[15]
+  }
+
+def like_escape(value):
+  return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def column_filter_sql(expr, logic, value):
+  """SQL for one ColumnControl / SearchBuilder condition, or None if unsupported."""
+  like = {
+    "contains": "%{}%", "notContains": "%{}%", "starts": "{}%", "notStarts": "{}%", "ends": "%{}", "notEnds": "%{}",
+  }
+  if logic in like:
+    neg = "NOT " if logic.startswith("not") else ""
+    return f"{expr} {neg}LIKE ? ESCAPE '\\'", [like[logic].format(like_escape(value))]
+  ops = {"equal": "=", "notEqual": "!=", "greater": ">", "greaterOrEqual": ">=", "less": "<", "lessOrEqual": "<="}
+  if logic in ops:
+    return f"{expr} {ops[logic]} ?", [value]
+  if logic == "empty":
+    return f"({expr} IS NULL OR {expr} = '')", []
+  if logic == "notEmpty":
+    return f"({expr} IS NOT NULL AND {expr} != '')", []
+  return None
+
+# SearchBuilder condition -> ColumnControl logic name, so both share column_filter_sql
+SEARCHBUILDER_LOGIC = {
+  "=": "equal", "!=": "notEqual", "<": "less", "<=": "lessOrEqual", ">": "greater", ">=": "greaterOrEqual",
+  "contains": "contains", "!contains": "notContains", "starts": "starts", "!starts": "notStarts",
+  "ends": "ends", "!ends": "notEnds", "null": "empty", "!null": "notEmpty",
+}
+
+def searchbuilder_sql(group):
+  """Turns a SearchBuilder criteria group into (sql, params), skipping conditions it can't map."""
+  parts, params = [], []
+  for crit in group.get("criteria") or []:
+    if "criteria" in crit:
+      sql, p = searchbuilder_sql(crit)
+    else:
+      column = NOVEL_COLUMNS.get(crit.get("origData") or "")
+      values = crit.get("value") or []
+      cond = crit.get("condition")
+      if column is None:
+        continue
+      if cond in ("between", "!between") and len(values) == 2:
+        neg = "NOT " if cond.startswith("!") else ""
+        sql, p = f"{column[0]} {neg}BETWEEN ? AND ?", list(values)
+      elif cond in SEARCHBUILDER_LOGIC:
+        found = column_filter_sql(column[0], SEARCHBUILDER_LOGIC[cond], values[0] if values else "")
+        if found is None:
+          continue
+        sql, p = found
+      else:
+        continue
+    if sql:
+      parts.append(f"({sql})")
+      params.extend(p)
+  joiner = " OR " if group.get("logic") == "OR" else " AND "
+  return joiner.join(parts), params
+
+def int_param(value, default):
+  """A JSON request value as int, default when it is missing or not a number."""
+  try:
+    return int(value)
+  except (TypeError, ValueError):
+    return default
+
+def datatables_query(args):
+  """
+  Builds the SQL for a DataTables serverSide request:
+  global search, per column ColumnControl search, SearchBuilder, ordering and paging.
+
+  Returns:
+  tuple: (where_sql, where_params, order_sql, limit_sql, limit_params)
+  """
+  columns = args.get("columns") or []
+  where, params = [], []
+
+  term = ((args.get("search") or {}).get("value") or "").strip()
+  match = fts_query(term, SEARCH_COLUMNS) if term else ""
+  if match:
+    where.append("id IN (SELECT rowid FROM novels_fts WHERE novels_fts MATCH ?)")
+    params.append(match)
+
+  for col in columns:
+    column = NOVEL_COLUMNS.get(col.get("name") or col.get("data") or "")
+    search = ((col.get("columnControl") or {}).get("search") or {})
+    if column is None or not (search.get("value") or search.get("logic") in ("empty", "notEmpty")):
+      continue
+    found = column_filter_sql(column[0], search.get("logic") or "contains", search.get("value") or "")
+    if found:
+      where.append(found[0])
+      params.extend(found[1])
+
+  if args.get("searchBuilder"):
+    sql, p = searchbuilder_sql(args["searchBuilder"])
+    if sql:
+      where.append(f"({sql})")
+      params.extend(p)
+
+  order = []
+  for o in args.get("order") or []:
+    try:
+      col = columns[int(o.get("column"))]
+    except (IndexError, TypeError, ValueError):
+      continue
+    column = NOVEL_COLUMNS.get(col.get("name") or col.get("data") or "")
+    if column is None:
+      continue
+    desc = (o.get("dir") == "desc") != column[1]
+    order.append(f"{column[0]} {'DESC' if desc else 'ASC'}")
+  order.append("id")
+
+  start = max(int_param(args.get("start"), 0), 0)
+  length = int_param(args.get("length"), 20)
+  limit_sql, limit_params = ("LIMIT ? OFFSET ?", [length, start]) if length > 0 else ("", [])
+
+  where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+  return where_sql, params, f"ORDER BY {', '.join(order)}", limit_sql, limit_params
+
+def novels_version(conn):
+  """Table-wide change counter of novels, bumped by the novels_sync_* triggers."""
+  row = conn.execute("SELECT value FROM change_counter WHERE name='novels'").fetchone()
+  return row[0] if row else 0
+
+def not_modified(etag):
+  """A 304 response if the client already holds etag, else None."""
+  if request.if_none_match.contains(etag):
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    return resp
+  return None
+
+def with_etag(resp, etag):
+  resp.set_etag(etag)
+  resp.headers["Cache-Control"] = "no-cache"  # always revalidate, a 304 is cheap
+  return resp
 
 # Add this API endpoint to return JSON data for DataTables
-@app.route('/api/novels')
+@app.route('/api/novels', methods=['GET', 'POST'])
 def api_novels():
+  """
+  Novels as JSON, with the change counter as "version" and ETag.
+
+  POST with a DataTables "draw" returns one serverSide page, GET the full list.
+  GET ?since=<version> only returns the rows changed since that version and
+  the ids deleted since, so a client can patch its table instead of reloading.
+  GET answers carry an ETag and are 304 while nothing changed.
+  """
   conn = get_db_conn()
   cur = conn.cursor()
-  cur.execute("SELECT id, name, url, localchap, onlinechap, latestchaptime, status, source, notes, filepath, epub_exists, author, description, cover_path FROM novels ORDER BY name")
+  version = novels_version(conn)
+
+  # DataTables serverSide mode POSTs its state as JSON and gets one page back
+  args = request.get_json(silent=True) if request.method == 'POST' else None
+  if args and "draw" in args:
+    draw = int_param(args["draw"], None)
+    if draw is None:
+      conn.close()
+      return jsonify({"status": "error", "message": "draw must be a number"}), 400
+    where_sql, where_params, order_sql, limit_sql, limit_params = datatables_query(args)
+    total = cur.execute("SELECT COUNT(*) FROM novels").fetchone()[0]
+    filtered = cur.execute(f"SELECT COUNT(*) FROM novels {where_sql}", where_params).fetchone()[0] if where_sql else total
+    cur.execute(f"SELECT {NOVEL_FIELDS} FROM novels {where_sql} {order_sql} {limit_sql}", where_params + limit_params)
+    rows = cur.fetchall()
+    conn.close()
+    return jsonify({
+      "draw": draw,
+      "recordsTotal": total,
+      "recordsFiltered": filtered,
+      "version": version,
+      "data": [novel_row_dict(r) for r in rows]
+    })
+
+  # timeago is relative to today, so the tag changes with the date as well
+  since = request.args.get("since", type=int)
+  etag = f"novels-{version}-{datetime.now():%Y%m%d}" + ("" if since is None else f"-since-{since}")
+  cached = not_modified(etag)
+  if cached:
+    conn.close()
+    return cached
+
+  if since is not None:
+    changed = cur.execute(f"""
+      SELECT {NOVEL_FIELDS} FROM novels WHERE id IN (
+        SELECT novel_id FROM novels_sync WHERE version > ? AND deleted = 0
+      ) ORDER BY id
+    """, (since,)).fetchall()
+    deleted = [r[0] for r in cur.execute("SELECT novel_id FROM novels_sync WHERE version > ? AND deleted = 1", (since,))]
+    conn.close()
+    return with_etag(jsonify({
+      "version": version,
+      "since": since,
+      "data": [novel_row_dict(r) for r in changed],
+      "deleted": deleted
+    }), etag)
+
+  cur.execute(f"SELECT {NOVEL_FIELDS}, description FROM novels ORDER BY name")
   rows = cur.fetchall()
   conn.close()
 
-  # Map rows into dicts for JSON. Use the existing time_difference filter to provide a human-friendly column
   novels = []
   for r in rows:
-    novels.append({
-      "id": r[0],
-      "name": r[1],
-      "url": r[2],
-      "localchap": r[3],
-      "onlinechap": r[4],
-      "latestchaptime": r[5],
-      "timeago": time_difference(r[5]) if r[5] else "",
-      "status": r[6],
-      "source": r[7],
-      "notes": r[8],
-      "filepath": r[9],
-      "epubexists": r[10],
-      "author": r[11],
-      "description": r[12],
-      "cover_path": r[13]
-    })
+    row = novel_row_dict(r)
+    row["description"] = r[16]
+    novels.append(row)
 
   # Return wrapped in "data" because the DataTable below uses dataSrc: "data"
-  return jsonify({"data": novels})
+  return with_etag(jsonify({"version": version, "data": novels}), etag)
+
+def report_limit():
+  return min(max(request.args.get("limit", 50, type=int), 1), 1000)
+
+@app.route('/api/novels/unread')
+def api_novels_unread():
+  """Novels with the most unread chapters (online - local) first, ?limit=50."""
+  conn = get_db_conn()
+  rows = conn.execute(f"""
+    SELECT {NOVEL_FIELDS} FROM novels WHERE chapter_gap > 0 ORDER BY chapter_gap DESC LIMIT ?
+  """, (report_limit(),)).fetchall()
+  conn.close()
+  return jsonify({"data": [novel_row_dict(r) for r in rows]})
+
+@app.route('/api/novels/stale')
+def api_novels_stale():
+  """Novels without a new chapter for more than ?days=90, longest quiet first, ?limit=50."""
+  days = request.args.get("days", 90, type=float)
+  conn = get_db_conn()
+  rows = conn.execute(f"""
+    SELECT {NOVEL_FIELDS} FROM novels
+    WHERE latestchap_day < julianday('now', 'localtime') - ? ORDER BY latestchap_day LIMIT ?
+  """, (days, report_limit())).fetchall()
+  conn.close()
+  return jsonify({"days": days, "data": [novel_row_dict(r) for r in rows]})
+
+@app.route('/api/duplicates')
+def api_duplicates():
+  """
+  Novels that are probably in the library twice, best match first.
+  ?min_score=88 (80-100), ?limit=500. Novels changed since the last call are rescored first.
+  """
+  rescored = refresh_duplicates()
+  pairs = duplicate_report(request.args.get("min_score", REPORT_SCORE, type=int),
+                           min(max(request.args.get("limit", 500, type=int), 1), 5000))
+  return jsonify({"rescored": rescored, "total": len(pairs), "data": pairs})
+
+@app.route('/api/novels/<int:id>/history')
+def api_novel_history(id):
+  """Recorded changes of one novel, oldest first; ?field=onlinechap for just one field."""
+  field = request.args.get("field")
+  conn = get_db_conn()
+  if field:
+    rows = conn.execute("""
+      SELECT field, old_value, new_value, changed_at FROM novel_changes
+      WHERE novel_id=? AND field=? ORDER BY changed_at
+    """, (id, field)).fetchall()
+  else:
+    rows = conn.execute("""
+      SELECT field, old_value, new_value, changed_at FROM novel_changes
+      WHERE novel_id=? ORDER BY id
+    """, (id,)).fetchall()
+  conn.close()
+  return jsonify({"id": id, "data": [
+    {"field": r[0], "old": r[1], "new": r[2], "changed_at": r[3]} for r in rows
+  ]})
+
+@app.route('/api/novels/<int:id>/details')
+def api_novel_details(id):
+  """Large fields left out of the table rows, fetched by the hover popup."""
+  conn = get_db_conn()
+  row = conn.execute("SELECT author, description, cover_path FROM novels WHERE id=?", (id,)).fetchone()
+  conn.close()
+  if row is None:
+    return jsonify({"status": "error", "message": "Novel not found"}), 404
+  return jsonify({"id": id, "author": row[0], "description": row[1], "cover_path": row[2]})
+
+# Columns of novels_fts, usable as "author:smith" in /api/search queries
+FTS_COLUMNS = ("name", "author", "description", "notes", "tags")
+
+def fts_query(text, columns=None):
+  """
+  Turns free text into an FTS5 MATCH expression: every word becomes a quoted
+  prefix term ("drag" matches "dragon") and all of them must match.
+  "column:word" limits a word to one column, the other words are matched
+  in columns (default all of FTS_COLUMNS).
+  """
+  anywhere = f"{{{' '.join(columns)}}} : " if columns else ""
+  terms = []
+  for column, word in re.findall(r'(?:(\w+):)?([^\s:]+)', text):
+    if column and column not in FTS_COLUMNS:
+      word, column = f"{column} {word}", ""
+    for part in re.findall(r'\w+', word):
+      terms.append(f'{column} : "{part}"*' if column else f'{anywhere}"{part}"*')
+  return " ".join(terms)
+
+@app.route('/api/search')
+def api_search():
+  """Ranked full-text search over name, author, description, notes and tags."""
+  q = request.args.get("q", "").strip()
+  limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+  match = fts_query(q)
+  if not match:
+    return jsonify({"query": q, "total": 0, "results": []})
+
+  conn = get_db_conn()
+  # bm25 weights follow FTS_COLUMNS: a hit in the name counts most, description least
+  rows = conn.execute("""
+    SELECT n.id, n.name, n.author, n.source, n.status, n.localchap, n.onlinechap,
+           snippet(novels_fts, -1, char(1), char(2), '…', 12),
+           bm25(novels_fts, 10.0, 5.0, 1.0, 2.0, 3.0) AS rank
+    FROM novels_fts JOIN novels n ON n.id = novels_fts.rowid
+    WHERE novels_fts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+  """, (match, limit)).fetchall()
+  conn.close()
+
+  results = [{
+    "id": r[0],
+    "name": r[1],
+    "author": r[2],
+    "source": r[3],
+    "status": r[4],
+    "localchap": r[5],
+    "onlinechap": r[6],
+    "snippet": html.escape(r[7] or "").replace("\x01", "<mark>").replace("\x02", "</mark>"),
+    "rank": r[8]
+  } for r in rows]
+  return jsonify({"query": q, "total": len(results), "results": results})
+
+# /add, /import-epub, /get-from-epub and /update/<id> are async views: the politeness
+# delay and the source's answer are awaited (SourceAdapter.fetch_async), and SQLite
+# and EPUB work runs in worker threads through asyncio.to_thread, so a view waiting
+# on the network never blocks its event loop, and /update/<id> and
+# /get-from-epub?get=all read the EPUB while the request is out.
+
+def insert_novel(values):
+  conn = get_db_conn()
+  cur = conn.cursor()
+  cur.execute("""
+    INSERT INTO novels (name, url, source, localchap, onlinechap, status, notes, latestchaptime, author, description)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+  """, values)
+  conn.commit()
+  conn.close()
 
 @app.route('/add', methods=['POST'])
-def add():
+async def add():
   message = []
   status = "success"
   try:
@@ -100,32 +495,27 @@ def add():
     source = request.form.get("source", "").strip().lower()
     local_chap = request.form.get("localchap", 0)
     online_chap = request.form.get("onlinechap", 0)
-    status = request.form.get("status", "").strip()
+    novel_status = request.form.get("status", "").strip()
     notes = request.form.get("notes", "").strip()
 
     # --- Validate required fields ---
     if not name or not url or not source:
       message.append("Missing required fields")
 
-    latest_chap_time = None
+    latest_chap_time = author = desc = None
 
-    # --- Auto-fetch online chapter if source is webnovel ---
-    if source == "webnovel":
-      book_id = extract_book_id(url)
+    # --- Auto-fetch online chapter if the source has an adapter ---
+    adapter = source_for(source, url)
+    if adapter:
+      book_id = adapter.book_id(url)
       if book_id:
-        online_chap, latest_chap_time, author, desc, imgurl = fetch_latest_chapter_webnovel(book_id)
+        online_chap, latest_chap_time, author, desc = await adapter.fetch_async(book_id)
       else:
-        message.append("Invalid Webnovel URL / Book ID")
+        message.append(f"Invalid {adapter.name} URL / Book ID")
 
     # --- Insert into database ---
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("""
-      INSERT INTO novels (name, url, source, localchap, onlinechap, status, notes, latestchaptime, author, description, cover_path)
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (name, url, source, local_chap, online_chap, status, notes, latest_chap_time, author, desc, imgurl))
-    conn.commit()
-    conn.close()
+    await asyncio.to_thread(insert_novel, (name, url, source, local_chap, online_chap, novel_status, notes,
+                                           latest_chap_time, author, desc))
 
     message.append(f"✅ Novel '{name}' added successfully")
 
@@ -135,40 +525,19 @@ def add():
   return jsonify({ "message": "\n".join(message), "status": status})
 
 @app.route('/import-epub', methods=['POST'])
-def import_epub():
+async def import_epub():
   try:
     data = request.get_json(force=True)
     filename = data.get("filename")
 
-    meta = get_epub_metadata(filename)
-    name = meta.get("title", "Unknown Title")
-    url = meta.get("source_url", "")
-    source = meta.get("source", "local")
-    local_chap = extract_local_chap(filename)
-    online_chap, latest_chap_time, author, desc, imgurl = fetch_latest_chapter_webnovel(extract_book_id(url))
-    status = "Ongoing" if int(time_difference(latest_chap_time)) <= 30 else "Hiatus"
-    notes = ""
-
-    if local_chap is None or local_chap == 0:
-      raise ValueError(f"Could not determine chapter count for {filename}")
-
-    conn = get_db_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-      INSERT INTO novels 
-      (name, url, source, localchap, onlinechap, status, notes, filepath, latestchaptime, author, description, cover_path)
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-      name, url, source, local_chap, online_chap, status, notes, filename, latest_chap_time, author, desc, imgurl
-    ))
-
-    conn.commit()
-    conn.close()
+    _, _, results = await asyncio.to_thread(import_epubs, [filename])
+    result = results[0]
+    if result["status"] == "error":
+      raise ValueError(result["message"])
 
     return jsonify({
       "status": "success",
-      "message": f"{name} imported successfully"
+      "message": result["message"]
     })
 
   except Exception as e:
@@ -178,6 +547,70 @@ def import_epub():
       "message": str(e)
     }), 500
 
+@app.route('/import-epubs', methods=['POST'])
+def import_epubs_batch():
+  """
+  Imports a list of EPUB files as a background job, by default every
+  file /scan-unrecorded reports. Per-file errors show up as job events.
+  """
+  data = request.get_json(silent=True) or {}
+  files = data.get("files")
+  if files is None:
+    db_epub_files, _ = get_db_files()
+    files = sorted(get_epub_files() - db_epub_files)
+  if not files:
+    return jsonify({"message": "No files to import", "category": "info"})
+
+  job_id = submit_job("import_epubs", {"files": files})
+  return jsonify({
+    "message": f"Import of {len(files)} EPUBs queued as job {job_id}",
+    "category": "info",
+    "job_id": job_id
+  }), 202
+
+def backup_format(filename=None):
+  """?format=, else the upload's file extension, default ndjson."""
+  fmt = request.args.get("format")
+  if not fmt and filename and "." in filename:
+    fmt = filename.rsplit(".", 1)[1]
+  fmt = (fmt or "ndjson").lower()
+  if fmt == "jsonl":
+    fmt = "ndjson"
+  return fmt if fmt in FORMATS else None
+
+@app.route('/export')
+def export():
+  """The novels table as a streamed ?format=ndjson (default) or csv download."""
+  fmt = backup_format()
+  if fmt is None:
+    return jsonify({"status": "error", "message": f"format must be one of {', '.join(FORMATS)}"}), 400
+  filename = f"novels-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+  return Response(stream_with_context(export_chunks(fmt)), mimetype=MIMETYPES[fmt],
+                  headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.route('/import', methods=['POST'])
+def import_novels():
+  """
+  Upserts novels from an /export file, sent as the "file" field of a form or
+  as the raw request body. The format comes from ?format= or the file name.
+  """
+  # Reading request.files parses (and so consumes) the body, only do that for forms
+  upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+  fmt = backup_format(upload.filename if upload else None)
+  if fmt is None:
+    return jsonify({"status": "error", "message": f"format must be one of {', '.join(FORMATS)}"}), 400
+
+  try:
+    result = import_stream(upload.stream if upload else request.stream, fmt)
+  except Exception as e:
+    print("Import error:", e)
+    return jsonify({"status": "error", "message": str(e)}), 500
+
+  message = f"✅ Imported {result['imported']} novels"
+  if result["skipped"]:
+    message += f", skipped {result['skipped']} bad rows"
+  return jsonify({"status": "success", "message": message, **result})
+
 @app.route('/edit/<int:id>', methods=['POST'])
 def edit(id):
   messages = []
@@ -201,16 +634,10 @@ def edit(id):
   if not updates:
     messages.append("No updates provided.")
 
-  # Dynamically build SQL SET clause
-  set_clause = ", ".join([f"{k}=?" for k in updates.keys()])
-  values = list(updates.values())
-  values.append(id)  # for WHERE id=?
-
   # Update the database safely
   try:
     with get_db_conn() as conn:
-      cur = conn.cursor()
-      cur.execute(f"UPDATE novels SET {set_clause} WHERE id=?", values)
+      update_novel(conn, id, updates)
     messages.append(f"✅ Updated '{updates.get('name', 'the novel')}'.")
   except Exception as e:
     messages.append(str(e))
@@ -218,14 +645,14 @@ def edit(id):
   return jsonify({ "message": "\n".join(messages), "status": status})
 
 @app.route('/get-from-epub')
-def get_from_epub():
+async def get_from_epub():
   get_param = request.args.get("get")
   epub = request.args.get("epub")
 
   # Set default values
   title = source = url = lchap = ochap = author = desc = None
   # Load metadata (returns url, source, author, description, cover_id, title)
-  meta = get_epub_metadata(epub)
+  meta = await asyncio.to_thread(get_epub_metadata, epub)
 
   if get_param == "title":
     title = meta.get("title")
@@ -243,8 +670,12 @@ def get_from_epub():
     source = meta.get("source")
     author = meta.get("author")
     desc   = meta.get("description")
-    ochap, _, _, _, _ = fetch_latest_chapter_webnovel(extract_book_id(url))
-    lchap = extract_local_chap(epub)
+    adapter = source_for(source, url)
+    local = asyncio.to_thread(extract_local_chap, epub)
+    if adapter:
+      (ochap, _, _, _), lchap = await asyncio.gather(adapter.fetch_async(adapter.book_id(url)), local)
+    else:
+      lchap = await local
 
   return jsonify({
     "title": title,
@@ -283,21 +714,88 @@ def updateall():
   audeco_opt = request.form.get("audeco", 0)
   check_epub = request.form.get("checkepub", 0)
   cover_opt = request.form.get("cover", 0)
-  
+  resume_opt = request.form.get("resume", 0)
+  due_opt = request.form.get("due", 0)
 
-  func_msg, msg_cat = update_online_chapters_for_all(int(onlinechap), int(localchap), int(startId), int(limit), int(title_opt), int(url_opt), int(audeco_opt), int(cover_opt), int(check_epub))
-  # Default msg_cat to "message" if it is None
-
-  if msg_cat is None:
-    msg_cat = "message"
+  # Only the novels the scheduler says are worth asking the API about
+  if int(due_opt) == 1:
+    job_id = submit_job("refresh_due", {})
+    return jsonify({
+      "message": f"Check of due novels queued as job {job_id}",
+      "category": "info",
+      "job_id": job_id
+    }), 202
+
+  params = {
+    "onlinechap": int(onlinechap),
+    "localchap": int(localchap),
+    "startId": int(startId),
+    "limit": int(limit),
+    "gettitle": int(title_opt),
+    "geturl": int(url_opt),
+    "get_audecco": int(audeco_opt),
+    "cover": int(cover_opt),
+    "check_epub": int(check_epub),
+    "resume": int(resume_opt),
+  }
+  if not any(v == 1 for k, v in params.items() if k not in ("startId", "limit", "resume")):
+    return jsonify({"message": "Chapters are not selected", "category": "error"})
 
+  # The run itself happens on the job worker, progress is at /jobs/<id>
+  job_id = submit_job("bulk_update", params)
   return jsonify({
-    "message": func_msg,
-    "category": msg_cat
-  })
+    "message": f"Bulk update queued as job {job_id}",
+    "category": "info",
+    "job_id": job_id
+  }), 202
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+  job = get_job(job_id)
+  if job is None:
+    return jsonify({"status": "error", "message": "No such job"}), 404
+  return jsonify(job)
+
+@app.route('/jobs/<int:job_id>/events')
+def job_events(job_id):
+  """
+  Server-Sent Events stream of a job: a "novel" event per reported novel,
+  a "progress" event every second and an "end" event once it finished.
+  Reconnecting clients continue after Last-Event-ID.
+  """
+  last_id = request.args.get("after", 0, type=int)
+  try:
+    last_id = int(request.headers.get("Last-Event-ID") or last_id)
+  except ValueError:
+    pass  # not one of ours, start from ?after=
+
+  def stream():
+    nonlocal last_id
+    while True:
+      job = get_job(job_id, events_after=last_id, event_limit=500)
+      if job is None:
+        yield f"event: end\ndata: {json.dumps({'status': 'error', 'message': 'No such job'})}\n\n"
+        return
+      for event in job.pop("events"):
+        last_id = event["id"]
+        yield f"id: {last_id}\nevent: novel\ndata: {json.dumps(event)}\n\n"
+      yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+      if job["status"] in ("done", "error"):
+        yield f"event: end\ndata: {json.dumps(job)}\n\n"
+        return
+      time.sleep(1)
+
+  return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                  headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def save_novel_updates(id, updated_fields):
+  conn = get_db_conn()
+  update_novel(conn, id, updated_fields)
+  conn.commit()
+  conn.close()
 
 @app.route('/update/<id>')
-def update(id):
+async def update(id):
   messages = []
   status = "success"
 
@@ -323,20 +821,21 @@ def update(id):
   latest_chap_time = None
   author = desc = imgurl = None
 
-  if source.lower() == "webnovel":
-    book_id = extract_book_id(url)
-    if book_id:
-      func_online_chap, latest_chap_time, author, desc, imgurl = \
-        fetch_latest_chapter_webnovel(book_id)
-    else:
-      messages.append("Invalid book ID")
-  else:
-    messages.append("Unsupported source (offline mode)")
-
   # ------------------------------------------------
-  # 2) Extract local chapter from EPUB
+  # 2) Extract local chapter from EPUB, while the online request is out
   # ------------------------------------------------
-  func_local_chap = float(extract_local_chap(epub_file) or 0)
+  local = asyncio.to_thread(extract_local_chap, epub_file)
+
+  adapter = source_for(source, url)
+  book_id = adapter.book_id(url) if adapter else None
+  if book_id:
+    (func_online_chap, latest_chap_time, author, desc), local_chap_found = await asyncio.gather(
+      adapter.fetch_async(book_id), local)
+  else:
+    messages.append("Invalid book ID" if adapter else "Unsupported source (offline mode)")
+    local_chap_found = await local
+
+  func_local_chap = float(local_chap_found or 0)
 
   # ------------------------------------------------
   # 3) Build list of fields that changed
@@ -363,17 +862,7 @@ def update(id):
   # ------------------------------------------------
   if updated_fields:
     try:
-      conn = get_db_conn()
-      cur = conn.cursor()
-
-      # dynamic SQL for updates
-      set_clause = ", ".join(f"{k}=?" for k in updated_fields.keys())
-      sql = f"UPDATE novels SET {set_clause} WHERE id=?"
-      params = list(updated_fields.values()) + [id]
-
-      cur.execute(sql, params)
-      conn.commit()
-      conn.close()
+      await asyncio.to_thread(save_novel_updates, id, updated_fields)
 
       messages.append(f"✅ '{name}' updated:")
       messages.extend(change_log)
@@ -392,9 +881,8 @@ def update(id):
 @app.route('/settings', methods=['GET', 'POST'])
 def settings():
   if request.method == 'POST':
-    # Save the form data
-    for key, value in request.form.items():
-      save_setting(key, value)  # your function to save to DB
+    # Save the form data in one go, other workers pick it up on their next settings check
+    save_settings(request.form.to_dict())
   return redirect(url_for('index'))
 
 @app.route("/scan-unrecorded")
@@ -413,6 +901,36 @@ def scan_unrecorded():
     "covers": unrecorded_covers
   })
   
+# A year, for cover URLs pinned to their content by ?v=
+COVER_MAX_AGE = 365 * 24 * 3600
+
+@app.route('/cover/<cover_id>')
+def cover(cover_id):
+  """Cover image, or with ?size= its smallest thumbnail at least that wide."""
+  if cover_id != os.path.basename(cover_id) or cover_id.startswith("."):
+    abort(404)
+  path, etag = cover_file(cover_id, request.args.get("size", type=int))
+  if path is None:
+    abort(404)
+  resp = send_file(os.path.abspath(path), mimetype="image/webp", etag=etag or True, conditional=True)
+  # ?v= is the content hash the table rows carry (cover_version). While it matches the
+  # file served (etag is "<hash>" or "<hash>_<size>") that URL never changes content.
+  # Without it, or for an outdated one, browsers revalidate by ETag every time.
+  version = request.args.get("v")
+  if version and etag and etag.split("_", 1)[0] == version:
+    resp.cache_control.max_age = COVER_MAX_AGE
+    resp.cache_control.immutable = True
+  else:
+    resp.cache_control.no_cache = True
+    resp.cache_control.max_age = None
+    resp.cache_control.public = False
+  return resp
+
+@app.route('/metrics')
+def metrics():
+  """Timing histograms of this worker process in Prometheus text format."""
+  return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/status')
 def status():
   return "", 200
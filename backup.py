@@ -0,0 +1,187 @@
+import codecs, csv, io, json, math, sqlite3
+from db import get_db_conn, TOUCH_SQL
+
+# Export and import of the novels table as NDJSON (one JSON object per line) or
+# CSV with a header row. Both directions stream: the export walks a cursor and
+# hands the response a few hundred rows at a time, the import reads the upload
+# line by line and writes it in batches, each its own transaction. A library of
+# any size goes through a worker in the same, small amount of memory.
+
+# Stored columns of novels, in export order. chapter_gap and latestchap_day are
+# generated from these and left out.
+EXPORT_FIELDS = (
+  "id", "name", "url", "author", "description", "tags", "cover_path", "localchap", "onlinechap",
+  "latestchaptime", "status", "source", "notes", "filepath", "epub_exists", "created_time",
+  "last_updated", "updated_count",
+)
+# Numeric columns and the type their values are converted to
+NUMERIC_FIELDS = {"id": int, "localchap": float, "onlinechap": float, "updated_count": int}
+FORMATS = ("ndjson", "csv")
+MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows per response chunk on export and per transaction on import
+BATCH_SIZE = 500
+# Errors listed in the import summary, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+def export_chunks(fmt):
+  """
+  Generator of the whole novels table as text chunks in fmt, ordered by id.
+
+  Parameters:
+  fmt (str): "ndjson" or "csv"
+  """
+  conn = get_db_conn()
+  try:
+    cur = conn.execute(f"SELECT {', '.join(EXPORT_FIELDS)} FROM novels ORDER BY id")
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n") if fmt == "csv" else None
+    if writer:
+      writer.writerow(EXPORT_FIELDS)
+    while True:
+      rows = cur.fetchmany(BATCH_SIZE)
+      if not rows:
+        break
+      for row in rows:
+        if writer:
+          writer.writerow(row)
+        else:
+          out.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False))
+          out.write("\n")
+      yield out.getvalue()
+      out.seek(0)
+      out.truncate()
+    if out.tell():
+      yield out.getvalue()
+  finally:
+    conn.close()
+
+def _read_rows(text, fmt):
+  """(line number, dict or error message) for every record of an NDJSON or CSV text stream."""
+  if fmt == "csv":
+    reader = csv.DictReader(text)
+    for row in reader:
+      # CSV has no NULL, empty cells import as one
+      yield reader.line_num, {k: (v if v != "" else None) for k, v in row.items() if k}
+    return
+  for line_num, line in enumerate(text, 1):
+    if not line.strip():
+      continue
+    try:
+      row = json.loads(line)
+    except ValueError as e:
+      yield line_num, f"invalid JSON: {e}"
+      continue
+    yield line_num, row if isinstance(row, dict) else "not a JSON object"
+
+def _clean_row(row):
+  """The known columns of one record, numbers converted, or raises ValueError."""
+  values = {k: row[k] for k in EXPORT_FIELDS if k in row}
+  if not values.get("name"):
+    raise ValueError("missing name")
+  if values.get("id") is None:
+    values.pop("id", None)
+  for key, kind in NUMERIC_FIELDS.items():
+    value = values.get(key)
+    if value is None:
+      continue
+    try:
+      number = float(value)
+    except (TypeError, ValueError):
+      raise ValueError(f"{key} is not a number: {value!r}")
+    if not math.isfinite(number) or (kind is int and not number.is_integer()):
+      raise ValueError(f"{key} is not a valid {kind.__name__}: {value!r}")
+    values[key] = kind(number)
+  for key, value in values.items():
+    if not isinstance(value, (str, int, float, type(None))):
+      raise ValueError(f"{key} must be text or a number")
+  return values
+
+def _write_batch(conn, columns, batch):
+  """
+  Inserts the rows of batch, updating the novels whose id already exists instead.
+  Updated rows without last_updated/updated_count get touched like any other write.
+  """
+  # No UPSERT: its conflict clause would override the OR REPLACE of the novels_sync triggers
+  id_pos = columns.index("id") if "id" in columns else None
+  existing = set()
+  if id_pos is not None:
+    ids = json.dumps([row[id_pos] for row in batch])
+    existing = {r[0] for r in conn.execute("SELECT id FROM novels WHERE id IN (SELECT value FROM json_each(?))", (ids,))}
+
+  inserts = [row for row in batch if id_pos is None or row[id_pos] not in existing]
+  conn.executemany(f"INSERT INTO novels ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", inserts)
+  if existing:
+    fields = [c for c in columns if c != "id"]
+    touch = "" if "last_updated" in columns or "updated_count" in columns else f", {TOUCH_SQL}"
+    updates = [[v for i, v in enumerate(row) if i != id_pos] + [row[id_pos]] for row in batch if row[id_pos] in existing]
+    conn.executemany(f"UPDATE novels SET {', '.join(f'{c} = ?' for c in fields)}{touch} WHERE id = ?", updates)
+
+def import_stream(stream, fmt):
+  """
+  Upserts the novels of an NDJSON or CSV upload, BATCH_SIZE rows per transaction.
+  Rows with an id replace that novel's columns present in the file, rows
+  without one are added. Bad rows are skipped and reported.
+
+  Parameters:
+  stream: binary file-like object with the upload, e.g. wsgi.input
+  fmt (str): "ndjson" or "csv"
+
+  Returns:
+  dict: {"imported": int, "skipped": int, "errors": [str, ...]}
+  """
+  # readline() is all a WSGI input stream is sure to have
+  text = codecs.iterdecode(iter(stream.readline, b""), "utf-8-sig")
+  conn = get_db_conn()
+  imported, skipped, errors = 0, 0, []
+  batch, lines, batch_ids, columns = [], [], set(), None
+
+  def skip(line_num, error):
+    nonlocal skipped
+    skipped += 1
+    if len(errors) < MAX_REPORTED_ERRORS:
+      errors.append(f"line {line_num}: {error}")
+
+  def flush():
+    nonlocal imported
+    if not batch:
+      return
+    try:
+      with conn:
+        _write_batch(conn, columns, batch)
+      imported += len(batch)
+    except sqlite3.IntegrityError:
+      # Rolled back, so write the batch again row by row and skip only the rows that fail
+      with conn:
+        for line_num, row in zip(lines, batch):
+          try:
+            _write_batch(conn, columns, [row])
+            imported += 1
+          except sqlite3.IntegrityError as e:
+            skip(line_num, e)
+    batch.clear()
+    lines.clear()
+    batch_ids.clear()
+
+  try:
+    for line_num, row in _read_rows(text, fmt):
+      try:
+        if isinstance(row, str):
+          raise ValueError(row)
+        values = _clean_row(row)
+      except (TypeError, ValueError) as e:
+        skip(line_num, e)
+        continue
+      # One statement per batch, so rows with other columns start a new one. An id
+      # already in the batch does too, so the later row is written after the earlier one.
+      novel_id = values.get("id")
+      if tuple(values) != columns or len(batch) >= BATCH_SIZE or novel_id in batch_ids:
+        flush()
+        columns = tuple(values)
+      batch.append(tuple(values.values()))
+      lines.append(line_num)
+      if novel_id is not None:
+        batch_ids.add(novel_id)
+    flush()
+  finally:
+    conn.close()
+  return {"imported": imported, "skipped": skipped, "errors": errors}
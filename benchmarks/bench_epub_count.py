@@ -0,0 +1,56 @@
+"""
+Compares the zip/nav fast path against ebooklib for counting EPUB chapters.
+
+Each method runs in its own subprocess so peak RSS is not shared between them.
+
+  python benchmarks/bench_epub_count.py                       # synthetic 500/2000/5000 chapter books
+  python benchmarks/bench_epub_count.py path/to/book.epub ...  # your own books
+"""
+import json, os, resource, shutil, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def run_one(method, path):
+  from ebooklib import epub
+  from scraper import count_epub_chapters_fast, epub_count_chapters
+
+  before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  start = time.perf_counter()
+  if method == "fast":
+    chapters = count_epub_chapters_fast(path)
+  else:
+    chapters = epub_count_chapters(epub.read_epub(path).toc)
+  elapsed = time.perf_counter() - start
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is in KB on Linux
+  print(json.dumps({"chapters": chapters, "seconds": elapsed, "peak_mb": peak / 1024, "delta_mb": (peak - before) / 1024}))
+
+def measure(method, path, workdir):
+  out = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", method, path],
+                       cwd=workdir, capture_output=True, text=True, check=True).stdout
+  return json.loads(out.strip().splitlines()[-1])
+
+def main(paths):
+  workdir = tempfile.mkdtemp(prefix="nt-bench-")
+  if not paths:
+    from synth import write_epub
+    print("Generating synthetic books...")
+    paths = [write_epub(os.path.join(workdir, f"book_{n}.epub"), chapters=n, chapter_kb=16) for n in (500, 2000, 5000)]
+
+  print(f"{'book':<24}{'MB':>8}{'method':>10}{'chapters':>10}{'seconds':>10}{'peak MB':>10}{'+RSS MB':>10}")
+  for path in paths:
+    size = os.path.getsize(path) / 1024 / 1024
+    results = {m: measure(m, os.path.abspath(path), workdir) for m in ("fast", "ebooklib")}
+    for method, r in results.items():
+      print(f"{os.path.basename(path)[:23]:<24}{size:>8.1f}{method:>10}{r['chapters']:>10}"
+            f"{r['seconds']:>10.3f}{r['peak_mb']:>10.1f}{r['delta_mb']:>10.1f}")
+    if results["fast"]["chapters"] != results["ebooklib"]["chapters"]:
+      print(f"❌ chapter count mismatch for {path}")
+  shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+  if len(sys.argv) == 4 and sys.argv[1] == "--run":
+    run_one(sys.argv[2], sys.argv[3])
+  else:
+    main(sys.argv[1:])
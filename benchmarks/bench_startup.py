@@ -0,0 +1,70 @@
+"""
+Worker boot time against library size.
+
+For every size it fills novels/ and static/img/cover/ of a fresh folder with
+that many (empty) files, then times in a new process, a few runs each:
+
+  import  `import app`
+  first   the first request (/status), which opens the database and loads the settings
+
+Both should stay flat as the library grows: startup must not walk the tree.
+
+  python benchmarks/bench_startup.py                  # 0, 1000, 10000, 50000 files
+  python benchmarks/bench_startup.py 0 100000 --runs 9
+"""
+import argparse, json, os, shutil, statistics, subprocess, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get("/status")
+print(json.dumps({"import": imported - start, "first": time.perf_counter() - imported}))
+"""
+
+def make_library(folder, files):
+  for sub, ext in (("novels", "epub"), (os.path.join("static", "img", "cover"), "webp")):
+    path = os.path.join(folder, sub)
+    os.makedirs(path, exist_ok=True)
+    # A few levels of subfolders, like an organised library
+    for i in range(files):
+      sub_dir = os.path.join(path, f"{i % 50:02d}")
+      if i < 50:
+        os.makedirs(sub_dir, exist_ok=True)
+      open(os.path.join(sub_dir, f"book_{i}.{ext}"), "w").close()
+
+def run(folder, env):
+  out = subprocess.run([sys.executable, "-c", CHILD], cwd=folder, env=env, capture_output=True, text=True, check=True)
+  # Background threads of the app may print around, or in the middle of, the result line
+  line = out.stdout[out.stdout.index('{"import"'):]
+  return json.loads(line[:line.index("}") + 1])
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("sizes", nargs="*", type=int, default=[0, 1000, 10000, 50000], help="files per library folder")
+  parser.add_argument("--runs", type=int, default=5)
+  args = parser.parse_args()
+
+  env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+  env.pop("DB_PATH", None)
+  workdir = tempfile.mkdtemp(prefix="nt-startup-")
+  try:
+    print(f"{'files':>8}{'import':>12}{'first req':>12}")
+    for size in args.sizes:
+      folder = os.path.join(workdir, str(size))
+      make_library(folder, size)
+      # Create and migrate the database up front, with the background refresher off
+      subprocess.run([sys.executable, "-c", "import db; db.init_db(); db.save_setting('AUTO_REFRESH_MINUTES', '0')"],
+                     cwd=folder, env=env, capture_output=True, check=True)
+      results = [run(folder, env) for _ in range(args.runs)]
+      imp = statistics.median(r["import"] for r in results)
+      first = statistics.median(r["first"] for r in results)
+      print(f"{size:>8}{imp * 1000:>10.1f}ms{first * 1000:>10.1f}ms")
+  finally:
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+  main()
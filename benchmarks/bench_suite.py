@@ -0,0 +1,228 @@
+"""
+End-to-end benchmarks of the hot paths on a synthetic library.
+
+For every size it builds N EPUBs of varying chapter counts and sizes plus a
+my-novels.db with matching rows (the last few files left unrecorded), starts
+the mock Webnovel server from mock_server.py and times, through Flask's test
+client:
+
+  /api/novels          full list cold/warm/304, and a serverSide page
+  /scan-unrecorded     cold (index build) and warm
+  /import-epub         per file, and import_epubs() for a batch
+  /update/<id>         per novel
+  update_online_chapters_for_all(onlinechap=1, localchap=1)
+
+Each size runs in its own process and library folder. Results are saved as
+JSON; pass an earlier file to --compare to see the change.
+
+  python benchmarks/bench_suite.py                              # 100 and 1000 novels
+  python benchmarks/bench_suite.py --sizes 100,1000,10000 --keep /tmp/nt-bench
+  python benchmarks/bench_suite.py --compare benchmarks/results/old.json
+"""
+import argparse, json, os, platform, random, shutil, sqlite3, subprocess, sys, tempfile, time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+# EPUB files left out of the database, for /scan-unrecorded and the imports
+UNRECORDED = 20
+SAMPLE = 10
+
+def book_id(i):
+  return str(20000000 + i)
+
+def build_library(n, seed=1):
+  """Writes novels/*.epub for n + UNRECORDED books into the current folder, unless already there."""
+  from synth import write_epub
+  marker = os.path.join("novels", ".library.json")
+  wanted = {"n": n, "seed": seed}
+  if os.path.exists(marker) and json.load(open(marker)) == wanted:
+    return
+  shutil.rmtree("novels", ignore_errors=True)
+  rng = random.Random(seed)
+  for i in range(n + UNRECORDED):
+    write_epub(os.path.join("novels", f"novel_{i:05d}.epub"), title=f"Synthetic Novel {i}",
+               chapters=rng.randint(20, 600), chapter_kb=rng.choice((1, 2, 4)), image_kb=rng.choice((4, 16, 64)),
+               url=f"https://www.webnovel.com/book/synthetic-novel-{i}_{book_id(i)}", author=f"Author {i % 500}")
+  json.dump(wanted, open(marker, "w"))
+
+def build_database(n, base_url, workers):
+  """Fresh my-novels.db with rows for the first n EPUBs, settings pointing at the mock server."""
+  for name in ("my-novels.db", "my-novels.db-wal", "my-novels.db-shm"):
+    if os.path.exists(name):
+      os.remove(name)
+  shutil.rmtree("covers", ignore_errors=True)
+  shutil.rmtree(".cache", ignore_errors=True)
+
+  import db
+  settings = {
+    "ENDPOINT": f"{base_url}/book/",
+    "IMG_ENDPOINT": f"{base_url}/img/",
+    "USER_AGENT": "novel-tracker-bench",
+    "DELAY_FROM": "0",
+    "DELAY_TO": "0",
+    "LOCAL_EPUB_DIR": "novels/",
+    "COVER_PATH": "covers/",
+    "BULK_WORKERS": str(workers),
+    # Every online check goes out (as a conditional request) instead of hitting the disk cache
+    "HTTP_CACHE_TTL": "0",
+    "AUTO_REFRESH_MINUTES": "0",
+  }
+  for key, value in settings.items():
+    db.save_setting(key, value)
+
+  conn = sqlite3.connect("my-novels.db")
+  conn.executemany("""
+    INSERT INTO novels (name, url, source, localchap, onlinechap, status, filepath)
+    VALUES (?, ?, 'webnovel', 0, 0, 'Ongoing', ?)
+  """, [(f"Synthetic Novel {i}", f"https://www.webnovel.com/book/synthetic-novel-{i}_{book_id(i)}",
+         f"novel_{i:05d}.epub") for i in range(n)])
+  conn.commit()
+  conn.close()
+
+def timed(func, repeat=1):
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func()
+    times.append(time.perf_counter() - start)
+  return {"seconds": min(times), "mean": sum(times) / len(times), "runs": repeat}
+
+def run_size(n, latency, workers, bulk_limit):
+  """Runs every benchmark for one library size in the current folder, returns name -> timing."""
+  from mock_server import start_mock_server
+  started = time.perf_counter()
+  build_library(n)
+  server, base_url = start_mock_server(latency=latency)
+  build_database(n, base_url, workers)
+  setup = time.perf_counter() - started
+
+  import app
+  from scraper import update_online_chapters_for_all, import_epubs
+  client = app.app.test_client()
+  results = {"setup": {"seconds": setup, "mean": setup, "runs": 1}}
+
+  def get_ok(url, **kwargs):
+    resp = client.get(url, **kwargs)
+    assert resp.status_code in (200, 304), f"{url}: {resp.status_code}"
+    return resp
+
+  # ---- /api/novels
+  results["api_novels_full_cold"] = timed(lambda: get_ok("/api/novels"))
+  results["api_novels_full_warm"] = timed(lambda: get_ok("/api/novels"), repeat=5)
+  etag = get_ok("/api/novels").headers["ETag"]
+  results["api_novels_full_304"] = timed(lambda: get_ok("/api/novels", headers={"If-None-Match": etag}), repeat=20)
+  page = {"draw": 1, "start": 0, "length": 20, "search": {"value": ""}, "order": [{"column": 1, "dir": "asc"}],
+          "columns": [{"data": "id", "name": "id"}, {"data": "name", "name": "name"}]}
+  results["api_novels_page"] = timed(lambda: client.post("/api/novels", json=page), repeat=20)
+  page_search = dict(page, search={"value": "Novel 1"}, start=n // 2)
+  results["api_novels_page_search"] = timed(lambda: client.post("/api/novels", json=page_search), repeat=20)
+
+  # ---- /scan-unrecorded
+  results["scan_unrecorded_cold"] = timed(lambda: get_ok("/scan-unrecorded"))
+  results["scan_unrecorded_warm"] = timed(lambda: get_ok("/scan-unrecorded"), repeat=5)
+  unrecorded = get_ok("/scan-unrecorded").json["files"]
+  assert len(unrecorded) == UNRECORDED, unrecorded
+
+  # ---- imports: one request per file, then the rest as one batch
+  singles, batch = unrecorded[:SAMPLE], unrecorded[SAMPLE:]
+  results["import_epub"] = timed(lambda: client.post("/import-epub", json={"filename": singles.pop()}), repeat=len(singles))
+  results["import_epubs_batch"] = timed(lambda: import_epubs(batch))
+  results["import_epubs_batch"]["files"] = len(batch)
+
+  # ---- /update/<id>
+  ids = list(range(1, SAMPLE + 1))
+  def update_one():
+    i = ids.pop()
+    get_ok(f"/update/{i}?" + "&".join([
+      f"name=Synthetic+Novel+{i - 1}", "source=webnovel", "local_chap=0", "online_chap=0",
+      f"url=https://www.webnovel.com/book/synthetic-novel-{i - 1}_{book_id(i - 1)}",
+      f"filepath=novel_{i - 1:05d}.epub",
+    ]))
+  results["update_id"] = timed(update_one, repeat=len(ids))
+
+  # ---- bulk run
+  results["bulk_online_local"] = timed(lambda: update_online_chapters_for_all(onlinechap=1, localchap=1, limit=bulk_limit))
+  results["bulk_online_local"]["novels"] = min(n, bulk_limit or n) + UNRECORDED
+
+  server.shutdown()
+  return results
+
+def git_revision():
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+  except OSError:
+    return ""
+
+def compare(results, baseline_path):
+  baseline = json.load(open(baseline_path))
+  print(f"\nCompared with {baseline_path} ({baseline['meta'].get('git', '?')}):")
+  print(f"{'size':>7}  {'benchmark':<26}{'before':>10}{'after':>10}{'change':>9}")
+  for size, benches in results["sizes"].items():
+    for name, r in benches.items():
+      old = baseline["sizes"].get(size, {}).get(name)
+      if not old or not old["seconds"]:
+        continue
+      change = (r["seconds"] - old["seconds"]) / old["seconds"] * 100
+      print(f"{size:>7}  {name:<26}{old['seconds']:>10.4f}{r['seconds']:>10.4f}{change:>+8.1f}%")
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--sizes", default="100,1000", help="comma separated library sizes")
+  parser.add_argument("--latency", type=float, default=0.02, help="mock server delay per answer, in seconds")
+  parser.add_argument("--workers", type=int, default=4, help="BULK_WORKERS for the bulk run")
+  parser.add_argument("--bulk-limit", type=int, default=None, help="only bulk update this many novels")
+  parser.add_argument("--keep", help="folder to keep the generated libraries in, reused by later runs")
+  parser.add_argument("--out", help="results file, default benchmarks/results/<time>-<git>.json")
+  parser.add_argument("--compare", help="earlier results file to compare against")
+  parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.run:
+    results = run_size(args.run, args.latency, args.workers, args.bulk_limit)
+    json.dump(results, open("result.json", "w"))
+    return
+
+  workdir = args.keep or tempfile.mkdtemp(prefix="nt-bench-")
+  results = {
+    "meta": {
+      "git": git_revision(),
+      "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+      "python": platform.python_version(),
+      "sqlite": sqlite3.sqlite_version,
+      "platform": platform.platform(),
+      "cpus": os.cpu_count(),
+      "latency": args.latency,
+      "workers": args.workers,
+      "bulk_limit": args.bulk_limit,
+    },
+    "sizes": {},
+  }
+
+  for size in [int(s) for s in args.sizes.split(",") if s]:
+    folder = os.path.join(workdir, str(size))
+    os.makedirs(folder, exist_ok=True)
+    print(f"== {size} novels ({folder})")
+    cmd = [sys.executable, os.path.abspath(__file__), "--run", str(size), "--latency", str(args.latency),
+           "--workers", str(args.workers)] + (["--bulk-limit", str(args.bulk_limit)] if args.bulk_limit else [])
+    with open(os.path.join(folder, "bench.log"), "w") as log:
+      subprocess.run(cmd, cwd=folder, stdout=log, stderr=subprocess.STDOUT, check=True)
+    sizes = json.load(open(os.path.join(folder, "result.json")))
+    results["sizes"][str(size)] = sizes
+    for name, r in sizes.items():
+      print(f"   {name:<26}{r['seconds']:>10.4f}s  (mean {r['mean']:.4f}s over {r['runs']})")
+
+  out = args.out or os.path.join(BENCH_DIR, "results", f"{time.strftime('%Y%m%d-%H%M%S')}-{results['meta']['git'] or 'local'}.json")
+  os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+  json.dump(results, open(out, "w"), indent=2)
+  print(f"Saved {out}")
+
+  if args.compare:
+    compare(results, args.compare)
+  if not args.keep:
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+  main()
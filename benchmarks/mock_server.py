@@ -0,0 +1,99 @@
+"""
+Local stand-in for the Webnovel endpoints the app talks to.
+
+  GET /book/<book_id>        ENDPOINT JSON (ChapterNum, LastChapterTime, ...), with an ETag
+  GET /img/<book_id>/180.jpg IMG_ENDPOINT cover image
+
+Every answer waits `latency` seconds first. Run it on its own with
+
+  python benchmarks/mock_server.py [--port 8765] [--latency 0.2]
+
+and point ENDPOINT / IMG_ENDPOINT at http://127.0.0.1:8765/book/ and /img/.
+"""
+import argparse, io, json, threading, time, zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+  from PIL import Image
+except ImportError:
+  Image = None
+
+def cover_jpeg(book_id):
+  """A small JPEG cover, its colour derived from the book id."""
+  if Image is None:
+    return b"\xff\xd8\xff\xe0" + book_id.encode() + b"\xff\xd9"
+  colour = zlib.crc32(book_id.encode()) & 0xFFFFFF
+  out = io.BytesIO()
+  Image.new("RGB", (180, 240), (colour >> 16, (colour >> 8) & 0xFF, colour & 0xFF)).save(out, "JPEG")
+  return out.getvalue()
+
+def book_json(book_id):
+  # Stable per book so repeated runs see the same chapter numbers
+  seed = zlib.crc32(book_id.encode())
+  return {
+    "Result": 0,
+    "Data": {
+      "BookId": book_id,
+      "ChapterNum": 50 + seed % 2000,
+      "LastChapterTime": int((time.time() - (seed % (400 * 86400))) * 1000),
+      "Description": f"Synthetic description of book {book_id}.",
+      "AuthorInfo": {"AuthorName": f"Author {seed % 500}"},
+    },
+  }
+
+class MockHandler(BaseHTTPRequestHandler):
+  latency = 0.0
+
+  def do_GET(self):
+    time.sleep(self.latency)
+    parts = self.path.strip("/").split("/")
+    if len(parts) >= 2 and parts[0] == "book":
+      etag = f'"{parts[1]}"'
+      if self.headers.get("If-None-Match") == etag:
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return
+      self._send(200, "application/json", json.dumps(book_json(parts[1])).encode(), etag)
+    elif len(parts) >= 2 and parts[0] == "img":
+      self._send(200, "image/jpeg", cover_jpeg(parts[1]))
+    else:
+      self._send(404, "text/plain", b"not found")
+
+  def _send(self, status, content_type, body, etag=None):
+    self.send_response(status)
+    self.send_header("Content-Type", content_type)
+    self.send_header("Content-Length", str(len(body)))
+    if etag:
+      self.send_header("ETag", etag)
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+def start_mock_server(port=0, latency=0.0):
+  """
+  Starts the server on a background thread.
+
+  Returns:
+  tuple: (server, base_url) where base_url is e.g. "http://127.0.0.1:8765"; call server.shutdown() to stop
+  """
+  handler = type("Handler", (MockHandler,), {"latency": latency})
+  server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+  server.daemon_threads = True
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--port", type=int, default=8765)
+  parser.add_argument("--latency", type=float, default=0.2, help="seconds to wait before every answer")
+  args = parser.parse_args()
+  server, url = start_mock_server(args.port, args.latency)
+  print(f"Mock Webnovel server on {url} ({args.latency}s latency), Ctrl+C to stop")
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    server.shutdown()
@@ -0,0 +1,88 @@
+"""
+Synthetic data for the benchmarks.
+
+write_epub() builds a valid EPUB 3 (nav.xhtml + toc.ncx) straight with zipfile,
+so large books can be generated in seconds without going through ebooklib.
+"""
+import io, os, zipfile
+from xml.sax.saxutils import escape
+
+try:
+  from PIL import Image
+except ImportError:
+  Image = None
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+def noise_png(kb):
+  """A real PNG of about `kb` KB (random pixels do not compress), or plain random bytes without Pillow."""
+  if Image is None:
+    return os.urandom(kb * 1024)
+  side = max(8, int((kb * 1024) ** 0.5))
+  out = io.BytesIO()
+  Image.frombytes("L", (side, side), os.urandom(side * side)).save(out, "PNG")
+  return out.getvalue()
+
+def write_epub(path, title="Synthetic Novel", chapters=100, chapter_kb=8, url="", author="Bench Author",
+               description="Synthetic book used by the benchmarks.", image_kb=64):
+  """
+  Writes an EPUB with `chapters` chapters of about `chapter_kb` KB each,
+  grouped into volumes of 100, plus one cover image of `image_kb` KB.
+  """
+  paragraph = "<p>" + ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 16) + "</p>\n"
+  body = paragraph * max(1, (chapter_kb * 1024) // len(paragraph))
+  names = [f"chap_{n:05d}.xhtml" for n in range(1, chapters + 1)]
+
+  manifest = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+              '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>',
+              '<item id="cover" href="cover.png" media-type="image/png" properties="cover-image"/>']
+  manifest += [f'<item id="c{n}" href="{name}" media-type="application/xhtml+xml"/>' for n, name in enumerate(names)]
+  spine = "".join(f'<itemref idref="c{n}"/>' for n in range(len(names)))
+  source = f"<dc:source>{escape(url)}</dc:source>" if url else ""
+
+  opf = f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="id">{escape(title)}</dc:identifier><dc:title>{escape(title)}</dc:title>
+    <dc:creator>{escape(author)}</dc:creator><dc:description>{escape(description)}</dc:description>{source}
+    <dc:language>en</dc:language>
+  </metadata>
+  <manifest>{"".join(manifest)}</manifest>
+  <spine toc="ncx">{spine}</spine>
+</package>"""
+
+  nav_volumes, ncx_volumes = [], []
+  for v in range(0, len(names), 100):
+    chunk = names[v:v + 100]
+    nav_volumes.append(f'<li><span>Volume {v // 100 + 1}</span><ol>'
+                       + "".join(f'<li><a href="{name}">Chapter {v + i + 1}</a></li>' for i, name in enumerate(chunk))
+                       + "</ol></li>")
+    ncx_volumes.append(f'<navPoint id="v{v}"><navLabel><text>Volume {v // 100 + 1}</text></navLabel><content src="{chunk[0]}"/>'
+                       + "".join(f'<navPoint id="p{v + i}"><navLabel><text>Chapter {v + i + 1}</text></navLabel>'
+                                 f'<content src="{name}"/></navPoint>' for i, name in enumerate(chunk))
+                       + "</navPoint>")
+
+  nav = f"""<?xml version="1.0" encoding="utf-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head><title>{escape(title)}</title></head>
+<body><nav epub:type="toc" id="id"><ol>{"".join(nav_volumes)}</ol></nav></body></html>"""
+  ncx = f"""<?xml version="1.0" encoding="utf-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+<head/><docTitle><text>{escape(title)}</text></docTitle><navMap>{"".join(ncx_volumes)}</navMap></ncx>"""
+
+  os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+  with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+    zf.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip")
+    zf.writestr("META-INF/container.xml", CONTAINER_XML)
+    zf.writestr("EPUB/content.opf", opf)
+    zf.writestr("EPUB/nav.xhtml", nav)
+    zf.writestr("EPUB/toc.ncx", ncx)
+    zf.writestr("EPUB/cover.png", noise_png(image_kb))
+    for n, name in enumerate(names, 1):
+      zf.writestr(f"EPUB/{name}", f"""<?xml version="1.0" encoding="utf-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Chapter {n}</title></head>
+<body><h1>Chapter {n}</h1>{body}</body></html>""")
+  return path
@@ -0,0 +1,180 @@
+import hashlib, io, os, shutil, tempfile, threading
+from pathlib import Path
+from db import get_db_conn, get_value, get_cover_files
+from jobs import job_handler, submit_job
+
+# Pillow is optional: without it covers are stored as downloaded and served
+# without thumbnails, like before.
+try:
+  from PIL import Image
+except ImportError:
+  Image = None
+
+# Widths of the thumbnails kept next to every cover, the hover popup shows 80px (160 for HiDPI)
+THUMB_SIZES = (80, 160)
+# Longest side of the full cover kept under COVER_PATH
+MAX_COVER_SIZE = 600
+WEBP_QUALITY = 80
+
+def cover_dir():
+  return Path(get_value("COVER_PATH"))
+
+def thumb_path(digest, size):
+  """Thumbnails are named by content hash, so identical covers share them."""
+  return cover_dir() / "thumbs" / f"{digest}_{size}.webp"
+
+def _write_atomic(path, data):
+  # Thumbnails are shared by content hash, so several threads may write the same
+  # file at once: each one writes its own temp file and the last rename wins
+  path.parent.mkdir(parents=True, exist_ok=True)
+  fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+  try:
+    with os.fdopen(fd, "wb") as f:
+      f.write(data)
+    os.replace(tmp, path)
+  except BaseException:
+    try:
+      os.remove(tmp)
+    except OSError:
+      pass
+    raise
+
+def _link_atomic(source, path):
+  """Hard-links (or copies) source to path, replacing it in one step."""
+  path.parent.mkdir(parents=True, exist_ok=True)
+  tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+  try:
+    os.link(source, tmp)
+  except FileExistsError:
+    os.remove(tmp)
+    os.link(source, tmp)
+  except OSError:
+    shutil.copyfile(source, tmp)
+  os.replace(tmp, path)
+
+def _encode(img, max_size):
+  img = img.copy()
+  img.thumbnail((max_size, max_size * 2))
+  out = io.BytesIO()
+  img.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+  return out.getvalue()
+
+def store_cover(cover_id, data):
+  """
+  Saves cover image bytes as COVER_PATH/<cover_id> plus its thumbnails.
+
+  The image is decoded once and written as real WebP at most MAX_COVER_SIZE
+  wide, with one thumbnail per THUMB_SIZES width. A cover whose bytes were
+  seen before is hard-linked to the existing file instead of encoded again.
+
+  Returns:
+  str: cover_id, or "" when the bytes are not a readable image
+  """
+  digest = hashlib.sha256(data).hexdigest()
+  target = cover_dir() / cover_id
+
+  conn = get_db_conn()
+  same = conn.execute("SELECT cover_id, width, height FROM covers WHERE hash=? AND cover_id != ? AND failed = 0",
+                      (digest, cover_id)).fetchone()
+  conn.close()
+
+  width = height = None
+  if same and (cover_dir() / same[0]).exists() and all(thumb_path(digest, s).exists() for s in THUMB_SIZES):
+    _, width, height = same
+    _link_atomic(cover_dir() / same[0], target)
+  elif Image is None:
+    _write_atomic(target, data)
+  else:
+    # Only decoding is guarded: the bytes are in memory, so an OSError here is Pillow
+    # rejecting them. Errors writing the files below propagate and mark nothing.
+    try:
+      img = Image.open(io.BytesIO(data))
+      img.load()
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+      print(f"⚠️ Could not decode cover {cover_id}: {e}")
+      # Remembered, so the cover is not decoded again until new bytes are saved for it
+      _save_cover_row(cover_id, digest, None, None, failed=1)
+      return ""
+    with img:
+      if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+      width, height = img.size
+      for size in THUMB_SIZES:
+        _write_atomic(thumb_path(digest, size), _encode(img, size))
+      _write_atomic(target, _encode(img, MAX_COVER_SIZE))
+
+  _save_cover_row(cover_id, digest, width, height)
+  return str(cover_id)
+
+def _save_cover_row(cover_id, digest, width, height, failed=0):
+  conn = get_db_conn()
+  with conn:
+    conn.execute("INSERT OR REPLACE INTO covers (cover_id, hash, width, height, failed) VALUES (?, ?, ?, ?, ?)",
+                 (cover_id, digest, width, height, failed))
+  conn.close()
+
+_backfill_queued = False
+_backfill_lock = threading.Lock()
+
+def queue_cover_backfill():
+  """Queues a cover_thumbs job once per process, unless one is already waiting or running."""
+  global _backfill_queued
+  with _backfill_lock:
+    if _backfill_queued:
+      return
+    _backfill_queued = True
+  conn = get_db_conn()
+  pending = conn.execute("SELECT 1 FROM jobs WHERE kind='cover_thumbs' AND status IN ('queued', 'running')").fetchone()
+  conn.close()
+  if not pending:
+    submit_job("cover_thumbs", {})
+
+@job_handler("cover_thumbs")
+def cover_thumbs_job(params, report):
+  """Processes the covers in COVER_PATH saved before thumbnails existed."""
+  conn = get_db_conn()
+  known = {row[0] for row in conn.execute("SELECT cover_id FROM covers")}
+  conn.close()
+  todo = sorted(get_cover_files() - known)
+  report.start(len(todo))
+  failed = 0
+  for cover_id in todo:
+    error = None
+    try:
+      with open(cover_dir() / cover_id, "rb") as f:
+        if not store_cover(cover_id, f.read()):
+          error = "Could not decode image"
+    except OSError as e:
+      error = str(e)
+    if error:
+      failed += 1
+    report.row(None, cover_id, error=error)
+  message = f"✅ Processed {len(todo) - failed} covers" + (f", {failed} could not be decoded" if failed else "")
+  return message, "error" if failed else "success"
+
+def cover_file(cover_id, size=None):
+  """
+  File to serve for a cover and its ETag, as (path, etag), or (None, None).
+
+  size picks the smallest thumbnail at least that wide. Covers saved before
+  thumbnails existed are served as they are and processed by a cover_thumbs
+  job, covers that could not be decoded are always served as they are.
+  """
+  original = cover_dir() / cover_id
+  conn = get_db_conn()
+  row = conn.execute("SELECT hash, failed FROM covers WHERE cover_id=?", (cover_id,)).fetchone()
+  conn.close()
+
+  if row is None:
+    if not original.is_file():
+      return None, None
+    queue_cover_backfill()
+    return original, None
+
+  digest, failed = row
+  if size and Image is not None and not failed:
+    fitting = [s for s in THUMB_SIZES if s >= size] or [THUMB_SIZES[-1]]
+    thumb = thumb_path(digest, fitting[0])
+    if thumb.exists():
+      return thumb, f"{digest}_{fitting[0]}"
+  return (original, digest) if original.is_file() else (None, None)
@@ -1,116 +1,758 @@
-import sqlite3, os
+import sqlite3, os, sys, threading, time
+from metrics import add_time
 
-def find_database_file(filename="my-novels.db"):
-  # Scan the current directory for the specified database file
-  for root, dirs, files in os.walk(os.getcwd()):
-    if filename in files:
-      return filename
-  return None  # Return None if not found
+# Database file, relative to the working directory unless absolute. Importing this
+# module touches neither the disk nor the database: the connection, the migrations
+# and the settings all happen on first use.
+DEFAULT_DB = os.environ.get("DB_PATH") or "my-novels.db"
 
-DEFAULT_DB = find_database_file() or "my-novels.db"
+# Schema migrations, applied in order by migrate() on the first connection of each
+# process. PRAGMA user_version holds the number of the last one applied, so older
+# databases upgrade themselves in place. Each version is a list of SQL statements
+# or functions taking the connection. Add changes as a new version at the end,
+# never edit one that has shipped.
+
+def _rebuild_fts(conn):
+  # Fill the full-text index from the rows that existed before it
+  conn.execute("INSERT INTO novels_fts (novels_fts) VALUES ('rebuild')")
+
+MIGRATIONS = [
+  # 1: the original schema
+  [
+    '''
+      CREATE TABLE IF NOT EXISTS novels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        url TEXT,
+        author TEXT,
+        description TEXT,
+        tags TEXT,
+        cover_path TEXT,
+        localchap REAL DEFAULT 0,
+        onlinechap REAL DEFAULT 0,
+        latestchaptime TEXT,
+        status TEXT,
+        source TEXT,
+        notes TEXT,
+        filepath TEXT,
+        epub_exists TEXT,
+        created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_updated TEXT,
+        updated_count INTEGER DEFAULT 0
+      )
+    ''',
+    # Add trigger for changes on novel row
+    '''
+      CREATE TRIGGER IF NOT EXISTS insert_Timestamp_Trigger
+      AFTER UPDATE ON novels
+      BEGIN
+         UPDATE novels SET last_updated =STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW'), updated_count=updated_count+1 WHERE id = NEW.id;
+      END
+    ''',
+    '''
+      CREATE TABLE IF NOT EXISTS settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT NOT NULL UNIQUE,
+        value TEXT
+      )
+    ''',
+  ],
+  # 2: caches, jobs, search and change tracking, added before migrations were numbered
+  [
+    '''
+      CREATE TABLE IF NOT EXISTS epub_cache (
+        path TEXT PRIMARY KEY,
+        mtime REAL NOT NULL,
+        size INTEGER NOT NULL,
+        title TEXT,
+        url TEXT,
+        author TEXT,
+        description TEXT,
+        chapters INTEGER,
+        cover_href TEXT,
+        parsed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+      )
+    ''',
+    # Index of the files in LOCAL_EPUB_DIR / COVER_PATH, see refresh_file_index()
+    '''
+      CREATE TABLE IF NOT EXISTS library_files (
+        kind TEXT NOT NULL,
+        name TEXT NOT NULL,
+        size INTEGER,
+        mtime REAL,
+        inode INTEGER,
+        PRIMARY KEY (kind, name)
+      )
+    ''',
+    '''
+      CREATE TABLE IF NOT EXISTS library_dirs (
+        kind TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        mtime_ns INTEGER
+      )
+    ''',
+    # Sort keys of the serverSide /api/novels table
+    "CREATE INDEX IF NOT EXISTS idx_novels_name ON novels (name)",
+    "CREATE INDEX IF NOT EXISTS idx_novels_diff ON novels ((onlinechap - localchap))",
+    "CREATE INDEX IF NOT EXISTS idx_novels_latestchaptime ON novels (latestchaptime)",
+    "CREATE INDEX IF NOT EXISTS idx_novels_status ON novels (status)",
+    "CREATE INDEX IF NOT EXISTS idx_novels_source ON novels (source)",
+    # Background jobs (jobs.py) and their per-novel progress events
+    '''
+      CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        params TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        total INTEGER DEFAULT 0,
+        done INTEGER DEFAULT 0,
+        errors INTEGER DEFAULT 0,
+        message TEXT,
+        worker TEXT,
+        created_at REAL,
+        started_at REAL,
+        finished_at REAL,
+        heartbeat_at REAL
+      )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)",
+    '''
+      CREATE TABLE IF NOT EXISTS job_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id INTEGER NOT NULL,
+        novel_id INTEGER,
+        name TEXT,
+        level TEXT,
+        message TEXT,
+        created_at REAL
+      )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, id)",
+    # When each novel is next worth asking the API about, see scheduler.py
+    '''
+      CREATE TABLE IF NOT EXISTS refresh_schedule (
+        novel_id INTEGER PRIMARY KEY,
+        next_check REAL,
+        last_check REAL,
+        cadence REAL,
+        misses INTEGER DEFAULT 0
+      )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_refresh_schedule_next ON refresh_schedule (next_check)",
+    # Content hash of every processed cover, see covers.py
+    '''
+      CREATE TABLE IF NOT EXISTS covers (
+        cover_id TEXT PRIMARY KEY,
+        hash TEXT NOT NULL,
+        width INTEGER,
+        height INTEGER
+      )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_covers_hash ON covers (hash)",
+    # Change tracking for /api/novels: a table-wide counter used as ETag and the counter
+    # value of every row's last change, deleted rows stay behind as tombstones
+    "CREATE TABLE IF NOT EXISTS change_counter (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+    "INSERT OR IGNORE INTO change_counter (name, value) VALUES ('novels', 0)",
+    '''
+      CREATE TABLE IF NOT EXISTS novels_sync (
+        novel_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0
+      )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_novels_sync_version ON novels_sync (version)",
+    '''
+      CREATE TRIGGER IF NOT EXISTS novels_sync_insert AFTER INSERT ON novels BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'novels';
+        INSERT OR REPLACE INTO novels_sync (novel_id, version, deleted)
+        VALUES (NEW.id, (SELECT value FROM change_counter WHERE name = 'novels'), 0);
+      END
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS novels_sync_update AFTER UPDATE ON novels BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'novels';
+        INSERT OR REPLACE INTO novels_sync (novel_id, version, deleted)
+        VALUES (NEW.id, (SELECT value FROM change_counter WHERE name = 'novels'), 0);
+      END
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS novels_sync_delete AFTER DELETE ON novels BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'novels';
+        INSERT OR REPLACE INTO novels_sync (novel_id, version, deleted)
+        VALUES (OLD.id, (SELECT value FROM change_counter WHERE name = 'novels'), 1);
+      END
+    ''',
+    # Full-text index over novels, kept in sync by the triggers below (see /api/search)
+    '''
+      CREATE VIRTUAL TABLE IF NOT EXISTS novels_fts USING fts5 (
+        name, author, description, notes, tags,
+        content='novels', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+      )
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS novels_fts_insert AFTER INSERT ON novels BEGIN
+        INSERT INTO novels_fts (rowid, name, author, description, notes, tags)
+        VALUES (NEW.id, NEW.name, NEW.author, NEW.description, NEW.notes, NEW.tags);
+      END
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS novels_fts_delete AFTER DELETE ON novels BEGIN
+        INSERT INTO novels_fts (novels_fts, rowid, name, author, description, notes, tags)
+        VALUES ('delete', OLD.id, OLD.name, OLD.author, OLD.description, OLD.notes, OLD.tags);
+      END
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS novels_fts_update
+      AFTER UPDATE OF name, author, description, notes, tags ON novels BEGIN
+        INSERT INTO novels_fts (novels_fts, rowid, name, author, description, notes, tags)
+        VALUES ('delete', OLD.id, OLD.name, OLD.author, OLD.description, OLD.notes, OLD.tags);
+        INSERT INTO novels_fts (rowid, name, author, description, notes, tags)
+        VALUES (NEW.id, NEW.name, NEW.author, NEW.description, NEW.notes, NEW.tags);
+      END
+    ''',
+    _rebuild_fts,
+  ],
+  # 3: indexes for the hot queries, see check_query_plans()
+  [
+    "CREATE INDEX IF NOT EXISTS idx_novels_filepath ON novels (filepath)",
+    "CREATE INDEX IF NOT EXISTS idx_novels_cover_path ON novels (cover_path)",
+    "CREATE INDEX IF NOT EXISTS idx_novels_source_status ON novels (source, status)",
+    # Covered by idx_novels_source_status
+    "DROP INDEX IF EXISTS idx_novels_source",
+  ],
+  # 4: settings generation, bumped on every change so each process can tell its cached copy is stale
+  [
+    "INSERT OR IGNORE INTO change_counter (name, value) VALUES ('settings', 0)",
+    '''
+      CREATE TRIGGER IF NOT EXISTS settings_version_insert AFTER INSERT ON settings BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'settings';
+      END
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS settings_version_update AFTER UPDATE ON settings BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'settings';
+      END
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS settings_version_delete AFTER DELETE ON settings BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'settings';
+      END
+    ''',
+  ],
+  # 5: derived values kept by SQLite, so sorting and the /api/novels/unread and /stale
+  # reports run from an index instead of computing them per row in Python or JS.
+  # latestchap_day is NULL for a missing or unparsable latestchaptime.
+  [
+    "ALTER TABLE novels ADD COLUMN chapter_gap REAL GENERATED ALWAYS AS (onlinechap - localchap) VIRTUAL",
+    "ALTER TABLE novels ADD COLUMN latestchap_day REAL GENERATED ALWAYS AS (julianday(latestchaptime)) VIRTUAL",
+    "CREATE INDEX IF NOT EXISTS idx_novels_chapter_gap ON novels (chapter_gap)",
+    "CREATE INDEX IF NOT EXISTS idx_novels_latestchap_day ON novels (latestchap_day)",
+    # Replaced by the two above
+    "DROP INDEX IF EXISTS idx_novels_diff",
+    "DROP INDEX IF EXISTS idx_novels_latestchaptime",
+  ],
+  # 6: last_updated/updated_count are set by update_novel() in the same statement instead of
+  # a trigger updating the row a second time, and chapter, time and status changes are kept
+  # in an append-only history for trends and release cadence
+  [
+    "DROP TRIGGER IF EXISTS insert_Timestamp_Trigger",
+    '''
+      CREATE TABLE IF NOT EXISTS novel_changes (
+        id INTEGER PRIMARY KEY,
+        novel_id INTEGER NOT NULL,
+        field TEXT NOT NULL,
+        old_value,
+        new_value,
+        changed_at TEXT NOT NULL DEFAULT (STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW'))
+      )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_novel_changes_novel ON novel_changes (novel_id, field, changed_at)",
+    '''
+      CREATE TRIGGER IF NOT EXISTS novel_changes_log
+      AFTER UPDATE OF onlinechap, localchap, latestchaptime, status ON novels BEGIN
+        INSERT INTO novel_changes (novel_id, field, old_value, new_value)
+        SELECT NEW.id, 'onlinechap', OLD.onlinechap, NEW.onlinechap WHERE OLD.onlinechap IS NOT NEW.onlinechap
+        UNION ALL
+        SELECT NEW.id, 'localchap', OLD.localchap, NEW.localchap WHERE OLD.localchap IS NOT NEW.localchap
+        UNION ALL
+        SELECT NEW.id, 'latestchaptime', OLD.latestchaptime, NEW.latestchaptime WHERE OLD.latestchaptime IS NOT NEW.latestchaptime
+        UNION ALL
+        SELECT NEW.id, 'status', OLD.status, NEW.status WHERE OLD.status IS NOT NEW.status;
+      END
+    ''',
+  ],
+  # 7: likely duplicate novels found by duplicates.py, novel_a < novel_b. The 'duplicates'
+  # counter is the novels version they are up to date with, later changes are rescored.
+  [
+    '''
+      CREATE TABLE IF NOT EXISTS duplicate_pairs (
+        novel_a INTEGER NOT NULL,
+        novel_b INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        PRIMARY KEY (novel_a, novel_b)
+      ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_duplicate_pairs_b ON duplicate_pairs (novel_b)",
+    "CREATE INDEX IF NOT EXISTS idx_duplicate_pairs_score ON duplicate_pairs (score)",
+    "INSERT OR IGNORE INTO change_counter (name, value) VALUES ('duplicates', 0)",
+  ],
+  # 8: checks in a row that raised, so a broken row backs off instead of staying due
+  [
+    "ALTER TABLE refresh_schedule ADD COLUMN failures INTEGER NOT NULL DEFAULT 0",
+  ],
+  # 9: covers Pillow could not decode, served as stored instead of tried again on every request
+  [
+    "ALTER TABLE covers ADD COLUMN failed INTEGER NOT NULL DEFAULT 0",
+  ],
+  # 10: runtime state kept in settings (STATE_SETTINGS) no longer bumps the settings
+  # generation, so bulk chunks and auto refreshes leave every process's cached copy alone
+  [
+    "DROP TRIGGER IF EXISTS settings_version_insert",
+    "DROP TRIGGER IF EXISTS settings_version_update",
+    "DROP TRIGGER IF EXISTS settings_version_delete",
+    '''
+      CREATE TRIGGER IF NOT EXISTS settings_version_insert AFTER INSERT ON settings
+      WHEN NEW.key NOT IN ('BULK_RESUME_ID', 'LAST_BULK_TIME', 'LAST_AUTO_REFRESH') BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'settings';
+      END
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS settings_version_update AFTER UPDATE ON settings
+      WHEN NEW.key NOT IN ('BULK_RESUME_ID', 'LAST_BULK_TIME', 'LAST_AUTO_REFRESH')
+        OR OLD.key NOT IN ('BULK_RESUME_ID', 'LAST_BULK_TIME', 'LAST_AUTO_REFRESH') BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'settings';
+      END
+    ''',
+    '''
+      CREATE TRIGGER IF NOT EXISTS settings_version_delete AFTER DELETE ON settings
+      WHEN OLD.key NOT IN ('BULK_RESUME_ID', 'LAST_BULK_TIME', 'LAST_AUTO_REFRESH') BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'settings';
+      END
+    ''',
+  ],
+  # 11: a stored cover changes the cover_version of the novels showing it, so they count
+  # as changed for the /api/novels ETag and ?since= (covers rows are only ever inserted
+  # or replaced, and INSERT OR REPLACE fires the insert trigger)
+  [
+    '''
+      CREATE TRIGGER IF NOT EXISTS covers_sync_insert AFTER INSERT ON covers BEGIN
+        UPDATE change_counter SET value = value + 1 WHERE name = 'novels';
+        INSERT OR REPLACE INTO novels_sync (novel_id, version, deleted)
+        SELECT id, (SELECT value FROM change_counter WHERE name = 'novels'), 0 FROM novels
+        WHERE cover_path = NEW.cover_id;
+      END
+    ''',
+  ],
+  # 12: /metrics histograms summed over all processes, see metrics.flush_metrics();
+  # labels are the label values joined by \x1f, slot the bucket index, then sum and count
+  [
+    '''
+      CREATE TABLE IF NOT EXISTS metric_values (
+        name TEXT NOT NULL,
+        labels TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        value REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (name, labels, slot)
+      ) WITHOUT ROWID
+    ''',
+  ],
+]
+
+# Added to the settings table when missing, see migrate()
+DEFAULT_SETTINGS = {
+  "DB_PATH": "my-novels.db",
+  "ENDPOINT": "",
+  "IMG_ENDPOINT": "",
+  "USER_AGENT": "",
+  "DELAY_FROM": "1",
+  "DELAY_TO": "3",
+  "LOCAL_EPUB_DIR": "novels/",
+  "COVER_PATH": "static/img/cover/",
+  "CHECK_ERROR_LINK": "1",
+  "API_TIMEOUT": "10",
+  "BULK_WORKERS": "4",
+  "BULK_CHUNK_SIZE": "50",
+  "BULK_RESUME_ID": "",
+  "HTTP_CACHE_DIR": ".cache/http",
+  "HTTP_CACHE_TTL": "300",
+  "HTTP_CACHE_KEEP_HOURS": "24",
+  "AUTO_REFRESH_MINUTES": "0",
+  "IMPORT_WORKERS": "0",
+  "LAST_AUTO_REFRESH": "",
+  "SECERT_KEY": "",
+  "LAST_BULK_TIME": "",
+}
+
+# Parsed type of the numeric settings, see get_setting(). Anything else stays a string.
+SETTING_TYPES = {
+  "DELAY_FROM": float,
+  "DELAY_TO": float,
+  "CHECK_ERROR_LINK": int,
+  "API_TIMEOUT": int,
+  "BULK_WORKERS": int,
+  "BULK_CHUNK_SIZE": int,
+  "HTTP_CACHE_TTL": float,
+  "HTTP_CACHE_KEEP_HOURS": float,
+  "AUTO_REFRESH_MINUTES": float,
+  "IMPORT_WORKERS": int,
+}
+
+_schema_ready = False
+
+def migrate(conn):
+  """
+  Brings the database up to the last MIGRATIONS version and adds any missing
+  DEFAULT_SETTINGS, leaving existing values alone.
+
+  Returns:
+  int: the schema version
+  """
+  version = conn.execute("PRAGMA user_version").fetchone()[0]
+  if version < len(MIGRATIONS):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+      # Another process may have migrated while this one waited for the lock
+      version = conn.execute("PRAGMA user_version").fetchone()[0]
+      for number, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f">> Migrating database to version {number}")
+        for step in steps:
+          if callable(step):
+            step(conn)
+          else:
+            conn.execute(step)
+        conn.execute(f"PRAGMA user_version = {number}")
+        version = number
+      conn.commit()
+    except Exception:
+      conn.rollback()
+      raise
+
+  with conn:
+    conn.executemany("INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO NOTHING",
+                     DEFAULT_SETTINGS.items())
+  return version
+
+CONN_PRAGMAS = [
+  "PRAGMA journal_mode=WAL",
+  "PRAGMA synchronous=NORMAL",
+  "PRAGMA busy_timeout=10000",
+  "PRAGMA cache_size=-16000",    # 16 MB page cache
+  "PRAGMA mmap_size=268435456",  # 256 MB
+  "PRAGMA temp_store=MEMORY",
+]
+
+class TimedCursor(sqlite3.Cursor):
+  """
+  Cursor adding the time spent in SQLite to the request's "sql" Server-Timing entry.
+
+  SQLite finds rows as they are stepped through, so fetching and iterating
+  (for row in conn.execute(...)) are timed as well as execute().
+  """
+  def execute(self, *args):
+    start = time.perf_counter()
+    try:
+      return super().execute(*args)
+    finally:
+      add_time("sql", time.perf_counter() - start)
+
+  def executemany(self, *args):
+    start = time.perf_counter()
+    try:
+      return super().executemany(*args)
+    finally:
+      add_time("sql", time.perf_counter() - start)
+
+  def fetchone(self):
+    start = time.perf_counter()
+    try:
+      return super().fetchone()
+    finally:
+      add_time("sql", time.perf_counter() - start)
+
+  def fetchmany(self, *args):
+    start = time.perf_counter()
+    try:
+      return super().fetchmany(*args)
+    finally:
+      add_time("sql", time.perf_counter() - start)
+
+  def fetchall(self):
+    start = time.perf_counter()
+    try:
+      return super().fetchall()
+    finally:
+      add_time("sql", time.perf_counter() - start)
+
+  def __next__(self):
+    start = time.perf_counter()
+    try:
+      return super().__next__()
+    finally:
+      add_time("sql", time.perf_counter() - start)
+
+class PooledConnection(sqlite3.Connection):
+  """
+  Connection kept open for reuse by get_db_conn().
+
+  close() only hands it back: once the last nested user closes it, any
+  uncommitted work is rolled back (as a real close would) and the
+  connection goes back to the pool for the next caller, on any thread.
+  """
+  users = 0
+
+  # conn.execute() does not go through cursor(), so route both through TimedCursor
+  def cursor(self, factory=TimedCursor):
+    return super().cursor(factory)
+
+  def execute(self, *args):
+    return self.cursor().execute(*args)
+
+  def executemany(self, *args):
+    return self.cursor().executemany(*args)
+
+  def close(self):
+    self.users = max(self.users - 1, 0)
+    if self.users == 0:
+      if self.in_transaction:
+        self.rollback()
+      self.row_factory = None
+      _check_in(self)
+
+# Open connections not in use. A thread checks one out on its first get_db_conn() and
+# keeps it until its last close(), so nested callers share it; then it goes back here. At most POOL_SIZE idle ones are kept, extra ones closed.
+POOL_SIZE = 8
+_idle = []
+_pool_lock = threading.Lock()
+_pool_pid = os.getpid()
+_local = threading.local()
+# Connections inherited through fork are never touched again, just kept referenced
+_forked_conns = []
+
+def _check_in(conn):
+  if getattr(_local, "conn", None) is conn:
+    _local.conn = None
+  with _pool_lock:
+    if _pool_pid == os.getpid() and len(_idle) < POOL_SIZE:
+      _idle.append(conn)
+      return
+  if _pool_pid == os.getpid():
+    sqlite3.Connection.close(conn)
+
+def _check_out():
+  global _pool_pid
+  with _pool_lock:
+    if _pool_pid != os.getpid():
+      _forked_conns.extend(_idle)
+      _idle.clear()
+      _pool_pid = os.getpid()
+    if _idle:
+      return _idle.pop()
+  # Handed between threads by the pool, but only ever used by one at a time
+  conn = sqlite3.connect(DEFAULT_DB, timeout=10, factory=PooledConnection, check_same_thread=False)
+  for pragma in CONN_PRAGMAS:
+    conn.execute(pragma)
+  return conn
 
 def get_db_conn():
-  conn = sqlite3.connect(DEFAULT_DB)
+  """Returns this thread's connection, checked out of the pool on first use."""
+  global _schema_ready
+  conn = getattr(_local, "conn", None)
+  if conn is not None and _local.pid != os.getpid():
+    _forked_conns.append(conn)
+    conn = None
+
+  if conn is None:
+    conn = _check_out()
+    _local.conn, _local.pid = conn, os.getpid()
+    if not _schema_ready:
+      migrate(conn)
+      _schema_ready = True
+
+  conn.users += 1
   return conn
 
+def release_db_conn():
+  """Ends this thread's use of its connection and returns it to the pool, e.g. when a request finishes."""
+  conn = getattr(_local, "conn", None)
+  if conn is not None and _local.pid == os.getpid():
+    conn.users = 1
+    conn.close()
+
+# Queries run on every table load, import or bulk run, checked by check_query_plans()
+HOT_QUERIES = {
+  "table sorted by name": "SELECT id, name FROM novels ORDER BY name",
+  "bulk run from id": "SELECT id, name FROM novels WHERE id >= ? ORDER BY id",
+  "recorded files": """
+    SELECT filepath, cover_path FROM novels
+    WHERE filepath IS NOT NULL OR cover_path IS NOT NULL ORDER BY filepath
+  """,
+  "imported files": "SELECT filepath FROM novels WHERE filepath IS NOT NULL AND filepath != ''",
+  "novel by file": "SELECT id FROM novels WHERE filepath = ?",
+  "novel by cover": "SELECT id FROM novels WHERE cover_path = ?",
+  "filter by source and status": "SELECT id FROM novels WHERE source = ? AND status = ?",
+  "filter by status": "SELECT id FROM novels WHERE status = ?",
+  "table search box": "SELECT id FROM novels WHERE id IN (SELECT rowid FROM novels_fts WHERE novels_fts MATCH ?)",
+  "changes since version": "SELECT novel_id FROM novels_sync WHERE version > ? AND deleted = 0",
+  "table sorted by diff": "SELECT id FROM novels ORDER BY chapter_gap",
+  "table sorted by time": "SELECT id FROM novels ORDER BY latestchap_day DESC",
+  "most unread": "SELECT id FROM novels WHERE chapter_gap > 0 ORDER BY chapter_gap DESC LIMIT ?",
+  "stale": "SELECT id FROM novels WHERE latestchap_day < ? ORDER BY latestchap_day LIMIT ?",
+  "history of a field": "SELECT changed_at, new_value FROM novel_changes WHERE novel_id = ? AND field = ? ORDER BY changed_at",
+}
+
+def check_query_plans(conn):
+  """
+  Runs EXPLAIN QUERY PLAN on every HOT_QUERIES entry.
+
+  Returns:
+  list: (name, plan detail) for each step that scans a table without an
+  index or sorts in a temporary b-tree, empty when all is well
+  """
+  problems = []
+  for name, query in HOT_QUERIES.items():
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", [None] * query.count("?")):
+      detail = row[3]
+      if (detail.startswith("SCAN") and "INDEX" not in detail) or "TEMP B-TREE" in detail:
+        problems.append((name, detail))
+  return problems
+
+# Every write to a novel row also sets these, in the same statement
+TOUCH_SQL = "last_updated = STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW'), updated_count = updated_count + 1"
+
+def novel_update_sql(columns):
+  """UPDATE of one novel setting columns (parameters in that order, then the id) plus last_updated/updated_count."""
+  return f"UPDATE novels SET {', '.join(f'{c} = ?' for c in columns)}, {TOUCH_SQL} WHERE id = ?"
+
+def update_novel(conn, novel_id, changes):
+  """
+  Writes changes (column -> value) to one novel in a single statement.
+  The caller commits. Nothing is written when changes is empty.
+
+  Returns:
+  int: number of rows updated, 0 if the novel does not exist
+  """
+  if not changes:
+    return 0
+  return conn.execute(novel_update_sql(list(changes)), list(changes.values()) + [novel_id]).rowcount
+
 def init_db():
+  """Creates or upgrades the database. Safe to run again, settings keep their values."""
   conn = get_db_conn()
-  c = conn.cursor()
-
-  # Main novels table
-  c.execute('''
-    CREATE TABLE IF NOT EXISTS novels (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      name TEXT NOT NULL,
-      url TEXT,
-      author TEXT,
-      description TEXT,
-      tags TEXT,
-      cover_path TEXT,
-      localchap REAL DEFAULT 0,
-      onlinechap REAL DEFAULT 0,
-      latestchaptime TEXT,
-      status TEXT,
-      source TEXT,
-      notes TEXT,
-      filepath TEXT,
-      epub_exists TEXT,
-      created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-      last_updated TEXT,
-      updated_count INTEGER DEFAULT 0
-    )
-  ''')
-
-  # Add trigger for changes on novel row
-  c.execute('''
-    CREATE TRIGGER insert_Timestamp_Trigger
-    AFTER UPDATE ON novels
-    BEGIN
-       UPDATE novels SET last_updated =STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW'), updated_count=updated_count+1 WHERE id = NEW.id;
-    END;
-  ''')
-
-  # Settings table
-  c.execute('''
-    CREATE TABLE IF NOT EXISTS settings (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      key TEXT NOT NULL UNIQUE,
-      value TEXT
-    )
-  ''')
-  
-    # Default settings dictionary
-  default_settings = {
-    "DB_PATH": "my-novels.db",
-    "ENDPOINT": "",
-    "IMG_ENDPOINT": "",
-    "USER_AGENT": "",
-    "DELAY_FROM": "1",
-    "DELAY_TO": "3",
-    "LOCAL_EPUB_DIR": "novels/",
-    "COVER_PATH": "static/img/cover/",
-    "CHECK_ERROR_LINK": "1",
-    "API_TIMEOUT": "10",
-    "SECERT_KEY": "",
-    "LAST_BULK_TIME": "",
-  }
-
-  # Insert or replace defaults
-  for key, value in default_settings.items():
-    conn.execute("""
-      INSERT INTO settings (key, value)
-      VALUES (?, ?)
-      ON CONFLICT(key) DO UPDATE SET value=excluded.value
-    """, (key, value))
-
-  conn.commit()
+  version = migrate(conn)
   conn.close()
+  return version
+
+# Settings are served from this process's copy. At most every SETTINGS_CHECK_SECONDS
+# a lookup compares the 'settings' change counter with the one the copy was loaded
+# at, so a save in another gunicorn worker shows up here within that time.
+SETTINGS_CHECK_SECONDS = 1.0
+
+_settings_lock = threading.Lock()
+_settings_version = None
+_settings_checked = float("-inf")  # never: the first lookup loads them
+settings_dict = {}
+typed_settings = {}
+
+def parse_setting(key, value):
+  """Converts a stored setting to its SETTING_TYPES type, falling back to the default when it does not parse."""
+  kind = SETTING_TYPES.get(key)
+  if kind is None:
+    return value
+  for candidate in (value, DEFAULT_SETTINGS.get(key)):
+    try:
+      return kind(candidate)
+    except (TypeError, ValueError):
+      pass
+  return kind()
 
 def load_settings():
-  """Load all settings into a dictionary."""
+  """Load all settings into a dictionary, and the typed copy used by get_setting()."""
+  global settings_dict, typed_settings, _settings_version, _settings_checked
   print("RUN: load_Settings()")
   conn = get_db_conn()
-  conn.row_factory = sqlite3.Row  # Allows for dictionary-like access to rows
-  settings = conn.execute('SELECT key, value FROM settings').fetchall()
+  try:
+    # One statement, so the values and the version come from the same snapshot
+    rows = conn.execute("""
+      SELECT key, value, (SELECT value FROM change_counter WHERE name = 'settings') FROM settings
+    """).fetchall()
+  except sqlite3.OperationalError:
+    print("⚠️ No settings table yet, run `python db.py` to initialize the database.")
+    rows = []
   conn.close()
-  return {setting['key']: setting['value'] for setting in settings}
+  settings = {key: value for key, value, _ in rows}
+  settings_dict = settings
+  typed_settings = {key: parse_setting(key, value) for key, value in settings.items()}
+  _settings_version = rows[0][2] if rows else None
+  _settings_checked = time.monotonic()
+  return settings
+
+def _check_settings():
+  """Reloads the settings when another process changed them, checking at most every SETTINGS_CHECK_SECONDS."""
+  global _settings_checked
+  if time.monotonic() - _settings_checked < SETTINGS_CHECK_SECONDS:
+    return
+  with _settings_lock:
+    if time.monotonic() - _settings_checked < SETTINGS_CHECK_SECONDS:
+      return
+    conn = get_db_conn()
+    try:
+      row = conn.execute("SELECT value FROM change_counter WHERE name = 'settings'").fetchone()
+    except sqlite3.OperationalError:
+      row = None
+    conn.close()
+    # Only marked as checked once the copy is current, other threads skip the check until then
+    if row is None or row[0] != _settings_version:
+      load_settings()
+    else:
+      _settings_checked = time.monotonic()
 
 def get_settings_dict():
+  _check_settings()
   return settings_dict
 
+# Written by the bulk updater and the refresher as they run. Changing them does not
+# count as a settings change (migration 10), so read them with get_state().
+STATE_SETTINGS = ("BULK_RESUME_ID", "LAST_BULK_TIME", "LAST_AUTO_REFRESH")
+
+def get_state():
+  """Current values of STATE_SETTINGS, from the database rather than the cached copy."""
+  conn = get_db_conn()
+  rows = conn.execute(f"SELECT key, value FROM settings WHERE key IN ({', '.join('?' * len(STATE_SETTINGS))})",
+                      STATE_SETTINGS).fetchall()
+  conn.close()
+  return dict(rows)
+
 def get_value(key):
-  """Fetch the value from the settings dictionary."""
+  """Fetch the value from the settings dictionary, as the stored string."""
+  _check_settings()
   return settings_dict.get(key)
 
-def save_setting(key, value):
-  """Set the value from the settings dictionary."""
-  settings_dict[key] = value
+def get_setting(key):
+  """
+  Fetch a setting parsed to its SETTING_TYPES type, e.g. get_setting("API_TIMEOUT") -> 10.
+
+  Returns:
+  int | float | str: the value, or None for an unknown key
+  """
+  _check_settings()
+  return typed_settings.get(key)
+
+def save_settings(values):
+  """Saves several settings in one transaction and reloads this process's copy."""
   conn = get_db_conn()
-  cur = conn.cursor()
-  cur.execute("UPDATE settings SET value=? WHERE key=?", (value, key))
-  conn.commit()
+  with conn:
+    conn.executemany("""
+      INSERT INTO settings (key, value) VALUES (?, ?)
+      ON CONFLICT(key) DO UPDATE SET value=excluded.value
+    """, list(values.items()))
   conn.close()
-  return
+  with _settings_lock:
+    load_settings()
+
+def save_setting(key, value):
+  """Set one value in the settings table."""
+  save_settings({key: value})
   
 def get_db_files():
     conn = get_db_conn()
@@ -138,23 +780,92 @@ def get_db_files():
 
     return filepaths, covers
 
+# kind -> (setting holding the folder, file extension)
+LIBRARY_DIRS = {
+  "epub": ("LOCAL_EPUB_DIR", ".epub"),
+  "cover": ("COVER_PATH", ".webp"),
+}
+
+def refresh_file_index(kind):
+  """
+  Brings the library_files index for one folder up to date.
+
+  The folder is only listed again when its own mtime changed, which happens
+  whenever a file is added, removed or renamed in it. Files whose inode, size
+  and mtime are unchanged are left alone, the rest are upserted or dropped.
+  """
+  setting, ext = LIBRARY_DIRS[kind]
+  folder = os.path.realpath(get_value(setting))
+  conn = get_db_conn()
+  try:
+    try:
+      dir_mtime = os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+      conn.execute("DELETE FROM library_files WHERE kind=?", (kind,))
+      conn.execute("DELETE FROM library_dirs WHERE kind=?", (kind,))
+      conn.commit()
+      return
+
+    known = conn.execute("SELECT path, mtime_ns FROM library_dirs WHERE kind=?", (kind,)).fetchone()
+    if known == (folder, dir_mtime):
+      return
+
+    indexed = {
+      name: (inode, size, mtime) for name, inode, size, mtime in
+      conn.execute("SELECT name, inode, size, mtime FROM library_files WHERE kind=?", (kind,))
+    }
+    if known and known[0] != folder:
+      indexed = {}
+      conn.execute("DELETE FROM library_files WHERE kind=?", (kind,))
+
+    seen = set()
+    changed = []
+    with os.scandir(folder) as entries:
+      for entry in entries:
+        if not entry.name.lower().endswith(ext) or not entry.is_file():
+          continue
+        st = entry.stat()
+        seen.add(entry.name)
+        if indexed.get(entry.name) != (st.st_ino, st.st_size, st.st_mtime):
+          changed.append((kind, entry.name, st.st_size, st.st_mtime, st.st_ino))
+
+    conn.executemany("""
+      INSERT OR REPLACE INTO library_files (kind, name, size, mtime, inode) VALUES (?, ?, ?, ?, ?)
+    """, changed)
+    conn.executemany("DELETE FROM library_files WHERE kind=? AND name=?",
+                     [(kind, name) for name in indexed.keys() - seen])
+
+    # A folder touched within the last couple of seconds may still change inside
+    # the same mtime tick, so leave it unrecorded and list it again next time.
+    if time.time_ns() - dir_mtime < 2_000_000_000:
+      dir_mtime = None
+    conn.execute("INSERT OR REPLACE INTO library_dirs (kind, path, mtime_ns) VALUES (?, ?, ?)",
+                 (kind, folder, dir_mtime))
+    conn.commit()
+  finally:
+    conn.close()
+
+def get_indexed_files(kind):
+  """Names of the files of one library folder, from the refreshed index."""
+  refresh_file_index(kind)
+  conn = get_db_conn()
+  names = {name for (name,) in conn.execute("SELECT name FROM library_files WHERE kind=?", (kind,))}
+  conn.close()
+  return names
+
 def get_epub_files():
-  return {
-    f for f in os.listdir(get_value("LOCAL_EPUB_DIR"))
-    if f.lower().endswith(".epub")
-  }
+  return get_indexed_files("epub")
 
 def get_cover_files():
-  return {
-    f for f in os.listdir(get_value("COVER_PATH"))
-    if f.lower().endswith(".webp")
-  }
-
-global settings_dict
-settings_dict = {}
-settings_dict = load_settings() 
+  return get_indexed_files("cover")
 
 if __name__ == "__main__":
-  init_db()
-  print("Database initialized.")
+  if "--check-plans" in sys.argv:
+    problems = check_query_plans(get_db_conn())
+    for name, detail in problems:
+      print(f"❌ {name}: {detail}")
+    print("✅ All hot queries use an index" if not problems else f"{len(problems)} hot queries without an index")
+    sys.exit(1 if problems else 0)
+  version = init_db()
+  print(f"Database initialized (schema version {version}).")
 
@@ -0,0 +1,215 @@
+import json, math, os, re, threading, unicodedata
+from collections import Counter
+from db import get_db_conn
+from sources import source_for
+
+# Finds novels that are in the library twice. Titles are normalized and cut into
+# character trigrams; only novels sharing enough of the rarer trigrams, or the
+# same book id, URL or file name, are fuzzy scored against each other, instead
+# of every pair. Results live in duplicate_pairs, and each run only rescores
+# the novels changed since the last one (novels_sync), so /api/duplicates stays
+# cheap as novels are added.
+
+# Pairs scoring at least this are stored, /api/duplicates shows REPORT_SCORE and up by default
+STORE_SCORE = 80
+REPORT_SCORE = 88
+# Trigrams shared by more titles than this are too common to pick candidates with
+MAX_POSTING = 64
+# Part of a title's rare trigrams another title must share to be scored against it
+MIN_SHARED = 0.5
+
+STOPWORDS = {"a", "an", "the", "of"}
+_brackets = re.compile(r"[\(\[\{【].*?[\)\]\}】]")
+_non_word = re.compile(r"[\W_]+")
+_numbers = re.compile(r"\d+")
+
+def normalize_title(title):
+  """Lowercase, accents, punctuation, bracketed notes like "(Completed)" and stopwords removed."""
+  text = unicodedata.normalize("NFKD", title or "")
+  text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+  text = _brackets.sub(" ", text)
+  return " ".join(w for w in _non_word.sub(" ", text).split() if w not in STOPWORDS)
+
+def title_grams(norm):
+  compact = norm.replace(" ", "")
+  if len(compact) < 3:
+    return {compact} if compact else set()
+  return {compact[i:i + 3] for i in range(len(compact) - 2)}
+
+def exact_keys(url, source, filepath):
+  """Keys that make two novels the same book outright: online book id, URL and EPUB file name."""
+  keys = []
+  if url:
+    adapter = source_for(source, url)
+    book_id = adapter.book_id(url) if adapter else None
+    if book_id:
+      keys.append(("book_id", f"{adapter.name}:{book_id}"))
+    keys.append(("url", re.sub(r"^https?://(www\.)?|[?#].*$|/+$", "", url.strip().lower())))
+  if filepath:
+    stem = normalize_title(os.path.splitext(os.path.basename(filepath))[0]).replace(" ", "")
+    if stem:
+      keys.append(("file", stem))
+  return keys
+
+_ratio = None
+
+def title_score(a, b):
+  """0-100 similarity of two normalized titles. Titles with different numbers ("Book 2") score 0."""
+  global _ratio
+  if _numbers.findall(a) != _numbers.findall(b):
+    return 0
+  if _ratio is None:
+    # fuzzywuzzy is optional and only imported when needed, difflib gives the same ratio
+    try:
+      from fuzzywuzzy import fuzz
+      _ratio = fuzz.token_sort_ratio
+    except ImportError:
+      from difflib import SequenceMatcher
+      _ratio = lambda x, y: round(100 * SequenceMatcher(None, " ".join(sorted(x.split())), " ".join(sorted(y.split()))).ratio())
+  return _ratio(a, b)
+
+class TitleIndex:
+  """Normalized titles, their trigram postings and the exact keys of every novel, kept per process."""
+  def __init__(self):
+    self.titles = {}   # novel id -> normalized title
+    self.grams = {}    # novel id -> trigrams
+    self.keys = {}     # novel id -> exact keys
+    self.postings = {} # trigram -> novel ids
+    self.by_key = {}   # exact key -> novel ids
+
+  def add(self, novel_id, name, url, source, filepath):
+    self.remove(novel_id)
+    norm = normalize_title(name)
+    self.titles[novel_id] = norm
+    self.grams[novel_id] = title_grams(norm)
+    self.keys[novel_id] = exact_keys(url, source, filepath)
+    for gram in self.grams[novel_id]:
+      self.postings.setdefault(gram, set()).add(novel_id)
+    for key in self.keys[novel_id]:
+      self.by_key.setdefault(key, set()).add(novel_id)
+
+  def remove(self, novel_id):
+    if novel_id not in self.titles:
+      return
+    for gram in self.grams.pop(novel_id):
+      self.postings[gram].discard(novel_id)
+    for key in self.keys.pop(novel_id):
+      self.by_key[key].discard(novel_id)
+    del self.titles[novel_id]
+
+  def candidates(self, novel_id):
+    """Other novels worth scoring against novel_id, as id -> exact key kind, or None for title matches."""
+    found = {}
+    for key in self.keys[novel_id]:
+      for other in self.by_key[key]:
+        if other != novel_id:
+          found.setdefault(other, key[0])
+
+    rare = [g for g in self.grams[novel_id] if len(self.postings[g]) <= MAX_POSTING]
+    need = max(1, math.ceil(len(rare) * MIN_SHARED))
+    shared = Counter(other for g in rare for other in self.postings[g] if other != novel_id)
+    for other, count in shared.items():
+      if count >= need:
+        found.setdefault(other, None)
+    return found
+
+_index = TitleIndex()
+_index_version = None
+_lock = threading.Lock()
+
+def _novels_version(conn):
+  return conn.execute("SELECT value FROM change_counter WHERE name='novels'").fetchone()[0]
+
+def _changed_since(conn, version):
+  """(rows of the novels changed since version, ids deleted since)."""
+  rows = conn.execute("""
+    SELECT id, name, url, source, filepath FROM novels
+    WHERE id IN (SELECT novel_id FROM novels_sync WHERE version > ? AND deleted = 0)
+  """, (version,)).fetchall()
+  deleted = [r[0] for r in conn.execute("SELECT novel_id FROM novels_sync WHERE version > ? AND deleted = 1", (version,))]
+  return rows, deleted
+
+def refresh_duplicates():
+  """
+  Brings duplicate_pairs up to date with the novels table. The first run scores
+  the whole library, later ones only the novels changed since.
+
+  Returns:
+  int: number of novels rescored
+  """
+  global _index_version
+  with _lock:
+    conn = get_db_conn()
+    try:
+      # This process's index, loaded once and then patched with the changes
+      version = _novels_version(conn)
+      if _index_version is None:
+        for row in conn.execute("SELECT id, name, url, source, filepath FROM novels"):
+          _index.add(*row)
+      elif _index_version < version:
+        rows, deleted = _changed_since(conn, _index_version)
+        for novel_id in deleted:
+          _index.remove(novel_id)
+        for row in rows:
+          _index.add(*row)
+      _index_version = version
+
+      conn.execute("BEGIN IMMEDIATE")
+      done = conn.execute("SELECT value FROM change_counter WHERE name='duplicates'").fetchone()[0]
+      if done >= version:
+        conn.rollback()
+        return 0
+      if done == 0:
+        changed = set(_index.titles)
+        conn.execute("DELETE FROM duplicate_pairs")
+      else:
+        rows, deleted = _changed_since(conn, done)
+        changed = {row[0] for row in rows}
+        conn.execute("""
+          DELETE FROM duplicate_pairs
+          WHERE novel_a IN (SELECT value FROM json_each(?)) OR novel_b IN (SELECT value FROM json_each(?))
+        """, [json.dumps(sorted(changed | set(deleted)))] * 2)
+
+      pairs, seen = [], set()
+      for novel_id in changed:
+        if novel_id not in _index.titles:
+          continue
+        for other, exact in _index.candidates(novel_id).items():
+          pair = (min(novel_id, other), max(novel_id, other))
+          if pair in seen:
+            continue
+          seen.add(pair)
+          score = 100 if exact else title_score(_index.titles[novel_id], _index.titles[other])
+          if score >= STORE_SCORE:
+            pairs.append(pair + (score, exact or "title"))
+
+      conn.executemany("INSERT OR REPLACE INTO duplicate_pairs (novel_a, novel_b, score, reason) VALUES (?, ?, ?, ?)", pairs)
+      conn.execute("UPDATE change_counter SET value=? WHERE name='duplicates'", (version,))
+      conn.commit()
+      return len(changed)
+    finally:
+      conn.close()
+
+def duplicate_report(min_score=REPORT_SCORE, limit=500):
+  """Stored duplicate pairs scoring at least min_score, best first, with both novels' details."""
+  conn = get_db_conn()
+  rows = conn.execute("""
+    SELECT p.score, p.reason,
+           a.id, a.name, a.source, a.url, a.filepath, a.localchap,
+           b.id, b.name, b.source, b.url, b.filepath, b.localchap
+    FROM duplicate_pairs p
+    JOIN novels a ON a.id = p.novel_a
+    JOIN novels b ON b.id = p.novel_b
+    WHERE p.score >= ?
+    ORDER BY p.score DESC, p.novel_a, p.novel_b
+    LIMIT ?
+  """, (min_score, limit)).fetchall()
+  conn.close()
+
+  fields = ("id", "name", "source", "url", "filepath", "localchap")
+  return [{
+    "score": r[0],
+    "reason": r[1],
+    "a": dict(zip(fields, r[2:8])),
+    "b": dict(zip(fields, r[8:14])),
+  } for r in rows]
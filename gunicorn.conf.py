@@ -0,0 +1,28 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# /add, /update/<id>, /import-epub and /get-from-epub?get=all spend most of their
+# time waiting: on the politeness delay between Webnovel requests and on the
+# request itself. They are async views (see app.py) that await those waits and
+# hand SQLite and EPUB work to worker threads. Under WSGI, Flask still runs each
+# async view to completion on the thread that took the request, so threads
+# remain the unit of concurrency: plenty of them keep dozens of refreshes in
+# flight per worker while the table stays responsive. Threads share the worker's
+# pooled SQLite connections (db.get_db_conn()).
+#
+# Not gevent: its greenlets share one OS thread, and SQLite calls (which may wait
+# up to busy_timeout on a lock) and EPUB parsing would stall every other request
+# of the worker.
+#
+# Override any of these on the command line, e.g. --workers 4 --bind 0.0.0.0:8000
+bind = "127.0.0.1:5000"
+workers = 2
+worker_class = "gthread"
+# Requests in flight per worker, most of them waiting on the network
+threads = 32
+
+# /update/<id> may wait API_TIMEOUT per attempt, plus retries
+timeout = 120
+graceful_timeout = 30
+
+# Every worker imports the app itself and opens its own DB connections
+preload_app = False
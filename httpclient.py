@@ -0,0 +1,283 @@
+import asyncio, hashlib, json, os, tempfile, threading, time
+from db import get_value, get_setting
+from metrics import timed
+from urllib.parse import urlsplit
+
+# One pooled requests.Session per process: keep-alive connections are reused
+# across calls and threads. 429/5xx answers and connection errors are retried
+# with backoff by http_get() itself rather than by urllib3, so every retry
+# waits for its turn with the rate limiter like the first request.
+# requests is imported on first use, it is a large part of the app's import time.
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+RETRIES = 3
+# Seconds before the first retry, doubled for each one after it
+RETRY_BACKOFF = 1.0
+# Longest Retry-After a server can make us wait
+MAX_RETRY_AFTER = 60
+
+def get_session():
+  global _session, _session_pid
+  with _session_lock:
+    if _session is None or _session_pid != os.getpid():
+      import requests
+      from requests.adapters import HTTPAdapter
+      # No retries in the adapter, see http_get()
+      adapter = HTTPAdapter(max_retries=0, pool_connections=8,
+                            pool_maxsize=max(10, get_setting("BULK_WORKERS")))
+      session = requests.Session()
+      session.mount("https://", adapter)
+      session.mount("http://", adapter)
+      _session, _session_pid = session, os.getpid()
+    return _session
+
+class CachedResponse:
+  """The parts of requests.Response the scraper uses, for live and cached answers alike."""
+  def __init__(self, url, status_code, content, headers, from_cache=False):
+    self.url = url
+    self.status_code = status_code
+    self.content = content
+    self.headers = headers
+    self.from_cache = from_cache
+
+  @property
+  def ok(self):
+    return 200 <= self.status_code < 400
+
+  def json(self):
+    return json.loads(self.content)
+
+  def raise_for_status(self):
+    if not self.ok:
+      import requests
+      raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+def _cache_dir():
+  return get_value("HTTP_CACHE_DIR") or ".cache/http"
+
+# One file per URL: a line of JSON metadata followed by the body, so an entry is
+# always replaced as a whole and a reader never pairs one answer's metadata with
+# another one's body.
+def _cache_path(url):
+  key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+  return os.path.join(_cache_dir(), key[:2], f"{key}.entry")
+
+def _read_cache(url):
+  try:
+    with open(_cache_path(url), "rb") as f:
+      meta = json.loads(f.readline())
+      return meta, f.read()
+  except (OSError, ValueError):
+    return None, None
+
+# Files not written for HTTP_CACHE_KEEP_HOURS are deleted by prune_cache(), which
+# writes to the cache run at most every PRUNE_INTERVAL seconds per process. Until then an
+# entry past its TTL is still worth keeping for the conditional request.
+PRUNE_INTERVAL = 600
+_prune_lock = threading.Lock()
+_next_prune = 0.0
+
+def prune_cache(max_age=None):
+  """
+  Deletes cache entries, and any leftover temp files, last written more than
+  max_age seconds ago (default HTTP_CACHE_KEEP_HOURS).
+
+  Returns:
+  int: number of entries deleted
+  """
+  if max_age is None:
+    max_age = get_setting("HTTP_CACHE_KEEP_HOURS") * 3600
+  cutoff = time.time() - max_age
+  removed = 0
+  try:
+    folders = [e.path for e in os.scandir(_cache_dir()) if e.is_dir()]
+  except FileNotFoundError:
+    return 0
+  for folder in folders:
+    try:
+      old = [e for e in os.scandir(folder) if e.is_file() and e.stat().st_mtime < cutoff]
+    except FileNotFoundError:
+      continue
+    for entry in old:
+      try:
+        os.remove(entry.path)
+      except FileNotFoundError:
+        continue
+      removed += entry.name.endswith(".entry")
+  return removed
+
+def _maybe_prune():
+  global _next_prune
+  if time.monotonic() < _next_prune or not _prune_lock.acquire(blocking=False):
+    return
+  try:
+    _next_prune = time.monotonic() + PRUNE_INTERVAL
+    prune_cache()
+  except OSError as e:
+    print(f"⚠️ HTTP cache prune failed: {e}")
+  finally:
+    _prune_lock.release()
+
+def _write_cache(url, meta, body):
+  _maybe_prune()
+  path = _cache_path(url)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  # Write to a temp file of our own and rename, so readers never see half an entry
+  # and threads storing the same URL at once each replace it whole
+  fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+  try:
+    with os.fdopen(fd, "wb") as f:
+      f.write(json.dumps(meta).encode("utf-8") + b"\n")
+      f.write(body)
+    os.replace(tmp, path)
+  except BaseException:
+    try:
+      os.remove(tmp)
+    except OSError:
+      pass
+    raise
+
+def _retry_after(resp):
+  """Seconds the server asked us to wait in Retry-After, or None."""
+  value = resp.headers.get("Retry-After")
+  if not value:
+    return None
+  try:
+    seconds = float(value)
+  except ValueError:
+    from email.utils import parsedate_to_datetime
+    try:
+      seconds = parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+      return None
+  return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+def _lookup(url, headers, timeout, ttl):
+  """
+  The cache side of a GET before the request goes out.
+
+  Returns:
+  tuple: (hit, meta, body, send_headers, timeout), hit the CachedResponse to use
+  as is while the entry is within ttl, else None and send_headers carries the
+  conditional headers for revalidating it
+  """
+  if ttl is None:
+    ttl = get_setting("HTTP_CACHE_TTL")
+  timeout = timeout or get_setting("API_TIMEOUT")
+
+  meta, body = _read_cache(url)
+  if meta and time.time() - meta["fetched_at"] < ttl:
+    return CachedResponse(url, meta["status"], body, meta["headers"], from_cache=True), meta, body, None, timeout
+
+  send_headers = dict(headers or {})
+  if meta:
+    if meta["headers"].get("ETag"):
+      send_headers["If-None-Match"] = meta["headers"]["ETag"]
+    if meta["headers"].get("Last-Modified"):
+      send_headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+  return None, meta, body, send_headers, timeout
+
+def _store(url, meta, body, status_code, content, headers):
+  """Caches a live answer (or refreshes the entry on 304) and returns the CachedResponse to use."""
+  if status_code == 304 and meta:
+    meta["fetched_at"] = time.time()
+    _write_cache(url, meta, body)
+    return CachedResponse(url, meta["status"], body, meta["headers"], from_cache=True)
+
+  kept = {k: headers[k] for k in ("ETag", "Last-Modified", "Content-Type") if k in headers}
+  response = CachedResponse(url, status_code, content, kept)
+  if response.ok:
+    _write_cache(url, {"status": status_code, "headers": kept, "fetched_at": time.time()}, content)
+  return response
+
+def http_get(url, headers=None, timeout=None, ttl=None, throttle=None):
+  """
+  GET through the shared session with a short-lived on-disk cache.
+
+  Parameters:
+  ttl (float): seconds a cached answer is used without asking the server,
+    defaults to the HTTP_CACHE_TTL setting; 0 always revalidates
+  throttle (callable): called right before a request actually goes out,
+    retries included, e.g. the politeness rate limiter; cache hits skip it
+
+  Once the TTL is over, a cached answer with an ETag or Last-Modified is
+  revalidated with a conditional request and reused on 304.
+
+  Returns:
+  CachedResponse
+  """
+  hit, meta, body, send_headers, timeout = _lookup(url, headers, timeout, ttl)
+  if hit:
+    return hit
+
+  import requests
+  host = urlsplit(url).netloc
+  for attempt in range(RETRIES + 1):
+    if attempt:
+      with timed("throttle", host):
+        time.sleep(wait)
+    if throttle:
+      with timed("throttle", host):
+        throttle()
+    try:
+      with timed("http", host):
+        resp = get_session().get(url, headers=send_headers, timeout=timeout)
+    except (requests.ConnectionError, requests.Timeout):
+      if attempt == RETRIES:
+        raise
+      wait = RETRY_BACKOFF * 2 ** attempt
+      continue
+    if resp.status_code not in RETRY_STATUS or attempt == RETRIES:
+      break
+    wait = _retry_after(resp)
+    if wait is None:
+      wait = RETRY_BACKOFF * 2 ** attempt
+
+  return _store(url, meta, body, resp.status_code, resp.content, resp.headers)
+
+async def async_http_get(url, headers=None, timeout=None, ttl=None, throttle=None):
+  """
+  http_get() for async views: the request goes out through an httpx.AsyncClient
+  and the retry backoff is an asyncio sleep, so neither blocks the event loop.
+  Cache files are read and written in a worker thread.
+
+  Parameters:
+  throttle (callable): returns an awaitable, e.g. HostRateLimiter.wait_async
+
+  Returns:
+  CachedResponse
+  """
+  hit, meta, body, send_headers, timeout = await asyncio.to_thread(_lookup, url, headers, timeout, ttl)
+  if hit:
+    return hit
+
+  import httpx
+  host = urlsplit(url).netloc
+  # Flask runs every async view in an event loop of its own and a client cannot
+  # outlive its loop, so each call has its own; retries reuse its connection
+  async with httpx.AsyncClient() as client:
+    for attempt in range(RETRIES + 1):
+      if attempt:
+        with timed("throttle", host):
+          await asyncio.sleep(wait)
+      if throttle:
+        with timed("throttle", host):
+          await throttle()
+      try:
+        with timed("http", host):
+          resp = await client.get(url, headers=send_headers, timeout=timeout)
+      except httpx.TransportError:
+        if attempt == RETRIES:
+          raise
+        wait = RETRY_BACKOFF * 2 ** attempt
+        continue
+      if resp.status_code not in RETRY_STATUS or attempt == RETRIES:
+        break
+      wait = _retry_after(resp)
+      if wait is None:
+        wait = RETRY_BACKOFF * 2 ** attempt
+
+  return await asyncio.to_thread(_store, url, meta, body, resp.status_code, resp.content, resp.headers)
@@ -0,0 +1,176 @@
+import json, os, threading, time, uuid
+from db import get_db_conn
+
+# Jobs live in SQLite so every gunicorn worker sees the same queue. Each process
+# runs one worker thread; a job is claimed with a single UPDATE, and only while
+# no other job is running, so bulk runs are serialized across processes too.
+
+# A running job whose worker has not written a heartbeat for this long is
+# treated as dead (killed worker, restart) and marked as failed.
+STALE_AFTER = 300
+POLL_INTERVAL = 2
+
+# kind -> function(params dict, JobReport) returning (message, category)
+JOB_HANDLERS = {}
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def job_handler(kind):
+  def register(func):
+    JOB_HANDLERS[kind] = func
+    return func
+  return register
+
+class JobReport:
+  """
+  Progress sink handed to a running job.
+
+  Per-novel events are buffered and written together with the job counters
+  at most once a second, so reporting never costs a commit per row.
+  """
+  def __init__(self, job_id):
+    self.job_id = job_id
+    self.done = 0
+    self.errors = 0
+    self._events = []
+    self._last_flush = 0.0
+
+  def start(self, total):
+    conn = get_db_conn()
+    with conn:
+      conn.execute("UPDATE jobs SET total=?, heartbeat_at=? WHERE id=?", (total, time.time(), self.job_id))
+    conn.close()
+
+  def row(self, novel_id, name, error=None, message=None):
+    """Records one finished novel, failed when error is set."""
+    self.done += 1
+    if error:
+      self.errors += 1
+    if error or message:
+      self._events.append((self.job_id, novel_id, name, "error" if error else "info", error or message, time.time()))
+    if time.monotonic() - self._last_flush >= 1:
+      self.flush()
+
+  def heartbeat(self):
+    """Keeps the job from going stale during work that finishes no rows, at most a write a second."""
+    if time.monotonic() - self._last_flush >= 1:
+      self.flush()
+
+  def flush(self):
+    conn = get_db_conn()
+    with conn:
+      conn.executemany("""
+        INSERT INTO job_events (job_id, novel_id, name, level, message, created_at) VALUES (?, ?, ?, ?, ?, ?)
+      """, self._events)
+      conn.execute("UPDATE jobs SET done=?, errors=?, heartbeat_at=? WHERE id=?",
+                   (self.done, self.errors, time.time(), self.job_id))
+    conn.close()
+    self._events = []
+    self._last_flush = time.monotonic()
+
+def submit_job(kind, params):
+  """Queues a job and makes sure this process has a worker for it. Returns the job id."""
+  conn = get_db_conn()
+  with conn:
+    cur = conn.execute("INSERT INTO jobs (kind, params, status, created_at) VALUES (?, ?, 'queued', ?)",
+                       (kind, json.dumps(params), time.time()))
+  conn.close()
+  start_worker()
+  return cur.lastrowid
+
+def get_job(job_id, events_after=None, event_limit=50):
+  """
+  Job status as a dict with progress, ETA and the latest per-novel events,
+  or None if there is no such job.
+  """
+  conn = get_db_conn()
+  row = conn.execute("""
+    SELECT id, kind, status, total, done, errors, message, created_at, started_at, finished_at
+    FROM jobs WHERE id=?
+  """, (job_id,)).fetchone()
+  if row is None:
+    conn.close()
+    return None
+
+  if events_after is None:
+    events = conn.execute("""
+      SELECT * FROM (
+        SELECT id, novel_id, name, level, message, created_at FROM job_events
+        WHERE job_id=? ORDER BY id DESC LIMIT ?
+      ) ORDER BY id
+    """, (job_id, event_limit)).fetchall()
+  else:
+    events = conn.execute("""
+      SELECT id, novel_id, name, level, message, created_at FROM job_events
+      WHERE job_id=? AND id>? ORDER BY id LIMIT ?
+    """, (job_id, events_after, event_limit)).fetchall()
+  conn.close()
+
+  job = dict(zip(("id", "kind", "status", "total", "done", "errors", "message", "created_at", "started_at", "finished_at"), row))
+  started, done, total = job["started_at"], job["done"] or 0, job["total"] or 0
+  elapsed = ((job["finished_at"] or time.time()) - started) if started else 0
+  job["elapsed"] = round(elapsed, 1)
+  job["eta"] = round(elapsed / done * (total - done), 1) if job["status"] == "running" and done else None
+  job["events"] = [dict(zip(("id", "novel_id", "name", "level", "message", "created_at"), e)) for e in events]
+  return job
+
+def _claim_job(token):
+  conn = get_db_conn()
+  with conn:
+    # Jobs left running by a dead worker would block the queue forever
+    conn.execute("""
+      UPDATE jobs SET status='error', message='Worker stopped before the job finished', finished_at=?
+      WHERE status='running' AND heartbeat_at < ?
+    """, (time.time(), time.time() - STALE_AFTER))
+    conn.execute("""
+      UPDATE jobs SET status='running', worker=?, started_at=?, heartbeat_at=?
+      WHERE id = (SELECT id FROM jobs WHERE status='queued' ORDER BY id LIMIT 1)
+        AND NOT EXISTS (SELECT 1 FROM jobs WHERE status='running')
+    """, (token, time.time(), time.time()))
+  row = conn.execute("SELECT id, kind, params FROM jobs WHERE worker=? AND status='running'", (token,)).fetchone()
+  conn.close()
+  return row
+
+def _finish_job(job_id, status, message):
+  conn = get_db_conn()
+  with conn:
+    conn.execute("UPDATE jobs SET status=?, message=?, finished_at=? WHERE id=?",
+                 (status, message, time.time(), job_id))
+  conn.close()
+
+def run_next_job():
+  """Claims and runs one queued job. Returns False when there was nothing to run."""
+  token = f"{os.getpid()}-{uuid.uuid4().hex}"
+  claimed = _claim_job(token)
+  if claimed is None:
+    return False
+
+  job_id, kind, params = claimed
+  report = JobReport(job_id)
+  try:
+    message, category = JOB_HANDLERS[kind](json.loads(params or "{}"), report)
+    report.flush()
+    _finish_job(job_id, "error" if category == "error" else "done", message)
+  except Exception as e:
+    print(f"❌ Job {job_id} ({kind}) failed: {e}")
+    report.flush()
+    _finish_job(job_id, "error", str(e))
+  return True
+
+def _worker_loop():
+  while True:
+    try:
+      while run_next_job():
+        pass
+    except Exception as e:
+      print(f"❌ Job worker error: {e}")
+    time.sleep(POLL_INTERVAL)
+
+def start_worker():
+  """Starts this process's job worker thread once (again after a fork)."""
+  global _worker
+  with _worker_lock:
+    if _worker is None or not _worker.is_alive():
+      _worker = threading.Thread(target=_worker_loop, name="job-worker", daemon=True)
+      _worker.start()
@@ -0,0 +1,188 @@
+import contextvars, os, threading, time
+from contextlib import contextmanager
+
+# Timing histograms, served in Prometheus text format at /metrics.
+# Every gunicorn worker counts into its own memory and a flusher thread adds those
+# counts to the shared metric_values table every FLUSH_SECONDS, so /metrics shows
+# the totals of all workers, those that have since restarted included.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+FLUSH_SECONDS = 5
+
+_registry = {}
+_registry_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flusher_lock = threading.Lock()
+# The running request's Server-Timing totals and start time. Context variables rather
+# than thread locals, so work an async view hands to asyncio.to_thread() counts too
+_timings = contextvars.ContextVar("timings", default=None)
+_started = contextvars.ContextVar("started", default=0.0)
+_flusher = None
+_flusher_pid = None
+
+class Histogram:
+  """A Prometheus histogram with a fixed set of label names."""
+  def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    self.name = name
+    self.help = help
+    self.labels = tuple(labels)
+    self.buckets = tuple(buckets)
+    self._series = {}  # label values -> [bucket counts..., sum, count] not flushed yet
+    self._lock = threading.Lock()
+
+  def observe(self, value, **labels):
+    key = tuple(str(labels.get(l, "")) for l in self.labels)
+    with self._lock:
+      series = self._series.get(key)
+      if series is None:
+        series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+      for i, bound in enumerate(self.buckets):
+        if value <= bound:
+          series[i] += 1
+      series[-2] += value
+      series[-1] += 1
+
+  def take(self):
+    """Returns the counts observed since the last take() and starts over."""
+    with self._lock:
+      series, self._series = self._series, {}
+    return series
+
+  def put_back(self, taken):
+    """Adds counts from take() back, when they could not be flushed."""
+    with self._lock:
+      for key, values in taken.items():
+        series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        for i, value in enumerate(values):
+          series[i] += value
+
+  def render(self, series_by_key):
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+    for key, series in sorted(series_by_key.items()):
+      base = [f'{l}="{_escape(v)}"' for l, v in zip(self.labels, key)]
+      for bound, count in zip(list(self.buckets) + ["+Inf"], series[:len(self.buckets)] + [series[-1]]):
+        bucket_labels = ",".join(base + [f'le="{bound}"'])
+        lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+      labels = f"{{{','.join(base)}}}" if base else ""
+      lines.append(f"{self.name}_sum{labels} {series[-2]}")
+      lines.append(f"{self.name}_count{labels} {series[-1]}")
+    return lines
+
+def _escape(value):
+  return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+  """Returns the registered histogram called name, creating it on first use."""
+  with _registry_lock:
+    if name not in _registry:
+      _registry[name] = Histogram(name, help, labels, buckets)
+    return _registry[name]
+
+REQUEST_SECONDS = histogram("novel_tracker_request_seconds", "Time to answer a request", ("route", "method", "status"))
+REQUEST_SQL_SECONDS = histogram("novel_tracker_request_sql_seconds", "Time spent in SQL per request", ("route",))
+STAGE_SECONDS = histogram("novel_tracker_stage_seconds",
+                          "Time spent in a stage: epub parsing, http fetches, throttle sleeps, tasks",
+                          ("stage", "detail"))
+
+def add_time(stage, seconds):
+  """Adds time to the current request's Server-Timing entry for stage, if a request is running."""
+  timings = _timings.get()
+  if timings is not None:
+    timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def timed(stage, detail=""):
+  """Times the block into STAGE_SECONDS and the current request's Server-Timing."""
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    elapsed = time.perf_counter() - start
+    STAGE_SECONDS.observe(elapsed, stage=stage, detail=detail)
+    add_time(stage, elapsed)
+
+def begin_request():
+  _timings.set({})
+  _started.set(time.perf_counter())
+
+def end_request(route, method, status):
+  """
+  Records the finished request in the histograms.
+
+  Returns:
+  str: Server-Timing header value, e.g. "sql;dur=3.1, http;dur=250.0, total;dur=260.4"
+  """
+  timings = _timings.get()
+  if timings is None:
+    return ""
+  total = time.perf_counter() - _started.get()
+  _timings.set(None)
+  REQUEST_SECONDS.observe(total, route=route, method=method, status=status)
+  REQUEST_SQL_SECONDS.observe(timings.get("sql", 0.0), route=route)
+  parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+  return ", ".join(parts + [f"total;dur={total * 1000:.1f}"])
+
+def flush_metrics():
+  """Adds this process's counts since the last flush to metric_values."""
+  import db  # db imports this module for add_time
+  with _registry_lock:
+    histograms = list(_registry.values())
+  with _flush_lock:
+    taken = [(h, h.take()) for h in histograms]
+    # slot i < len(buckets) is bucket i, then the sum and the count
+    rows = [(h.name, "\x1f".join(key), slot, value)
+            for h, series in taken for key, values in series.items() for slot, value in enumerate(values)]
+    if not rows:
+      return
+    conn = db.get_db_conn()
+    try:
+      with conn:
+        conn.executemany("""
+          INSERT INTO metric_values (name, labels, slot, value) VALUES (?, ?, ?, ?)
+          ON CONFLICT (name, labels, slot) DO UPDATE SET value = value + excluded.value
+        """, rows)
+    except Exception:
+      for h, series in taken:
+        h.put_back(series)
+      raise
+    finally:
+      conn.close()
+
+def _flusher_loop():
+  while True:
+    time.sleep(FLUSH_SECONDS)
+    try:
+      flush_metrics()
+    except Exception as e:
+      print(f"❌ Metrics flush error: {e}")
+
+def start_flusher():
+  """Starts this process's metrics flusher thread once (again after a fork)."""
+  global _flusher, _flusher_pid
+  with _flusher_lock:
+    if _flusher is None or _flusher_pid != os.getpid() or not _flusher.is_alive():
+      _flusher = threading.Thread(target=_flusher_loop, name="metrics-flusher", daemon=True)
+      _flusher.start()
+      _flusher_pid = os.getpid()
+
+def render_metrics():
+  """All workers' histograms in the Prometheus text exposition format."""
+  import db
+  flush_metrics()
+  with _registry_lock:
+    histograms = list(_registry.values())
+  conn = db.get_db_conn()
+  try:
+    stored = conn.execute("SELECT name, labels, slot, value FROM metric_values").fetchall()
+  finally:
+    conn.close()
+  by_name = {h.name: (h, {}) for h in histograms}
+  for name, labels, slot, value in stored:
+    if name not in by_name:
+      continue
+    h, series_by_key = by_name[name]
+    key = tuple(labels.split("\x1f")) if h.labels else ()
+    series = series_by_key.setdefault(key, [0] * len(h.buckets) + [0.0, 0])
+    if slot < len(series):
+      series[slot] = value if slot == len(h.buckets) else int(value)
+  return "\n".join(line for h, series_by_key in by_name.values() for line in h.render(series_by_key)) + "\n"
@@ -0,0 +1,169 @@
+import random, threading, time
+from datetime import datetime
+from db import get_db_conn, get_setting
+from jobs import submit_job
+from sources import SOURCES
+
+# Adaptive refresh scheduling: instead of asking the API about every novel on
+# every run, each row with an online source gets a next_check time in refresh_schedule.
+# Active serials come up every few hours, completed or long dead ones once a month.
+
+HOUR = 3600
+DAY = 24 * HOUR
+MIN_INTERVAL = 6 * HOUR
+MAX_INTERVAL = 30 * DAY
+CADENCE_WEIGHT = 0.3  # weight of the newest sample in the per-novel cadence average
+FAILURE_INTERVAL = HOUR  # wait after a failed check, doubled for every failure in a row
+FINISHED_STATUSES = ("completed", "complete", "finished", "dropped")
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def _parse_time(value):
+  try:
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f').timestamp()
+  except (TypeError, ValueError):
+    return None
+
+def next_check_interval(status, latestchaptime, cadence=None, misses=0, now=None):
+  """
+  Seconds to wait before asking the API about a novel again.
+
+  Parameters:
+  status (str): the novel's status column, completed books are checked rarely
+  latestchaptime (str): time of the newest known chapter
+  cadence (float): average days between chapters seen so far, None if unknown
+  misses (int): checks in a row that found no new chapter
+
+  Returns:
+  float: seconds, between MIN_INTERVAL and MAX_INTERVAL
+  """
+  now = now or time.time()
+  status = (status or "").strip().lower()
+  if status in FINISHED_STATUSES:
+    return MAX_INTERVAL
+
+  last = _parse_time(latestchaptime)
+  age = (now - last) / DAY if last else None
+
+  if cadence:
+    expected = cadence
+    # Far behind its usual pace the book is most likely on a break
+    if age is not None and age > 4 * cadence:
+      expected = max(expected, age / 2)
+  elif age is not None:
+    expected = max(age / 2, 0.25)
+  else:
+    expected = 1.0
+  if status == "hiatus":
+    expected = max(expected, 7)
+
+  # Back off a little more after every empty check
+  interval = expected * DAY * 1.5 ** min(misses, 8)
+  return min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+
+def plan_next_check(status, old_chap, old_time, new_chap, new_time, cadence=None, misses=0, now=None):
+  """
+  Works out the schedule row after one API check of a novel.
+
+  Returns:
+  tuple: (next_check, last_check, cadence, misses, failures) for refresh_schedule
+  """
+  now = now or time.time()
+  if new_chap is not None and old_chap is not None and new_chap > old_chap:
+    before, after = _parse_time(old_time), _parse_time(new_time)
+    if before and after and after > before:
+      sample = max((after - before) / DAY / (new_chap - old_chap), 0.01)
+      cadence = sample if not cadence else CADENCE_WEIGHT * sample + (1 - CADENCE_WEIGHT) * cadence
+    misses = 0
+  else:
+    misses = (misses or 0) + 1
+
+  interval = next_check_interval(status, new_time or old_time, cadence, misses, now)
+  # Spread rows checked together so they do not all come due in the same minute
+  interval *= random.uniform(0.9, 1.1)
+  return now + interval, now, cadence, misses, 0
+
+def plan_failed_check(cadence=None, misses=0, failures=0, now=None):
+  """
+  Schedule row after a check that raised: FAILURE_INTERVAL, doubled for every
+  failure in a row up to MAX_INTERVAL, so a broken row leaves the due set.
+  cadence and misses are kept as they were.
+
+  Returns:
+  tuple: (next_check, last_check, cadence, misses, failures) for refresh_schedule
+  """
+  now = now or time.time()
+  failures = (failures or 0) + 1
+  interval = min(MAX_INTERVAL, FAILURE_INTERVAL * 2 ** min(failures - 1, 10))
+  return now + interval * random.uniform(0.9, 1.1), now, cadence, misses or 0, failures
+
+def load_schedule(conn):
+  """novel_id -> (cadence, misses, failures) for every scheduled novel."""
+  rows = conn.execute("SELECT novel_id, cadence, misses, failures FROM refresh_schedule").fetchall()
+  return {row[0]: row[1:] for row in rows}
+
+def save_schedule(conn, rows):
+  """Upserts (novel_id, next_check, last_check, cadence, misses, failures) rows, inside the caller's transaction."""
+  conn.executemany("""
+    INSERT INTO refresh_schedule (novel_id, next_check, last_check, cadence, misses, failures) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(novel_id) DO UPDATE SET next_check=excluded.next_check, last_check=excluded.last_check,
+      cadence=excluded.cadence, misses=excluded.misses, failures=excluded.failures
+  """, rows)
+
+def due_novel_ids(conn, now=None, limit=None):
+  """
+  Ids of rows with an online source (see sources.py) whose next check is due, most
+  overdue first. Rows never checked come first, the ones updated most often before the rest.
+  """
+  online, params = [], []
+  for adapter in SOURCES.values():
+    online.append("n.source = ?")
+    params.append(adapter.name)
+    for domain in adapter.domains:
+      online.append("n.url LIKE ?")
+      params.append(f"%{domain}.%")
+  if not online:
+    return []
+  query = f"""
+    SELECT n.id FROM novels n LEFT JOIN refresh_schedule s ON s.novel_id = n.id
+    WHERE ({" OR ".join(online)}) AND (s.next_check IS NULL OR s.next_check <= ?)
+    ORDER BY s.next_check IS NOT NULL, s.next_check, n.updated_count DESC
+  """
+  params.append(now or time.time())
+  if limit:
+    query += " LIMIT ?"
+    params.append(limit)
+  return [row[0] for row in conn.execute(query, params)]
+
+def _claim_auto_refresh(every):
+  # One process per period wins the UPDATE, so gunicorn workers do not all enqueue a run
+  now = time.time()
+  conn = get_db_conn()
+  with conn:
+    conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('LAST_AUTO_REFRESH', '')")
+    claimed = conn.execute("""
+      UPDATE settings SET value=? WHERE key='LAST_AUTO_REFRESH' AND (value='' OR CAST(value AS REAL) <= ?)
+    """, (str(now), now - every)).rowcount
+    pending = conn.execute("SELECT 1 FROM jobs WHERE kind='refresh_due' AND status IN ('queued', 'running')").fetchone()
+  conn.close()
+  return claimed and not pending
+
+def _refresher_loop():
+  while True:
+    try:
+      minutes = get_setting("AUTO_REFRESH_MINUTES")
+      if minutes > 0 and _claim_auto_refresh(minutes * 60):
+        job_id = submit_job("refresh_due", {})
+        print(f">> Auto refresh queued as job {job_id}")
+    except Exception as e:
+      print(f"❌ Auto refresh error: {e}")
+    time.sleep(60)
+
+def start_refresher():
+  """Starts this process's periodic refresh thread once (again after a fork)."""
+  global _refresher
+  with _refresher_lock:
+    if _refresher is None or not _refresher.is_alive():
+      _refresher = threading.Thread(target=_refresher_loop, name="auto-refresh", daemon=True)
+      _refresher.start()
@@ -1,8 +1,16 @@
-import random, requests, re, time, threading, tldextract, zlib
-from db import get_db_conn, get_value 
+import json, multiprocessing, os, posixpath, time, threading, zipfile, zlib
+import xml.etree.ElementTree as ET
+from db import get_db_conn, get_value, get_setting, get_epub_files, novel_update_sql
+from jobs import job_handler
+from scheduler import plan_next_check, plan_failed_check, load_schedule, save_schedule, due_novel_ids
+from sources import source_for, url_domain
+from covers import store_cover
+from metrics import timed, STAGE_SECONDS
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 from datetime import datetime
-from ebooklib import epub
 from pathlib import Path
+from urllib.parse import unquote
 from functools import wraps
 
 # Create a lock
@@ -14,6 +22,7 @@ def timer(func):
     start = time.perf_counter()
     result = func(*args, **kwargs)
     end = time.perf_counter()
+    STAGE_SECONDS.observe(end - start, stage="task", detail=func.__name__)
     print(f"{func.__name__} took {end - start:.4f} seconds")
     return result
   return wrapper
@@ -25,10 +34,223 @@ def epub_count_chapters(toc):
       section, children = item
       total += epub_count_chapters(children)
     else:
-      if 'volume' not in item.title.lower() and 'chapter' in item.title.lower():
+      if is_chapter_title(item.title):
         total += 1
   return total
 
+def is_chapter_title(title):
+  return 'volume' not in title.lower() and 'chapter' in title.lower()
+
+def _tag(elem):
+  return elem.tag.rsplit('}', 1)[-1]
+
+def _count_ncx_chapters(stream):
+  """
+  Counts leaf navPoints of a toc.ncx the way epub_count_chapters counts ebooklib Links.
+  Streams the file with iterparse and drops each navPoint once it is counted.
+  """
+  total = 0
+  stack = []  # [label, child_count] per open navPoint
+  for event, elem in ET.iterparse(stream, events=("start", "end")):
+    tag = _tag(elem)
+    if event == "start":
+      if tag == "navPoint":
+        stack.append([None, 0])
+      continue
+
+    if tag == "navLabel" and stack:
+      stack[-1][0] = elem[0].text if len(elem) else None
+    elif tag == "navPoint":
+      label, children = stack.pop()
+      if stack:
+        stack[-1][1] += 1
+      if children == 0:
+        if label is None:
+          raise ValueError("navPoint without a label")
+        total += is_chapter_title(label)
+      elem.clear()
+  return total
+
+def _count_nav_chapters(stream):
+  """
+  Counts links of the EPUB3 nav.xhtml toc list the way ebooklib's nav parser builds them:
+  an <li> with a nested <ol> is a section, an <li> with a direct <a href> is a chapter link.
+  """
+  total = 0
+  path = []
+  in_toc = False
+  for event, elem in ET.iterparse(stream, events=("start", "end")):
+    tag = _tag(elem)
+    if event == "start":
+      if tag == "nav" and not in_toc and "toc" in elem.attrib.values():
+        in_toc = True
+        path = []
+      elif in_toc:
+        path.append(tag)
+      continue
+
+    if not in_toc:
+      continue
+    if tag == "nav" and not path:
+      return total
+    path.pop()
+
+    # ebooklib only reads the first <ol> directly under the toc nav
+    if tag == "ol" and not path:
+      return total
+    # and only <li> reached through nav > ol > (li > ol)*
+    if tag == "li" and len(path) % 2 == 1 and all(t == ("ol", "li")[n % 2] for n, t in enumerate(path)):
+      children = {_tag(c): c for c in reversed(elem)}
+      link = children.get("a")
+      if "ol" not in children and link is not None and link.get("href"):
+        total += is_chapter_title("".join(link.itertext()))
+      elem.clear()
+  if not in_toc:
+    raise ValueError("nav document has no toc")
+  return total
+
+def _read_opf(zf):
+  """Returns (opf_dir, opf root element) for an open EPUB zip."""
+  container = ET.fromstring(zf.read("META-INF/container.xml"))
+  for rootfile in container.iter():
+    if _tag(rootfile) == "rootfile" and rootfile.get("media-type") == "application/oebps-package+xml":
+      opf_file = rootfile.get("full-path")
+      return posixpath.dirname(opf_file), ET.fromstring(zf.read(opf_file))
+  raise ValueError("container.xml has no OPF rootfile")
+
+def _count_toc_chapters(zf, opf_dir, opf):
+  # Same preference as ebooklib: nav.xhtml when present, toc.ncx otherwise
+  manifest = [i for i in opf.iter() if _tag(i) == "item"]
+  nav = next((i for i in manifest if i.get("media-type") == "application/xhtml+xml"
+              and "nav" in (i.get("properties") or "").split()), None)
+  if nav is not None:
+    with zf.open(posixpath.join(opf_dir, nav.get("href"))) as f:
+      return _count_nav_chapters(f)
+
+  spine = next((s for s in opf.iter() if _tag(s) == "spine"), None)
+  toc_id = spine.get("toc") if spine is not None else None
+  ncx = next((i for i in manifest if i.get("id") == toc_id), None)
+  if ncx is None:
+    raise ValueError("EPUB has neither nav.xhtml nor toc.ncx")
+  with zf.open(posixpath.join(opf_dir, unquote(ncx.get("href")))) as f:
+    return _count_ncx_chapters(f)
+
+def count_epub_chapters_fast(full_path):
+  """
+  Counts TOC chapters straight from the zip, reading only container.xml, the OPF
+  and the nav/NCX file. Gives the same number as epub_count_chapters(book.toc).
+  """
+  with zipfile.ZipFile(full_path) as zf:
+    opf_dir, opf = _read_opf(zf)
+    return _count_toc_chapters(zf, opf_dir, opf)
+
+def parse_epub_fast(full_path):
+  """parse_epub() without ebooklib: only the OPF and the nav/NCX are read from the zip."""
+  with zipfile.ZipFile(full_path) as zf:
+    opf_dir, opf = _read_opf(zf)
+
+    def first(name):
+      elem = next((e for e in opf.iter() if e.tag == f"{{http://purl.org/dc/elements/1.1/}}{name}"), None)
+      return elem.text.strip() if elem is not None and elem.text else ""
+
+    images = [i for i in opf.iter() if _tag(i) == "item"
+              and i.get("media-type") in ("image/jpeg", "image/jpg", "image/png", "image/svg+xml")]
+    cover_item = next((i for i in images if "cover-image" in (i.get("properties") or "").split()), None) \
+      or next(iter(images), None)
+
+    return {
+      "title": first('title'),
+      "url": first('source'),
+      "author": first('creator'),
+      "description": first('description'),
+      "chapters": _count_toc_chapters(zf, opf_dir, opf),
+      "cover_href": "/".join(filter(None, [opf_dir, unquote(cover_item.get("href"))])) if cover_item is not None else "",
+    }
+
+def parse_epub(full_path):
+  """
+  Reads an EPUB once and collects everything the app needs from it.
+  Tries the zip fast path first and only loads the whole book through
+  ebooklib when that fails.
+
+  Returns:
+  dict: title, url, author, description, chapters, cover_href
+  (cover_href is the zip member holding the cover image, or "")
+  """
+  try:
+    with timed("epub", "fast"):
+      return parse_epub_fast(full_path)
+  except Exception as e:
+    print(f"⚠️ Fast EPUB parse failed for {full_path}, falling back to ebooklib: {e}")
+    with timed("epub", "ebooklib"):
+      return parse_epub_ebooklib(full_path)
+
+def parse_epub_ebooklib(full_path):
+  """parse_epub() through ebooklib, loading every item of the book."""
+  from ebooklib import epub  # only needed when the fast path fails, keep it out of startup
+  reader = epub.EpubReader(full_path)
+  book = reader.load()
+  reader.process()
+
+  def first(name):
+    values = book.get_metadata('DC', name)
+    return values[0][0].strip() if values and values[0][0] else ""
+
+  # Official EPUB cover (type 10) first, else the first image
+  items = list(book.get_items())
+  cover_item = next((i for i in items if i.get_type() == 10), None) \
+    or next((i for i in items if i.get_type() == 1), None)
+
+  return {
+    "title": first('title'),
+    "url": first('source'),
+    "author": first('creator'),
+    "description": first('description'),
+    "chapters": epub_count_chapters(book.toc),
+    "cover_href": "/".join(filter(None, [reader.opf_dir, cover_item.file_name])) if cover_item else "",
+  }
+
+def analyze_epub(epub_path):
+  """
+  Returns the parse_epub() summary for a file under LOCAL_EPUB_DIR.
+
+  Summaries are kept in the epub_cache table keyed on path + mtime + size,
+  so a file is only parsed again after it changes on disk.
+  """
+  full_path = os.path.realpath(Path(get_value("LOCAL_EPUB_DIR")) / epub_path)
+  st = os.stat(full_path)
+
+  conn = get_db_conn()
+  summary = cached_epub_summary(conn, full_path, st.st_mtime, st.st_size)
+  conn.close()
+  if summary:
+    return summary
+
+  summary = parse_epub(full_path)
+
+  conn = get_db_conn()
+  with conn:
+    save_epub_summaries(conn, [(full_path, st.st_mtime, st.st_size, summary)])
+  conn.close()
+  return summary
+
+EPUB_SUMMARY_FIELDS = ("title", "url", "author", "description", "chapters", "cover_href")
+
+def cached_epub_summary(conn, full_path, mtime, size):
+  """The epub_cache summary of a file if it has not changed since, else None."""
+  row = conn.execute("""
+    SELECT title, url, author, description, chapters, cover_href
+    FROM epub_cache WHERE path = ? AND mtime = ? AND size = ?
+  """, (full_path, mtime, size)).fetchone()
+  return dict(zip(EPUB_SUMMARY_FIELDS, row)) if row else None
+
+def save_epub_summaries(conn, entries):
+  """Stores (full_path, mtime, size, summary) entries in epub_cache, inside the caller's transaction."""
+  conn.executemany("""
+    INSERT OR REPLACE INTO epub_cache (path, mtime, size, title, url, author, description, chapters, cover_href)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+  """, [(path, mtime, size) + tuple(summary[f] for f in EPUB_SUMMARY_FIELDS) for path, mtime, size, summary in entries])
+
 def extract_epub_cover(epub_path=None, getfrom="local", meta=None):
   """
   Extracts the cover image from an EPUB file OR downloads it from Webnovel.
@@ -73,49 +295,32 @@ def extract_epub_cover(epub_path=None, getfrom="local", meta=None):
     # 1) FETCH COVER LOCALLY FROM EPUB
     # ========================================================
     if getfrom == "local":
-      try:
-        book = epub.read_epub(full_path)
-      except Exception as e:
-        raise
-
-      cover_item = None
-
-      # First: Try official EPUB "cover" (type 10)
-      for item in book.get_items():
-        if item.get_type() == 10:
-          cover_item = item
-          break
-
-      # If not found, fallback: first image
-      if cover_item is None:
-        for item in book.get_items():
-          if item.get_type() == 1:
-            cover_item = item
-            break
+      cover_href = analyze_epub(epub_path)["cover_href"]
 
-      if cover_item is None:
+      if not cover_href:
         print("⚠️ No image found in EPUB.")
-        raise
+        return ""
 
-      cover_data = cover_item.get_content()
+      # Read just the cover member instead of loading the whole book again
+      with zipfile.ZipFile(full_path) as zf:
+        cover_data = zf.read(cover_href)
 
     # ========================================================
-    # 2) FETCH COVER ONLINE (WEBNOVEL ONLY)
+    # 2) FETCH COVER ONLINE (SOURCES WITH A COVER URL)
     # ========================================================
     else:
       print("🌐 ONLINE COVER REQUEST...")
 
-      # Only Webnovel has predictable image URL
-      if src == "webnovel":
-        book_id = extract_book_id(url)
-        if not book_id:
-          return extract_epub_cover(epub_path, "local", meta)
-
-        img_url = f"{get_value('IMG_ENDPOINT')}{book_id}/180.jpg"
-        print(f"➡️ Downloading Webnovel image: {img_url}")
+      adapter = source_for(src, url)
+      book_id = adapter.book_id(url) if adapter else None
+      img_url = adapter.cover_url(book_id) if book_id else None
+      if img_url:
+        print(f"➡️ Downloading {adapter.name} image: {img_url}")
 
         try:
-          response = requests.get(img_url, timeout=int(get_value("API_TIMEOUT")))
+          # Covers rarely change, keep them cached for a day. Fetched through the
+          # source, so they share its politeness delay and concurrency limit.
+          response = adapter.get(img_url, timeout=get_setting("API_TIMEOUT"), ttl=86400)
           if response.ok:
             cover_data = response.content
           else:
@@ -129,12 +334,10 @@ def extract_epub_cover(epub_path=None, getfrom="local", meta=None):
         return extract_epub_cover(epub_path, "local", meta)
 
     # ========================================================
-    # 3) WRITE FILE
+    # 3) WRITE FILE (as WebP, with thumbnails)
     # ========================================================
     if cover_data:
-      with open(cover_path, "wb") as f:
-        f.write(cover_data)
-      return str(cover_id)
+      return store_cover(cover_id, cover_data)
 
     print("⚠️ No cover_data found, returning empty.")
     return ""
@@ -159,13 +362,8 @@ def extract_local_chap(epub_path=None):
     return 0
 
   try:
-    epub_path = str(Path(get_value("LOCAL_EPUB_DIR")) / epub_path)
-    # Read the EPUB file
-    book = epub.read_epub(epub_path)
-
-    
     # Check the length of the table of contents
-    toc_len = epub_count_chapters(book.toc)
+    toc_len = analyze_epub(epub_path)["chapters"]
 
     if toc_len > 0:  # check for positive length and an int
       return toc_len
@@ -185,126 +383,168 @@ def get_epub_metadata(epub_path):
   Returns a dictionary with keys:
   url, source, author, description, cover_id, title
   """
-  data = {
-    "url": "",
-    "source": "",
-    "author": "",
-    "description": "",
-    "cover_id": "",
-    "title": ""
-  }
-
   try:
-    full_path = str(Path(get_value("LOCAL_EPUB_DIR")) / epub_path)
-    book = epub.read_epub(full_path)
-
-    url_list = book.get_metadata('DC', 'source')
-    author_list = book.get_metadata('DC', 'creator')
-    desc_list = book.get_metadata('DC', 'description')
-    title_list = book.get_metadata('DC', 'title')
-
-    if url_list: data["url"] = url_list[0][0].strip()
-    if author_list: data["author"] = author_list[0][0].strip()
-    if desc_list: data["description"] = desc_list[0][0].strip()
-    if title_list: data["title"] = title_list[0][0].strip()
-
-    if data["url"]:
-      data["source"] = tldextract.extract(data["url"]).domain
-      if data["source"] == "webnovel":
-        cover_filename = f"{extract_book_id(data['url'])}.webp" 
-      else:
-        # fallback: safe filename from title 
-        safe_title = zlib.crc32(data["title"].encode("utf-8"))
-        cover_filename = f"{safe_title}.webp"
-      
-    data["cover_id"] = str(cover_filename)
+    return epub_metadata(analyze_epub(epub_path))
 
   except Exception as e:
     print(f"⚠️ Failed to read EPUB metadata: {e}")
     raise
 
+def epub_metadata(summary):
+  """get_epub_metadata() for an already parsed EPUB summary."""
+  data = {
+    "url": summary["url"],
+    "source": "",
+    "author": summary["author"],
+    "description": summary["description"],
+    "cover_id": "",
+    "title": summary["title"]
+  }
+
+  if data["url"]:
+    data["source"] = url_domain(data["url"])
+  adapter = source_for(data["source"], data["url"])
+  online_id = adapter.book_id(data["url"]) if adapter else None
+  if online_id:
+    cover_filename = adapter.cover_id(online_id)
+  else:
+    # fallback: safe filename from title 
+    safe_title = zlib.crc32(data["title"].encode("utf-8"))
+    cover_filename = f"{safe_title}.webp"
+    
+  data["cover_id"] = str(cover_filename)
   return data
 
-def extract_book_id(url):
+def refresh_novel_row(book, onlinechap=0, localchap=0, gettitle=0, geturl=0, get_audecco=0, cover=0, check_epub=0, epub_index=None):
   """
-  Extracts the Webnovel book ID from a given URL.
-
-  Parameters:
-  url (str): The URL string from which to extract the book ID.
+  Works out the changes for one novel row of the bulk updater.
+  Only touches the DB through the EPUB cache, so it is safe to run from a worker thread.
+  epub_index is the set of files in LOCAL_EPUB_DIR used for the check_epub lookup.
 
   Returns:
-  str: The extracted book ID if found, or None if not found.
+  tuple: (changes, messages, epub_missing) where changes maps column -> new value
   """
-  # Define patterns to search for book ID
-  patterns = [
-    r'_(\d{8,})$',  # Match book IDs after an underscore at the end
-    r'/book/(\d{8,})',  # Match book IDs in '/book/' path
-    r'(\d{8,})'  # Match any sequence of digits of length 8 or more
-  ]
-
-  for pattern in patterns:
-    match = re.search(pattern, url)
-    if match:
-      return match.group(1)
+  book_id, name, url, db_online_chap, db_local_chap, epub_loc, db_author, db_desc, db_coverpath = book[:9]
+  adapter = source_for(book[11] if len(book) > 11 else None, url) if onlinechap == 1 else None
+  changes = {}
+  messages = []
+  epub_missing = False
+
+  meta = {}
+  # Rows added by URL have no EPUB to read metadata from
+  if epub_loc and any([gettitle == 1, geturl == 1, get_audecco == 1, cover == 1, onlinechap == 1]):
+    # Load metadata (returns url, source, author, description, cover_id, title)
+    meta = get_epub_metadata(epub_loc)
+
+  # ========= ONLINE =========
+  if adapter and url:
+    ext_id = adapter.book_id(url)
+
+    if not ext_id:
+      messages.append(f"⚠️ Could not extract bookId for {name}")
+      return {}, messages, epub_missing
+
+    latest_chap, latest_chap_time, author, desc = adapter.fetch(ext_id)
+    imgurl = extract_epub_cover(epub_loc, "online", meta) if epub_loc else None
+
+    if latest_chap is None:
+      return {}, messages, epub_missing
+
+    if db_online_chap is None or latest_chap > db_online_chap:
+      changes["onlinechap"] = latest_chap
+    if latest_chap_time:
+      changes["latestchaptime"] = latest_chap_time
+    if author:
+      changes["author"] = author
+    if desc:
+      changes["description"] = desc
+    if imgurl:
+      changes["cover_path"] = imgurl
+  elif onlinechap == 1 and epub_loc:
+    extract_epub_cover(epub_loc, "local", meta)
+    changes["author"] = meta.get("author") or ""
+    changes["description"] = meta.get("description") or ""
+    changes["cover_path"] = meta.get("cover_id") or ""
+
+  # ========= LOCAL =========
+  if localchap == 1 and epub_loc:
+    extracted_local = extract_local_chap(epub_loc)
+
+    if extracted_local > 0 and extracted_local > db_local_chap:
+      changes["localchap"] = extracted_local
+
+    print(f"{name}: extracted {extracted_local}, in DB {db_local_chap}")
+  
+  # ========= TITLE ==========
+  if gettitle == 1 and epub_loc:
+    epub_title = meta.get("title")
+    if epub_title:
+      changes["name"] = epub_title
+
+  # ========= URL ==========
+  if geturl == 1 and epub_loc:
+    epub_url = meta.get("url")
+    if epub_url:
+      changes["url"] = epub_url
+
+  # ========= Cover File  =========
+  if cover == 1 and onlinechap == 0 and epub_loc:
+    extract_epub_cover(epub_loc, "local", meta)
+
+  # ==== Author, Desc, cover =======
+  if get_audecco == 1 and epub_loc:
+    changes["author"] = meta.get("author") or ""
+    changes["description"] = meta.get("description") or ""
+    changes["cover_path"] = meta.get("cover_id") or ""
+
+  # ========= CHECK EXIST ==========
+  if check_epub == 1:
+    if epub_index is not None and epub_loc and os.path.basename(epub_loc) == epub_loc:
+      exists = epub_loc in epub_index
+    else:
+      # Files in sub folders are not indexed
+      exists = bool(epub_loc) and (Path(get_value('LOCAL_EPUB_DIR')) / epub_loc).exists()
+    changes["epub_exists"] = "1" if exists else "0"
+    epub_missing = not exists
 
-  return None
+  return changes, messages, epub_missing
 
-def fetch_latest_chapter_webnovel(book_id):
+def flush_novel_updates(conn, pending, resume_id=None, schedule=None):
   """
-  Fetches the latest chapter number and last chapter time from the Webnovel mobile API.
+  Writes queued bulk changes in one short transaction.
+  Rows changing the same set of columns share one executemany() call.
 
   Parameters:
-  book_id (str): The ID of the book to fetch data for.
-
-  Returns:
-  tuple: (chapter_num, last_chapter_time, author, description, image_url)
-  All fields may be None if an error occurs.
+  pending (list): (novel_id, changes dict) pairs, emptied once written
+  resume_id (int): highest id up to which every row is now done, saved as BULK_RESUME_ID
+  schedule (list): refresh_schedule rows of the novels checked online, emptied once written
   """
-  if book_id is None:
-    return None, None, None, None
-  endpoint = f'{get_value("ENDPOINT")}{book_id}'
-  headers = {
-    "User-Agent": f"{get_value("USER_AGENT")}",
-    "Accept": "application/json, text/plain, */*",
-    "Referer": "https://android.webnovel.com",
-  }
-
-  try:
-    # polite delay to avoid hammering server
-    # Random delay between 1 and 3 seconds, make random to avoid being flagged 
-    # Delay only after actual processing
-    time.sleep(random.uniform(float(get_value("DELAY_FROM")), float(get_value("DELAY_TO"))))
-    
-    resp = requests.get(endpoint, headers=headers, timeout=int(get_value("API_TIMEOUT")))
-    resp.raise_for_status()  # Raise an error for HTTP error responses
-
-    # Extract relevant data from the response JSON
-    # Extracting ChapterNum and LastChapterTime
-    json_data = resp.json()
-    data = json_data.get("Data", {})
-    
-    chapter_num = data.get("ChapterNum")
-    last_chapter_time = data.get("LastChapterTime")
-    book_desc = data.get("Description") or ""
-    book_author = data.get("AuthorInfo", {}).get("AuthorName") or "Unknown"
-
-    # Convert epoch time to formatted string
-    if last_chapter_time is not None:
-      last_chapter_time = datetime.fromtimestamp(last_chapter_time / 1000).strftime('%Y-%m-%d %H:%M:%S.%f')
-    else:
-      last_chapter_time = None
-
-    return chapter_num, last_chapter_time, book_author, book_desc
-  
-  except Exception as e:
-    print(f"fetch_latest_chapter_webnovel error: {e}")
-    raise
-    return None, None, None, None
+  batches = {}
+  for novel_id, changes in pending:
+    columns = tuple(sorted(changes))
+    batches.setdefault(columns, []).append([changes[c] for c in columns] + [novel_id])
+
+  with conn:
+    for columns, rows in batches.items():
+      conn.executemany(novel_update_sql(columns), rows)
+    if resume_id is not None:
+      conn.execute("""
+        INSERT INTO settings (key, value) VALUES ('BULK_RESUME_ID', ?)
+        ON CONFLICT(key) DO UPDATE SET value=excluded.value
+      """, (str(resume_id),))
+    if schedule:
+      save_schedule(conn, schedule)
+  pending.clear()
+  if schedule:
+    schedule.clear()
 
 @timer
-def update_online_chapters_for_all(onlinechap=0, localchap=0, startId=1, limit=None, gettitle=0, geturl=0, get_audecco=0, cover=0, check_epub=0):
+def update_online_chapters_for_all(onlinechap=0, localchap=0, startId=1, limit=None, gettitle=0, geturl=0, get_audecco=0, cover=0, check_epub=0, resume=0, ids=None, report=None):
+  """
+  Bulk updates novels from startId on, or only the given ids (see scheduler.due_novel_ids).
+  """
 
-  with lock:  # Only one thread will execute this block at a time
+  with lock:  # Only one bulk run at a time, rows inside it run on the worker pool
     upall_err_cnt = 0
     check_epub_err_cnt = 0
     messages = []
@@ -313,130 +553,118 @@ def update_online_chapters_for_all(onlinechap=0, localchap=0, startId=1, limit=N
 
     if all(f == 0 for f in flags):
       return "Chapters are not selected", "error"
-    query = "SELECT id, name, url, onlinechap, localchap, filepath, author, description, cover_path FROM novels"
-    params = []
+
+    conn = get_db_conn()
+    cursor = conn.cursor()
+
+    # Pick up after the last row an interrupted run committed
+    if resume == 1:
+      row = cursor.execute("SELECT value FROM settings WHERE key='BULK_RESUME_ID'").fetchone()
+      if row and row[0]:
+        startId = max(startId, int(row[0]) + 1)
+
+    query = "SELECT id, name, url, onlinechap, localchap, filepath, author, description, cover_path, latestchaptime, status, source FROM novels"
+    where, params = [], []
     
     if startId > 1:
-      query += " WHERE id >= ?"
+      where.append("id >= ?")
       params.append(startId)
+    if ids is not None:
+      where.append("id IN (SELECT value FROM json_each(?))")
+      params.append(json.dumps(list(ids)))
+    if where:
+      query += " WHERE " + " AND ".join(where)
+
+    query += " ORDER BY id"
     
     if limit is not None and limit >= 1:
       query += " LIMIT ?"
       params.append(limit)
 
-    conn = get_db_conn()
-    cursor = conn.cursor()
     cursor.execute(query, params)
     books = cursor.fetchall()
 
-    print(f">> Updating {len(books)} novels from id {startId}, Limited to {limit}")
-
-    for book_id, name, url, db_online_chap, db_local_chap, epub_loc, db_author, db_desc, db_coverpath in books:
-      try:
-        set_parts = []
-        values = []
-
-        if any([gettitle == 1, geturl == 1, get_audecco == 1, cover == 1, onlinechap == 1]): 
-          # Load metadata (returns url, source, author, description, cover_id, title)
-          meta = get_epub_metadata(epub_loc)
-
-        # ========= ONLINE =========
-        if onlinechap == 1 and url and "webnovel.com" in url:
-          ext_id = extract_book_id(url)
-
-          if not ext_id:
-            messages.append(f"⚠️ Could not extract bookId for {name}")
-            continue
-
-          latest_chap, latest_chap_time, author, desc = fetch_latest_chapter_webnovel(ext_id)
-          imgurl = extract_epub_cover(epub_loc, "online", meta)
-
-          if latest_chap is None:
-            continue
-
-          if db_online_chap is None or latest_chap > db_online_chap:
-            set_parts.append("onlinechap = ?")
-            values.append(latest_chap)
-
-          if latest_chap_time:
-            set_parts.append("latestchaptime = ?")
-            values.append(latest_chap_time)
-            
-          if author:
-            set_parts.append("author = ?")
-            values.append(author)
-            
-          if desc:
-            set_parts.append("description = ?")
-            values.append(desc)
-            
-          if imgurl:
-            set_parts.append("cover_path = ?")
-            values.append(imgurl)
-        elif onlinechap == 1 and "webnovel.com" not in url:
-          extract_epub_cover(epub_loc, "local", meta)
-          set_parts.append("author = ?, description = ?, cover_path = ?")
-          values.append(meta.get("author") or "")
-          values.append(meta.get("description") or "")
-          values.append(meta.get("cover_id") or "")
-
-        # ========= LOCAL =========
-        if localchap == 1 and epub_loc:
-          extracted_local = extract_local_chap(epub_loc)
-
-          if extracted_local > 0 and extracted_local > db_local_chap:
-            set_parts.append("localchap = ?")
-            values.append(extracted_local)
-
-          print(f"{name}: extracted {extracted_local}, in DB {db_local_chap}")
-        
-        # ========= TITLE ==========
-        if gettitle == 1 and epub_loc:
-          epub_title = meta.get("title")
-          if epub_title:
-            set_parts.append("name = ?")
-            values.append(epub_title)
-
-        # ========= URL ==========
-        if geturl == 1 and epub_loc:
-          epub_url = meta.get("url")
-          if epub_url:
-            set_parts.append("url = ?")
-            values.append(epub_url)
-
-        # ========= Cover File  =========
-        if cover == 1 and onlinechap == 0 and epub_loc:
-          extract_epub_cover(epub_loc, "local", meta)
-
-        # ==== Author, Desc, cover =======
-        if get_audecco == 1 and epub_loc:
-          set_parts.append("author = ?, description = ?, cover_path = ?")
-          values.append(meta.get("author") or "")
-          values.append(meta.get("description") or "")
-          values.append(meta.get("cover_id") or "")
-        # ========= CHECK EXIST ==========
-        if check_epub == 1:
-          epubpath = Path(get_value('LOCAL_EPUB_DIR')) / epub_loc
-          set_parts.append("epub_exists = ?")
-          if epubpath.exists():
-            values.append("1")
-          else:
-            values.append("0")
+    workers = max(1, get_setting("BULK_WORKERS"))
+    chunk_size = max(1, get_setting("BULK_CHUNK_SIZE"))
+    print(f">> Updating {len(books)} novels from id {startId}, Limited to {limit}, {workers} workers")
+    if report:
+      report.start(len(books))
+
+    row_opts = dict(onlinechap=onlinechap, localchap=localchap, gettitle=gettitle, geturl=geturl,
+                    get_audecco=get_audecco, cover=cover, check_epub=check_epub,
+                    epub_index=get_epub_files() if check_epub == 1 else None)
+
+    pending = []     # (id, changes) waiting for the next flush
+    schedule = []    # refresh_schedule rows waiting for the next flush
+    known_schedule = load_schedule(conn) if onlinechap == 1 else {}
+    since_flush = 0
+    finished = set() # ids done (or failed) but not yet covered by the resume watermark
+    order = [book[0] for book in books]
+    next_pos = 0     # order[:next_pos] are all finished
+    resume_id = None
+
+    # Every online source gets its own lane of workers (SourceAdapter.lane_size()) and rows
+    # without one share a local lane, so each source goes at its own pace, in parallel.
+    lanes = {}
+    for book in books:
+      lanes.setdefault(source_for(book[11], book[2]) if onlinechap == 1 else None, []).append(book)
+
+    # Workers only fetch and parse; every write stays on this thread's connection
+    with ExitStack() as stack:
+      futures = {}
+      for adapter, lane_books in lanes.items():
+        size = adapter.lane_size() if adapter else workers
+        pool = stack.enter_context(ThreadPoolExecutor(max_workers=min(size, len(lane_books)),
+                                                      thread_name_prefix=f"bulk-{adapter.name if adapter else 'local'}"))
+        futures.update({pool.submit(refresh_novel_row, book, **row_opts): (book, adapter) for book in lane_books})
+
+      for future in as_completed(futures):
+        book, adapter = futures[future]
+        book_id, name = book[:2]
+        try:
+          changes, row_msgs, epub_missing = future.result()
+          messages.extend(row_msgs)
+          if adapter and book[2]:
+            cadence, misses, _ = known_schedule.get(book_id, (None, 0, 0))
+            schedule.append((book_id,) + plan_next_check(
+              book[10], book[3], book[9], changes.get("onlinechap", book[3]),
+              changes.get("latestchaptime", book[9]), cadence, misses))
+          if epub_missing:
             check_epub_err_cnt += 1
+          if changes:
+            pending.append((book_id, changes))
+          if report:
+            report.row(book_id, name, error="EPUB file missing" if epub_missing else None,
+                       message="\n".join(row_msgs) or None)
 
-        # ========= EXECUTE =========
-        if set_parts:
-          values.append(book_id)
-          cursor.execute(f"UPDATE novels SET {', '.join(set_parts)} WHERE id = ?", values)
-        
-
-      except Exception as e:
-        messages.append(f"⚠️ Error processing {name}: {e}")
-        upall_err_cnt += 1
-        continue
+        except Exception as e:
+          messages.append(f"⚠️ Error processing {name}: {e}")
+          upall_err_cnt += 1
+          if adapter and book[2]:
+            schedule.append((book_id,) + plan_failed_check(*known_schedule.get(book_id, (None, 0, 0))))
+          if report:
+            report.row(book_id, name, error=str(e))
+
+        # Rows finish out of order, the resume point only moves past a fully finished prefix
+        finished.add(book_id)
+        while next_pos < len(order) and order[next_pos] in finished:
+          finished.discard(order[next_pos])
+          resume_id = order[next_pos]
+          next_pos += 1
 
-    if onlinechap == 1: conn.execute("UPDATE settings SET value=? where key='LAST_BULK_TIME'", (datetime.now(), ))
-    conn.commit()
+        # ========= EXECUTE =========
+        since_flush += 1
+        if since_flush >= chunk_size:
+          # The resume point belongs to full runs, an ids run must not move or clear it
+          flush_novel_updates(conn, pending, resume_id if ids is None else None, schedule)
+          since_flush = 0
+
+    flush_novel_updates(conn, pending, schedule=schedule)
+    with conn:
+      # A complete run leaves nothing to resume
+      if ids is None:
+        conn.execute("UPDATE settings SET value='' WHERE key='BULK_RESUME_ID'")
+      if onlinechap == 1: conn.execute("UPDATE settings SET value=? where key='LAST_BULK_TIME'", (datetime.now(), ))
     conn.close()
     
    
@@ -452,3 +680,177 @@ def update_online_chapters_for_all(onlinechap=0, localchap=0, startId=1, limit=N
       return "✅ Done Bulk updating Novels", "success"
     
     return "\n".join(messages), status
+
+# Batches up to this size are parsed in-process, a process pool costs more to start
+IMPORT_INLINE_MAX = 8
+
+def _parse_import_file(full_path):
+  """Process pool worker of import_epubs(): parses one file, errors come back as text."""
+  try:
+    st = os.stat(full_path)
+    return full_path, st.st_mtime, st.st_size, parse_epub(full_path), None
+  except Exception as e:
+    return full_path, None, None, None, str(e)
+
+def novel_status(latest_chap_time):
+  """"Ongoing" when the newest chapter is at most 30 days old, "Hiatus" if older, "" if unknown."""
+  try:
+    latest = datetime.strptime(latest_chap_time, '%Y-%m-%d %H:%M:%S.%f')
+  except (TypeError, ValueError):
+    return ""
+  return "Ongoing" if (datetime.now() - latest).days <= 30 else "Hiatus"
+
+def _import_lookup(filename, summary):
+  # Online stage of import_epubs(), runs on the thread pool behind the host rate limiter
+  meta = epub_metadata(summary)
+  if not summary["chapters"]:
+    raise ValueError(f"Could not determine chapter count for {filename}")
+
+  online_chap, latest_chap_time, author, desc = 0, None, meta["author"], meta["description"]
+  adapter = source_for(meta["source"], meta["url"])
+  if adapter:
+    online_chap, latest_chap_time, author, desc = adapter.fetch(adapter.book_id(meta["url"]))
+    cover = extract_epub_cover(filename, "online", meta)
+  else:
+    cover = extract_epub_cover(filename, "local", meta)
+
+  return {
+    "name": meta["title"] or "Unknown Title",
+    "url": meta["url"],
+    "source": meta["source"] or "local",
+    "localchap": summary["chapters"],
+    "onlinechap": online_chap or 0,
+    "status": novel_status(latest_chap_time),
+    "notes": "",
+    "filepath": filename,
+    "latestchaptime": latest_chap_time,
+    "author": author or meta["author"],
+    "description": desc or meta["description"],
+    "cover_path": cover,
+  }
+
+@timer
+def import_epubs(filenames, report=None):
+  """
+  Adds EPUB files under LOCAL_EPUB_DIR as new novels in three stages:
+  files are parsed on a process pool (IMPORT_WORKERS, 0 = one per core),
+  ones with an online source are then looked up on the rate-limited thread pool,
+  and all rows are inserted in one transaction.
+
+  Returns:
+  tuple: (message, category, results) where results holds one
+  {"file", "status", "message", "id"} dict per file
+  """
+  results = {f: {"file": f, "status": "error", "message": "", "id": None} for f in filenames}
+  if report:
+    report.start(len(results))
+
+  def fail(filename, error):
+    results[filename]["message"] = error
+    if report:
+      report.row(None, filename, error=error)
+
+  conn = get_db_conn()
+  known = {row[0] for row in conn.execute("SELECT filepath FROM novels WHERE filepath IS NOT NULL AND filepath != ''")}
+
+  # ========= 1. PARSE =========
+  epub_dir = Path(get_value("LOCAL_EPUB_DIR"))
+  summaries = {}   # filename -> parse_epub() summary
+  to_parse = {}    # full path -> filename
+  for filename in results:
+    if filename in known:
+      results[filename].update(status="skipped", message="Already in the library")
+      if report:
+        report.row(None, filename, message="Already in the library")
+      continue
+    full_path = os.path.realpath(epub_dir / filename)
+    try:
+      st = os.stat(full_path)
+    except OSError as e:
+      fail(filename, str(e))
+      continue
+    summary = cached_epub_summary(conn, full_path, st.st_mtime, st.st_size)
+    if summary:
+      summaries[filename] = summary
+    else:
+      to_parse[full_path] = filename
+
+  workers = get_setting("IMPORT_WORKERS") or os.cpu_count() or 1
+  paths = list(to_parse)
+  parsed = []
+  with ExitStack() as stack:
+    if len(paths) > IMPORT_INLINE_MAX and workers > 1:
+      # spawn, as forking a process that runs worker threads can copy held locks
+      pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")))
+      results_iter = pool.map(_parse_import_file, paths, chunksize=max(1, len(paths) // (workers * 4)))
+    else:
+      results_iter = map(_parse_import_file, paths)
+    for result in results_iter:
+      parsed.append(result)
+      # Parsing a large batch can outlast jobs.STALE_AFTER, files are only counted in stage 2
+      if report:
+        report.heartbeat()
+
+  fresh = []
+  for full_path, mtime, size, summary, error in parsed:
+    if error:
+      fail(to_parse[full_path], f"Could not parse EPUB: {error}")
+    else:
+      summaries[to_parse[full_path]] = summary
+      fresh.append((full_path, mtime, size, summary))
+  with conn:
+    save_epub_summaries(conn, fresh)
+  print(f">> Parsed {len(paths)} EPUBs ({len(summaries) - len(fresh)} cached) on {workers if len(paths) > IMPORT_INLINE_MAX else 1} processes")
+
+  # ========= 2. ONLINE =========
+  rows = {}
+  with ThreadPoolExecutor(max_workers=max(1, get_setting("BULK_WORKERS"))) as pool:
+    futures = {pool.submit(_import_lookup, f, s): f for f, s in summaries.items()}
+    for future in as_completed(futures):
+      filename = futures[future]
+      try:
+        rows[filename] = future.result()
+        if report:
+          report.row(None, filename)
+      except Exception as e:
+        fail(filename, str(e))
+
+  # ========= 3. INSERT =========
+  columns = ("name", "url", "source", "localchap", "onlinechap", "status", "notes", "filepath",
+             "latestchaptime", "author", "description", "cover_path")
+  with conn:
+    for filename in results:
+      if filename in rows:
+        cur = conn.execute(f"INSERT INTO novels ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                           [rows[filename][c] for c in columns])
+        results[filename].update(status="success", id=cur.lastrowid, message=f"{rows[filename]['name']} imported successfully")
+  conn.close()
+
+  imported = sum(r["status"] == "success" for r in results.values())
+  skipped = sum(r["status"] == "skipped" for r in results.values())
+  failed = len(results) - imported - skipped
+  message = f"✅ Imported {imported} EPUBs" + (f", {skipped} already in the library" if skipped else "")
+  if failed:
+    message += f", {failed} failed"
+  return message, "error" if failed else "success", list(results.values())
+
+@job_handler("import_epubs")
+def import_epubs_job(params, report):
+  message, category, _ = import_epubs(params.get("files") or [], report=report)
+  return message, category
+
+@job_handler("bulk_update")
+def bulk_update_job(params, report):
+  return update_online_chapters_for_all(**params, report=report)
+
+@job_handler("refresh_due")
+def refresh_due_job(params, report):
+  """Online check of only the novels the scheduler says are due."""
+  conn = get_db_conn()
+  ids = due_novel_ids(conn, limit=params.get("limit"))
+  conn.close()
+  if not ids:
+    report.start(0)
+    return "✅ No novels due for a check", "success"
+  print(f">> {len(ids)} novels due for a check")
+  return update_online_chapters_for_all(onlinechap=1, ids=ids, report=report)
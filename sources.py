@@ -0,0 +1,273 @@
+import asyncio, random, re, threading, time
+from datetime import datetime
+from db import get_value, get_setting
+from httpclient import http_get, async_http_get
+
+# Online sources a novel can be refreshed from. Each adapter is registered under
+# the value of the novels.source column and the domains of its URLs (tldextract
+# .domain, as get_epub_metadata() sets source), and declares its own politeness
+# delay and how many requests it keeps in flight. The bulk updater gives every
+# source its own lane of that many workers, so a slow or strict source does not
+# hold up the others or the offline rows.
+
+_tld_extract = None
+_tld_lock = threading.Lock()
+
+def url_domain(url):
+  """
+  Domain of url without subdomains and public suffix, e.g. "webnovel" for
+  https://www.webnovel.com/book/..., the way novels.source is filled in.
+
+  Uses the suffix list snapshot bundled with tldextract and never fetches a
+  fresh one; tldextract itself is imported on first use.
+  """
+  global _tld_extract
+  with _tld_lock:
+    if _tld_extract is None:
+      import tldextract
+      _tld_extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+  return _tld_extract(url).domain
+
+class HostRateLimiter:
+  """
+  Spaces out requests to the same host by a random DELAY_FROM..DELAY_TO gap.
+
+  Each caller reserves the next free slot for its host and sleeps until then,
+  so any number of worker threads and async views share one politeness budget
+  per host instead of every call sleeping on its own.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._next_slot = {}
+
+  def _reserve(self, host, delay):
+    """Takes the host's next slot, returns the seconds until it."""
+    low, high = delay or (get_setting("DELAY_FROM"), get_setting("DELAY_TO"))
+    gap = random.uniform(low, high)
+    with self._lock:
+      now = time.monotonic()
+      slot = max(now, self._next_slot.get(host, now))
+      self._next_slot[host] = slot + gap
+    return slot - time.monotonic()
+
+  def wait(self, host, delay=None):
+    pause = self._reserve(host, delay)
+    if pause > 0:
+      time.sleep(pause)
+
+  async def wait_async(self, host, delay=None):
+    """wait() for async callers, sleeping without holding up the event loop."""
+    pause = self._reserve(host, delay)
+    if pause > 0:
+      await asyncio.sleep(pause)
+
+host_limiter = HostRateLimiter()
+
+# How often an async caller checks for a free slot while its source is at its concurrency limit
+SLOT_POLL_SECONDS = 0.05
+
+class SourceAdapter:
+  """
+  Base class of the online sources, see register_source().
+
+  Subclasses set name and domains and implement book_id() and fetch();
+  cover_url() is optional.
+  """
+  name = ""
+  domains = ()
+  # (min, max) seconds between two requests, None uses DELAY_FROM..DELAY_TO
+  delay = None
+  # Requests in flight at once, None uses BULK_WORKERS
+  concurrency = None
+
+  def __init__(self):
+    self._slots = None
+    self._slots_lock = threading.Lock()
+
+  def lane_size(self):
+    return max(1, self.concurrency or get_setting("BULK_WORKERS"))
+
+  def _lane(self):
+    with self._slots_lock:
+      if self._slots is None:
+        self._slots = threading.BoundedSemaphore(self.lane_size())
+      return self._slots
+
+  def get(self, url, **kwargs):
+    """http_get() behind this source's concurrency limit and politeness delay."""
+    with self._lane():
+      return http_get(url, throttle=lambda: host_limiter.wait(self.name, self.delay), **kwargs)
+
+  async def get_async(self, url, **kwargs):
+    """async_http_get() behind the same concurrency limit and politeness delay as get()."""
+    slots = self._lane()
+    # The slots are shared with the worker threads, so poll for one instead of blocking the loop
+    while not slots.acquire(blocking=False):
+      await asyncio.sleep(SLOT_POLL_SECONDS)
+    try:
+      return await async_http_get(url, throttle=lambda: host_limiter.wait_async(self.name, self.delay), **kwargs)
+    finally:
+      slots.release()
+
+  def book_id(self, url):
+    """The source's id of the book behind url, or None."""
+    raise NotImplementedError
+
+  def fetch(self, book_id):
+    """
+    Returns:
+    tuple: (chapter_num, last_chapter_time, author, description), last_chapter_time
+    formatted as '%Y-%m-%d %H:%M:%S.%f'
+    """
+    raise NotImplementedError
+
+  async def fetch_async(self, book_id):
+    """fetch() for async views. Sources without their own run fetch() in a worker thread."""
+    return await asyncio.to_thread(self.fetch, book_id)
+
+  def cover_url(self, book_id):
+    """URL of the book's cover image, or None when the source has none."""
+    return None
+
+  def cover_id(self, book_id):
+    """File name the cover is saved under in COVER_PATH."""
+    return f"{self.name}_{book_id}.webp"
+
+SOURCES = {}
+_by_domain = {}
+
+def register_source(cls):
+  """Class decorator adding an adapter to the registry."""
+  adapter = cls()
+  SOURCES[adapter.name] = adapter
+  for domain in adapter.domains:
+    _by_domain[domain] = adapter
+  return cls
+
+def source_for(source=None, url=None):
+  """
+  The adapter for a novel, by its source column and failing that by its URL's domain.
+
+  Returns:
+  SourceAdapter: or None when the novel has no online source (offline mode)
+  """
+  adapter = SOURCES.get((source or "").strip().lower())
+  if adapter is None and url:
+    adapter = _by_domain.get(url_domain(url))
+  return adapter
+
+@register_source
+class WebnovelSource(SourceAdapter):
+  name = "webnovel"
+  domains = ("webnovel",)
+
+  def book_id(self, url):
+    return extract_book_id(url)
+
+  def fetch(self, book_id):
+    return fetch_latest_chapter_webnovel(book_id)
+
+  async def fetch_async(self, book_id):
+    return await fetch_latest_chapter_webnovel_async(book_id)
+
+  def cover_url(self, book_id):
+    return f"{get_value('IMG_ENDPOINT')}{book_id}/180.jpg"
+
+  def cover_id(self, book_id):
+    # Kept from before there were other sources, existing covers use it
+    return f"{book_id}.webp"
+
+def extract_book_id(url):
+  """
+  Extracts the Webnovel book ID from a given URL.
+
+  Parameters:
+  url (str): The URL string from which to extract the book ID.
+
+  Returns:
+  str: The extracted book ID if found, or None if not found.
+  """
+  # Define patterns to search for book ID
+  patterns = [
+    r'_(\d{8,})$',  # Match book IDs after an underscore at the end
+    r'/book/(\d{8,})',  # Match book IDs in '/book/' path
+    r'(\d{8,})'  # Match any sequence of digits of length 8 or more
+  ]
+
+  for pattern in patterns:
+    match = re.search(pattern, url)
+    if match:
+      return match.group(1)
+
+  return None
+
+def fetch_latest_chapter_webnovel(book_id):
+  """
+  Fetches the latest chapter number and last chapter time from the Webnovel mobile API.
+
+  Parameters:
+  book_id (str): The ID of the book to fetch data for.
+
+  Returns:
+  tuple: (chapter_num, last_chapter_time, author, description)
+  All fields may be None if an error occurs.
+  """
+  if book_id is None:
+    return None, None, None, None
+  endpoint, headers = _webnovel_request(book_id)
+
+  try:
+    # polite delay to avoid hammering server, shared by every thread using this source.
+    # Only paid when the request really goes out, cached answers skip it.
+    resp = SOURCES["webnovel"].get(endpoint, headers=headers, timeout=get_setting("API_TIMEOUT"))
+    return _parse_webnovel(resp)
+
+  except Exception as e:
+    print(f"fetch_latest_chapter_webnovel error: {e}")
+    raise
+    return None, None, None, None
+
+async def fetch_latest_chapter_webnovel_async(book_id):
+  """fetch_latest_chapter_webnovel() for async views, see SourceAdapter.get_async()."""
+  if book_id is None:
+    return None, None, None, None
+  endpoint, headers = _webnovel_request(book_id)
+
+  try:
+    resp = await SOURCES["webnovel"].get_async(endpoint, headers=headers, timeout=get_setting("API_TIMEOUT"))
+    return _parse_webnovel(resp)
+  except Exception as e:
+    print(f"fetch_latest_chapter_webnovel_async error: {e}")
+    raise
+
+def _webnovel_request(book_id):
+  """The mobile API endpoint and headers for book_id."""
+  endpoint = f'{get_value("ENDPOINT")}{book_id}'
+  headers = {
+    "User-Agent": f"{get_value('USER_AGENT')}",
+    "Accept": "application/json, text/plain, */*",
+    "Referer": "https://android.webnovel.com",
+  }
+  return endpoint, headers
+
+def _parse_webnovel(resp):
+  """(chapter_num, last_chapter_time, author, description) from a mobile API answer."""
+  resp.raise_for_status()  # Raise an error for HTTP error responses
+
+  # Extract relevant data from the response JSON
+  # Extracting ChapterNum and LastChapterTime
+  json_data = resp.json()
+  data = json_data.get("Data", {})
+  
+  chapter_num = data.get("ChapterNum")
+  last_chapter_time = data.get("LastChapterTime")
+  book_desc = data.get("Description") or ""
+  book_author = data.get("AuthorInfo", {}).get("AuthorName") or "Unknown"
+
+  # Convert epoch time to formatted string
+  if last_chapter_time is not None:
+    last_chapter_time = datetime.fromtimestamp(last_chapter_time / 1000).strftime('%Y-%m-%d %H:%M:%S.%f')
+  else:
+    last_chapter_time = None
+
+  return chapter_num, last_chapter_time, book_author, book_desc
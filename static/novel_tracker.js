@@ -15,44 +15,47 @@ document.addEventListener("DOMContentLoaded", () => {
 
 function initTable() {
   dt = new DataTable("#table", {
+    // Paging, ordering and searching happen in SQL, one page per request
+    serverSide: true,
     ajax: {
       url: "/api/novels",
+      type: "POST",
+      contentType: "application/json",
+      data: (d) => JSON.stringify(d),
       dataSrc: "data"
     },
     columns: [
-      { data: "id" },
+      { data: "id", name: "id" },
       {
         data: "name",
+        name: "name",
         render: function (data, type, row) {
           const url = row.url || "#";
           // keep link target blank if no url
           return `<span class="novel-hover"
+            data-id="${row.id}"
             data-author="${escapeHtml(row.author || '')}"
-            data-desc="${escapeHtml(row.description || '')}"
-            data-img="static/img/cover/${escapeHtml(row.cover_path || '')}">
+            data-img="${row.cover_path ? `/cover/${encodeURIComponent(row.cover_path)}?size=160${row.cover_version ? `&v=${row.cover_version}` : ''}` : ''}">
         <a href="${escapeHtml(url)}" target="_blank">${escapeHtml(data)}</a>
       </span>`;
         }
       },
-      { data: "localchap", defaultContent: "" },
-      { data: "onlinechap", defaultContent: "" },
+      { data: "localchap", name: "localchap", defaultContent: "" },
+      { data: "onlinechap", name: "onlinechap", defaultContent: "" },
       {
-        // Diff = online - local
-        data: null,
-        render: function (data, type, row) {
-          const local = Number(row.localchap) || 0;
-          const online = Number(row.onlinechap) || 0;
-          const diff = online - local;
-          return diff;
-        }
+        // Diff = online - local, kept by the database as chapter_gap
+        data: "diff",
+        name: "diff",
+        defaultContent: ""
       },
       {
         data: "timeago",
+        name: "timeago",
         defaultContent: ""
       },
-      { data: "source", defaultContent: "" },
-      { data: "status", defaultContent: "" },
-      { data: "notes", defaultContent: "" },
+      { data: "source", name: "source", defaultContent: "" },
+      { data: "status", name: "status", defaultContent: "" },
+      { data: "notes", name: "notes", defaultContent: "" },
       {
         data: null,
         orderable: false,
@@ -107,7 +110,7 @@ function initTable() {
     lengthMenu: [10, 15, 25, 30, 40, 50, 70, 100, 150, { label: 'All', value: -1 }],
     paging: true,
     pageLength: 20,
-    processing: false,
+    processing: true,
     scrollCollapse: false,
     scrollResize: false,
     scrollX: true,
@@ -122,6 +125,44 @@ function initTable() {
     columnControl: [['orderAsc', 'orderDesc', 'orderRemove', 'orderClear', 'spacer', 'search']]
 
   });
+
+  // Descriptions may have changed with the rows
+  dt.on("xhr", (e, settings, json) => {
+    descCache.clear();
+    novelsVersion = json && json.version !== undefined ? json.version : null;
+  });
+}
+
+// Change counter of novels as of the rows on screen, see refreshChangedRows()
+let novelsVersion = null;
+
+// After a change, fetch only the rows changed since the last load and patch
+// them in place. Rows added, deleted or changed off this page can move the
+// paging, so those reload the current page instead.
+async function refreshChangedRows() {
+  if (novelsVersion === null) {
+    dt.ajax.reload(null, false);
+    return;
+  }
+  try {
+    const resp = await fetch(`/api/novels?since=${encodeURIComponent(novelsVersion)}`);
+    const j = await resp.json();
+    const onPage = new Map();
+    dt.rows({ page: "current" }).every(function () {
+      onPage.set(this.data().id, this);
+    });
+    if (j.deleted.length || j.data.some(r => !onPage.has(r.id))) {
+      dt.ajax.reload(null, false);
+      return;
+    }
+    j.data.forEach(r => {
+      onPage.get(r.id).data(r);
+      descCache.delete(String(r.id));
+    });
+    novelsVersion = j.version;
+  } catch (err) {
+    dt.ajax.reload(null, false);
+  }
 }
 
 // Very small HTML escaper
@@ -180,7 +221,7 @@ function initModalsAndForms() {
         const j = await res.json();
         showToast(j.message || "Update submitted — reloading table.", j.category || "success");
         closeEditModal();
-        dt.ajax.reload();
+        refreshChangedRows();
       } catch (err) {
         showToast("Edit error: " + err, "error");
       }
@@ -200,11 +241,12 @@ function initModalsAndForms() {
           body: formData
         });
         const j = await resp.json();
-        showToast(j.message || "Update all finished", j.category || "info");
+        showToast(j.message || "Update all queued", j.category || "info");
         closeUpdateModal();
         document.body.style.cursor = 'default';
-        dt.ajax.reload();
+        if (j.job_id) watchJob(j.job_id);
       } catch (err) {
+        document.body.style.cursor = 'default';
         showToast("Update all error: " + err, "error");
       }
     });
@@ -225,7 +267,7 @@ function initModalsAndForms() {
         const j = await resp.json();
         showToast(j.message || "Novel added", j.category || "info");
         closeAddModal();
-        dt.ajax.reload();
+        refreshChangedRows();
       } catch (err) {
         showToast("Update all error: " + err, "error");
       }
@@ -285,7 +327,7 @@ async function update_record(btnOrEl) {
     const j = await resp.json();
     showToast(j.msg || j.message || "Update result", j.status || "info");
     document.body.style.cursor = 'default';
-    dt.ajax.reload();
+    refreshChangedRows();
   } catch (err) {
     showToast("Update error: " + err, "error");
   }
@@ -310,7 +352,7 @@ async function delete_record(btnOrEl) {
     const j = await resp.json();
     if (j.status === "success") {
       showToast(j.msg || "Deleted", "success");
-      dt.ajax.reload();
+      refreshChangedRows();
     } else {
       showToast(j.msg || "Delete failed", "error");
     }
@@ -405,29 +447,58 @@ async function importallEPUB() {
     return;
   }
 
-  for (const f of files) {
-    try {
-      const resp = await fetch("/import-epub", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ filename: f })
-      });
-      const j = await resp.json();
-      if (j.status === "success") {
-        showToast(j.message || `${f} imported`, "success");
-      } else {
-        showToast(j.message || `${f} import failed`, "error");
-      }
-    } catch (err) {
-      showToast("Import error: " + err, "error");
-    }
+  // One background job for the whole list, the table reloads when it ends
+  try {
+    const resp = await fetch("/import-epubs", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ files: files })
+    });
+    const j = await resp.json();
+    showToast(j.message || "Import queued", j.category || "info");
+    if (j.job_id) watchJob(j.job_id);
+  } catch (err) {
+    showToast("Import error: " + err, "error");
   }
 
-  // reload table and close modal
-  dt.ajax.reload();
   closeNewFilesModal();
 }
 
+/* --- Background jobs --- */
+
+function formatSeconds(s) {
+  if (s == null) return "";
+  s = Math.round(s);
+  return s >= 60 ? `${Math.floor(s / 60)}m ${s % 60}s` : `${s}s`;
+}
+
+// Follow a background job over Server-Sent Events and show its progress in the header
+function watchJob(jobId) {
+  const tile = document.getElementById("tile_job_progress");
+  const es = new EventSource(`/jobs/${encodeURIComponent(jobId)}/events`);
+
+  es.addEventListener("progress", (ev) => {
+    const j = JSON.parse(ev.data);
+    if (!tile) return;
+    const eta = j.eta != null ? ` · ETA ${formatSeconds(j.eta)}` : "";
+    const errs = j.errors ? ` · ${j.errors} errors` : "";
+    tile.innerText = `🔄 Job ${j.id}: ${j.done}/${j.total || "?"}${errs}${eta}`;
+  });
+
+  es.addEventListener("novel", (ev) => {
+    const e = JSON.parse(ev.data);
+    if (e.level === "error") console.warn(`Job ${jobId}: ${e.name}: ${e.message}`);
+  });
+
+  es.addEventListener("end", (ev) => {
+    es.close();
+    const j = JSON.parse(ev.data);
+    if (tile) tile.innerText = "";
+    showToast(j.message || `Job ${jobId} finished`, j.status === "done" ? "success" : "error");
+    refreshChangedRows();
+  });
+}
+
 function checkServer() {
     fetch("/status", { cache: "no-store" })
         .then(response => {
@@ -495,6 +566,8 @@ document.addEventListener("click", (ev) => {
 });
 
 let hoverBox = null;
+// id -> description, loaded on first hover instead of shipped with every row
+const descCache = new Map();
 
 function enableHoverPopup() {
     if (!hoverBox) {
@@ -518,18 +591,39 @@ function enableHoverPopup() {
 }
 
 function showHoverPopup(e, el) {
+    const id = el.dataset.id;
     const img = el.dataset.img;
     const author = el.dataset.author;
-    const desc = el.dataset.desc;
+    const desc = descCache.get(id);
 
+    hoverBox.dataset.id = id;
     hoverBox.innerHTML = `
         ${img ? `<img src="${img}">` : ""}
-        <b>${author || "Unknown"}</b><br>
-        <div>${desc ? desc.substring(0,200) + "…" : ""}</div>
+        <b>${escapeHtml(author) || "Unknown"}</b><br>
+        <div class="hover-desc">${desc === undefined ? "…" : formatHoverDesc(desc)}</div>
     `;
 
     hoverBox.style.display = "block";
     moveHoverPopup(e);
+
+    if (desc === undefined) loadHoverDesc(id);
+}
+
+function formatHoverDesc(desc) {
+    return desc ? escapeHtml(desc.substring(0,200)) + "…" : "";
+}
+
+async function loadHoverDesc(id) {
+    try {
+        const resp = await fetch(`/api/novels/${encodeURIComponent(id)}/details`);
+        const j = await resp.json();
+        descCache.set(id, j.description || "");
+    } catch (err) {
+        return;
+    }
+    // Only fill it in if the popup still shows the same novel
+    const box = hoverBox.querySelector(".hover-desc");
+    if (box && hoverBox.dataset.id === id) box.innerHTML = formatHoverDesc(descCache.get(id));
 }
 
 function moveHoverPopup(e) {
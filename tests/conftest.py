@@ -0,0 +1,38 @@
+import sqlite3
+import pytest
+import db
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+  """A fresh database and library folder for one test, with the refresher off."""
+  monkeypatch.chdir(tmp_path)
+  monkeypatch.setattr(db, "DEFAULT_DB", str(tmp_path / "my-novels.db"))
+  # Start from an empty pool and settings copy, so nothing from another test's database is reused
+  monkeypatch.setattr(db, "_idle", [])
+  monkeypatch.setattr(db, "_schema_ready", False)
+  monkeypatch.setattr(db, "_settings_version", None)
+  monkeypatch.setattr(db, "_settings_checked", float("-inf"))
+  db._local.conn = None
+  db.save_setting("AUTO_REFRESH_MINUTES", "0")
+  yield tmp_path
+  db.release_db_conn()
+  for conn in db._idle:
+    sqlite3.Connection.close(conn)
+
+@pytest.fixture
+def client(library, monkeypatch):
+  """Flask test client on the library database, without the background job worker, refresher or metrics flusher."""
+  import app
+  monkeypatch.setattr(app, "start_worker", lambda: None)
+  monkeypatch.setattr(app, "start_refresher", lambda: None)
+  monkeypatch.setattr(app, "start_flusher", lambda: None)
+  return app.app.test_client()
+
+def add_novels(rows):
+  """Inserts (name, url, source, filepath) rows, returns their ids."""
+  conn = db.get_db_conn()
+  with conn:
+    ids = [conn.execute("INSERT INTO novels (name, url, source, filepath) VALUES (?, ?, ?, ?)", row).lastrowid
+           for row in rows]
+  conn.close()
+  return ids
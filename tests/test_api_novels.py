@@ -0,0 +1,75 @@
+from conftest import add_novels
+
+def datatables(client, **args):
+  body = {"draw": 1, "columns": [{"data": "name", "name": "name"}], "order": [{"column": 0, "dir": "asc"}]}
+  body.update(args)
+  return client.post("/api/novels", json=body)
+
+def test_index_shows_id_range(client):
+  assert b'max="0"' in client.get("/").data
+  ids = add_novels([(f"Novel {n}", "", "local", f"n{n}.epub") for n in range(3)])
+  page = client.get("/").data
+  assert f'max="{ids[-1]}"'.encode() in page
+  assert b'name="limit" value="3"' in page
+
+def test_datatables_page(client):
+  add_novels([(f"Novel {n}", "", "local", f"n{n}.epub") for n in range(5)])
+  resp = datatables(client, draw=3, start=1, length=2)
+  assert resp.status_code == 200
+  body = resp.get_json()
+  assert (body["draw"], body["recordsTotal"], body["recordsFiltered"]) == (3, 5, 5)
+  assert [r["name"] for r in body["data"]] == ["Novel 1", "Novel 2"]
+
+def test_datatables_search_box_uses_full_text_index(client):
+  add_novels([("Dragon King", "", "local", "a.epub"), ("Quiet Mountain", "", "webnovel", "b.epub")])
+  body = datatables(client, search={"value": "drag"}).get_json()
+  assert (body["recordsTotal"], body["recordsFiltered"]) == (2, 1)
+  assert [r["name"] for r in body["data"]] == ["Dragon King"]
+  # Operators and quotes are taken as words, not FTS syntax
+  assert datatables(client, search={"value": 'NOT "dragon'}).status_code == 200
+  assert datatables(client, search={"value": "--"}).get_json()["recordsFiltered"] == 2
+
+def test_datatables_bad_paging_falls_back(client):
+  add_novels([(f"Novel {n}", "", "local", f"n{n}.epub") for n in range(3)])
+  resp = datatables(client, start="abc", length=None)
+  assert resp.status_code == 200
+  assert len(resp.get_json()["data"]) == 3
+
+def test_datatables_bad_draw_is_rejected(client):
+  assert datatables(client, draw="x").status_code == 400
+  assert datatables(client, draw=None).status_code == 400
+
+def test_unchanged_list_is_not_modified(client):
+  add_novels([("Novel A", "", "local", "a.epub")])
+  first = client.get("/api/novels")
+  assert first.status_code == 200
+  etag = first.headers["ETag"]
+  again = client.get("/api/novels", headers={"If-None-Match": etag})
+  assert again.status_code == 304
+  assert again.headers["ETag"] == etag
+
+  add_novels([("Novel B", "", "local", "b.epub")])
+  changed = client.get("/api/novels", headers={"If-None-Match": etag})
+  assert changed.status_code == 200
+  assert changed.headers["ETag"] != etag
+  assert len(changed.get_json()["data"]) == 2
+
+def test_since_returns_changes_and_deletions(client):
+  kept, edited, removed = add_novels([(name, "", "local", f"{name}.epub") for name in ("Kept", "Edited", "Removed")])
+  version = client.get("/api/novels").get_json()["version"]
+
+  assert client.post(f"/edit/{edited}", data={"notes": "new note"}).get_json()["status"] == "success"
+  assert client.post(f"/delete/{removed}", data={"name": "Removed"}).get_json()["status"] == "success"
+  added, = add_novels([("Added", "", "local", "added.epub")])
+
+  resp = client.get(f"/api/novels?since={version}")
+  body = resp.get_json()
+  assert body["since"] == version and body["version"] > version
+  assert [r["id"] for r in body["data"]] == [edited, added]
+  assert body["data"][0]["notes"] == "new note"
+  assert body["deleted"] == [removed]
+
+  # The delta has its own ETag, and nothing is new since the latest version
+  assert client.get(f"/api/novels?since={version}", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+  latest = client.get(f"/api/novels?since={body['version']}").get_json()
+  assert (latest["data"], latest["deleted"]) == ([], [])
@@ -0,0 +1,42 @@
+import asyncio, time
+import app, db, sources
+from conftest import add_novels
+
+URL = "https://www.webnovel.com/book/12345678901"
+
+def fake_fetch(delay=0.0):
+  calls = []
+  async def fetch_async(book_id):
+    calls.append(book_id)
+    await asyncio.sleep(delay)
+    return 120, "2026-10-01 10:00:00.000000", "Author", "Blurb"
+  return calls, fetch_async
+
+def novel(id):
+  conn = db.get_db_conn()
+  row = conn.execute("SELECT onlinechap, localchap, author FROM novels WHERE id = ?", (id,)).fetchone()
+  conn.close()
+  return row
+
+def test_add_fetches_through_the_async_source(client, monkeypatch):
+  calls, fetch_async = fake_fetch()
+  monkeypatch.setattr(sources.SOURCES["webnovel"], "fetch_async", fetch_async)
+  body = client.post("/add", data={"name": "Dragon King", "url": URL, "source": "webnovel"}).get_json()
+  assert body["status"] == "success"
+  assert calls == ["12345678901"]
+  conn = db.get_db_conn()
+  assert conn.execute("SELECT name, onlinechap, author FROM novels").fetchall() == [("Dragon King", 120, "Author")]
+  conn.close()
+
+def test_update_reads_the_epub_while_the_request_is_out(client, monkeypatch):
+  [id] = add_novels([("Dragon King", URL, "webnovel", "dragon.epub")])
+  _, fetch_async = fake_fetch(0.2)
+  monkeypatch.setattr(sources.SOURCES["webnovel"], "fetch_async", fetch_async)
+  monkeypatch.setattr(app, "extract_local_chap", lambda path: time.sleep(0.2) or 90)
+
+  started = time.monotonic()
+  body = client.get(f"/update/{id}", query_string={"name": "Dragon King", "url": URL, "source": "webnovel",
+                                                   "filepath": "dragon.epub"}).get_json()
+  assert time.monotonic() - started < 0.35
+  assert body["status"] == "success"
+  assert novel(id) == (120, 90, "Author")
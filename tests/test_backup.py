@@ -0,0 +1,55 @@
+import io
+import pytest
+import db
+from backup import EXPORT_FIELDS, export_chunks, import_stream
+
+NOVELS = [
+  {"name": "Lord of the Mysteries", "url": "https://www.webnovel.com/book/lord-of-the-mysteries_11022733006234505",
+   "source": "webnovel", "localchap": 1394, "onlinechap": 1432, "status": "Completed"},
+  {"name": "Überlänge, \"quoted\"", "description": "Two\nlines, with a comma", "localchap": 3.5, "notes": "ünïcode"},
+  {"name": "Local Only", "filepath": "Local_Only.epub", "epub_exists": "1"},
+]
+
+def all_novels():
+  conn = db.get_db_conn()
+  rows = conn.execute(f"SELECT {', '.join(EXPORT_FIELDS)} FROM novels ORDER BY id").fetchall()
+  conn.close()
+  return rows
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_export_import_round_trip(library, fmt):
+  conn = db.get_db_conn()
+  with conn:
+    for novel in NOVELS:
+      conn.execute(f"INSERT INTO novels ({', '.join(novel)}) VALUES ({', '.join('?' * len(novel))})", list(novel.values()))
+    db.update_novel(conn, 2, {"onlinechap": 9})
+  conn.close()
+  before = all_novels()
+
+  exported = "".join(export_chunks(fmt)).encode("utf-8")
+  conn = db.get_db_conn()
+  with conn:
+    conn.execute("DELETE FROM novels")
+  conn.close()
+
+  result = import_stream(io.BytesIO(exported), fmt)
+  assert result == {"imported": len(NOVELS), "skipped": 0, "errors": []}
+  assert all_novels() == before
+
+  # Importing the same file again updates the rows instead of adding them
+  assert import_stream(io.BytesIO(exported), fmt)["imported"] == len(NOVELS)
+  assert all_novels() == before
+
+def test_import_skips_bad_rows(library):
+  data = b"\n".join([
+    b'{"id": 5, "name": "First", "localchap": "12"}',
+    b'not json',
+    b'{"id": 5, "name": "Second"}',
+    b'{"name": "No number", "onlinechap": "many"}',
+    b'{"url": "https://example.com/no-name"}',
+  ])
+  result = import_stream(io.BytesIO(data), "ndjson")
+  assert result["imported"] == 2
+  assert result["skipped"] == 3
+  assert [e.split(":")[0] for e in result["errors"]] == ["line 2", "line 4", "line 5"]
+  assert [row[:2] + (row[7],) for row in all_novels()] == [(5, "Second", 12.0)]
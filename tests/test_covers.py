@@ -0,0 +1,86 @@
+import io, threading
+from pathlib import Path
+import pytest
+import db
+from covers import store_cover
+from conftest import add_novels
+
+Image = pytest.importorskip("PIL.Image")
+
+def png(color):
+  out = io.BytesIO()
+  Image.new("RGB", (300, 450), color).save(out, "PNG")
+  return out.getvalue()
+
+def test_unversioned_cover_is_revalidated(client):
+  db.save_setting("COVER_PATH", "covers/")
+  assert store_cover("book.webp", png("red")) == "book.webp"
+  first = client.get("/cover/book.webp")
+  assert first.status_code == 200
+  assert "no-cache" in first.headers["Cache-Control"]
+  assert "max-age" not in first.headers["Cache-Control"]
+  etag = first.headers["ETag"]
+  assert client.get("/cover/book.webp", headers={"If-None-Match": etag}).status_code == 304
+
+  # New bytes under the same name: same URL, new ETag
+  store_cover("book.webp", png("blue"))
+  second = client.get("/cover/book.webp", headers={"If-None-Match": etag})
+  assert second.status_code == 200
+  assert second.headers["ETag"] != etag
+
+def test_thumbnail_by_size(client):
+  db.save_setting("COVER_PATH", "covers/")
+  store_cover("book.webp", png("green"))
+  resp = client.get("/cover/book.webp?size=80")
+  assert resp.status_code == 200
+  assert Image.open(io.BytesIO(resp.data)).width == 80
+  assert client.get("/cover/missing.webp").status_code == 404
+
+def test_concurrent_stores_of_the_same_image(client):
+  db.save_setting("COVER_PATH", "covers/")
+  data = png("purple")
+  results = []
+  def store(n):
+    results.append(store_cover(f"book{n}.webp", data))
+  threads = [threading.Thread(target=store, args=(n,)) for n in range(8)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  assert sorted(results) == sorted(f"book{n}.webp" for n in range(8))
+  conn = db.get_db_conn()
+  assert conn.execute("SELECT COUNT(*) FROM covers WHERE failed = 0").fetchone()[0] == 8
+  conn.close()
+  assert not list(Path("covers").rglob("*.tmp"))
+
+def test_undecodable_cover_is_remembered(client):
+  db.save_setting("COVER_PATH", "covers/")
+  assert store_cover("broken.webp", b"not an image") == ""
+  conn = db.get_db_conn()
+  assert conn.execute("SELECT failed FROM covers WHERE cover_id='broken.webp'").fetchone()[0] == 1
+  conn.close()
+
+def test_versioned_cover_url_is_immutable(client):
+  db.save_setting("COVER_PATH", "covers/")
+  store_cover("book.webp", png("red"))
+  novel_id, = add_novels([("Book", "", "local", "book.epub")])
+  conn = db.get_db_conn()
+  with conn:
+    db.update_novel(conn, novel_id, {"cover_path": "book.webp"})
+  conn.close()
+  listing = client.get("/api/novels")
+  version = listing.get_json()["data"][0]["cover_version"]
+  assert version
+
+  for query in ("", "&size=160"):
+    resp = client.get(f"/cover/book.webp?v={version}{query}")
+    assert resp.status_code == 200
+    assert "immutable" in resp.headers["Cache-Control"]
+    assert f"max-age={365 * 24 * 3600}" in resp.headers["Cache-Control"]
+
+  # Replaced: the row now carries the new hash, the old URL is only revalidated
+  store_cover("book.webp", png("blue"))
+  relisted = client.get("/api/novels", headers={"If-None-Match": listing.headers["ETag"]})
+  assert relisted.status_code == 200
+  assert relisted.get_json()["data"][0]["cover_version"] != version
+  assert "no-cache" in client.get(f"/cover/book.webp?v={version}").headers["Cache-Control"]
@@ -0,0 +1,23 @@
+import duplicates
+from conftest import add_novels
+
+def test_duplicates_found_and_updated_incrementally(library, monkeypatch):
+  monkeypatch.setattr(duplicates, "_index", duplicates.TitleIndex())
+  monkeypatch.setattr(duplicates, "_index_version", None)
+  ids = add_novels([
+    ("Martial Peak", "", "local", "martial_peak.epub"),
+    ("Martial Peak (Completed)", "", "local", "mp_full.epub"),
+    ("Shadow Slave", "https://www.webnovel.com/book/shadow-slave_22196546206090805", "webnovel", "ss.epub"),
+    ("Overgeared 2", "", "local", "og2.epub"),
+    ("Overgeared 3", "", "local", "og3.epub"),
+  ])
+  assert duplicates.refresh_duplicates() == len(ids)
+  pairs = {(p["a"]["id"], p["b"]["id"]): p["reason"] for p in duplicates.duplicate_report()}
+  assert pairs == {(ids[0], ids[1]): "title"}
+
+  # Only the new novel is scored on the next run, and nothing at all after that
+  new_id, = add_novels([("Shadow Slave.", "https://www.webnovel.com/book/22196546206090805", "", "copy.epub")])
+  assert duplicates.refresh_duplicates() == 1
+  assert duplicates.refresh_duplicates() == 0
+  pairs = {(p["a"]["id"], p["b"]["id"]): p["reason"] for p in duplicates.duplicate_report()}
+  assert pairs[(ids[2], new_id)] == "book_id"
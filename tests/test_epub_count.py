@@ -0,0 +1,87 @@
+import zipfile
+import pytest
+from ebooklib import epub
+from scraper import count_epub_chapters_fast, epub_count_chapters, parse_epub
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+# (title, children) per TOC entry, children None for a link. "Volume" and titles without
+# "chapter" are not counted, sections only through their children.
+FLAT_TOC = [("Prologue", None), ("Chapter 1", None), ("Chapter 2", None), ("Afterword", None), ("Chapter 3", None)]
+NESTED_TOC = [
+  ("Chapter 0: Intro", None),
+  ("Volume 1", [("Chapter 1", None), ("Chapter 2", None), ("Volume 1 Illustrations", None)]),
+  ("Book Two", [
+    ("Volume 2", [("Chapter 3", None), ("Chapter 4", None)]),
+    ("Chapter 5", None),
+  ]),
+  ("Side stories", [("Extra Chapter", None)]),
+]
+
+def nav_list(toc):
+  items = []
+  for title, children in toc:
+    if children is None:
+      items.append(f'<li><a href="c1.xhtml">{title}</a></li>')
+    else:
+      items.append(f"<li><span>{title}</span>{nav_list(children)}</li>")
+  return f"<ol>{''.join(items)}</ol>"
+
+def ncx_points(toc, prefix="p"):
+  points = []
+  for n, (title, children) in enumerate(toc):
+    inner = ncx_points(children, f"{prefix}{n}-") if children else ""
+    points.append(f'<navPoint id="{prefix}{n}"><navLabel><text>{title}</text></navLabel>'
+                  f'<content src="c1.xhtml"/>{inner}</navPoint>')
+  return "".join(points)
+
+def write_book(path, toc, nav=True, ncx=True, ncx_points_xml=None):
+  """A minimal EPUB with a nav.xhtml and/or toc.ncx table of contents for toc."""
+  manifest = ['<item id="c1" href="c1.xhtml" media-type="application/xhtml+xml"/>']
+  files = {"c1.xhtml": '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>c</title></head><body><p>text</p></body></html>'}
+  if nav:
+    manifest.append('<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>')
+    files["nav.xhtml"] = f"""<?xml version="1.0" encoding="utf-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head><title>toc</title></head><body><nav epub:type="toc" id="toc">{nav_list(toc)}</nav></body></html>"""
+  if ncx:
+    manifest.append('<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>')
+    files["toc.ncx"] = f"""<?xml version="1.0" encoding="utf-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1"><head/><docTitle><text>T</text></docTitle>
+<navMap>{ncx_points_xml if ncx_points_xml is not None else ncx_points(toc)}</navMap></ncx>"""
+  opf = f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="id">test</dc:identifier><dc:title>Test Book</dc:title><dc:language>en</dc:language>
+  </metadata>
+  <manifest>{"".join(manifest)}</manifest>
+  <spine{' toc="ncx"' if ncx else ""}><itemref idref="c1"/></spine>
+</package>"""
+  with zipfile.ZipFile(path, "w") as zf:
+    zf.writestr("mimetype", "application/epub+zip")
+    zf.writestr("META-INF/container.xml", CONTAINER_XML)
+    zf.writestr("OEBPS/content.opf", opf)
+    for name, data in files.items():
+      zf.writestr(f"OEBPS/{name}", data)
+  return str(path)
+
+def ebooklib_count(path):
+  return epub_count_chapters(epub.read_epub(path).toc)
+
+@pytest.mark.parametrize("toc, expected", [(FLAT_TOC, 3), (NESTED_TOC, 7)], ids=["flat", "nested"])
+@pytest.mark.parametrize("nav, ncx", [(True, False), (False, True), (True, True)], ids=["nav", "ncx", "both"])
+def test_fast_count_matches_ebooklib(tmp_path, toc, expected, nav, ncx):
+  path = write_book(tmp_path / "book.epub", toc, nav=nav, ncx=ncx)
+  assert count_epub_chapters_fast(path) == ebooklib_count(path) == expected
+  assert parse_epub(path)["chapters"] == expected
+
+def test_malformed_toc_falls_back_to_ebooklib(tmp_path):
+  """A navPoint without a label stops the fast path, ebooklib still counts the rest."""
+  points = '<navPoint id="a"><content src="c1.xhtml"/></navPoint>' + ncx_points([("Chapter 2", None)])
+  path = write_book(tmp_path / "book.epub", [], nav=False, ncx_points_xml=points)
+  with pytest.raises(ValueError):
+    count_epub_chapters_fast(path)
+  assert parse_epub(path)["chapters"] == ebooklib_count(path) == 1
@@ -0,0 +1,93 @@
+import asyncio, os, threading, time
+import httpclient
+
+def age(path, seconds):
+  past = time.time() - seconds
+  os.utime(path, (past, past))
+
+def store(url, body=b"body"):
+  httpclient._write_cache(url, {"status": 200, "headers": {"ETag": body.decode()}, "fetched_at": time.time()}, body)
+
+def test_prune_drops_old_entries_only(library):
+  store("https://example.com/old")
+  store("https://example.com/new")
+  old = httpclient._cache_path("https://example.com/old")
+  age(old, 7200)
+  leftover = os.path.join(os.path.dirname(old), "crashed.tmp")
+  open(leftover, "wb").close()
+  age(leftover, 7200)
+
+  assert httpclient.prune_cache(3600) == 1
+  assert not os.path.exists(old) and not os.path.exists(leftover)
+  assert httpclient._read_cache("https://example.com/new")[1] == b"body"
+
+def test_writes_prune_at_most_every_interval(library, monkeypatch):
+  calls = []
+  monkeypatch.setattr(httpclient, "prune_cache", lambda: calls.append(1))
+  monkeypatch.setattr(httpclient, "_next_prune", 0.0)
+  for n in range(3):
+    store(f"https://example.com/{n}")
+  assert len(calls) == 1
+
+def test_concurrent_writes_of_one_url_keep_entries_whole(library):
+  url = "https://example.com/shared"
+  errors = []
+
+  def write(n):
+    try:
+      for _ in range(20):
+        store(url, str(n).encode() * 1000)
+    except Exception as e:
+      errors.append(e)
+
+  threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  assert errors == []
+  meta, body = httpclient._read_cache(url)
+  # Metadata and body come from the same write
+  assert body == meta["headers"]["ETag"].encode()
+  assert [f for f in os.listdir(os.path.dirname(httpclient._cache_path(url))) if f.endswith(".tmp")] == []
+
+def test_cover_downloads_go_through_the_source(library, monkeypatch):
+  import scraper, sources
+  from httpclient import CachedResponse
+  fetched, stored = [], []
+  def fake_get(url, **kwargs):
+    fetched.append(url)
+    return CachedResponse(url, 200, b"image", {})
+  monkeypatch.setattr(sources.SOURCES["webnovel"], "get", fake_get)
+  monkeypatch.setattr(scraper, "store_cover", lambda cover_id, data: stored.append(data) or cover_id)
+
+  meta = {"source": "webnovel", "url": "https://www.webnovel.com/book/12345678901", "cover_id": "12345678901.webp"}
+  assert scraper.extract_epub_cover("book.epub", "online", meta) == "12345678901.webp"
+  assert fetched == [sources.SOURCES["webnovel"].cover_url("12345678901")]
+  assert stored == [b"image"]
+
+def test_async_get_retries_caches_and_revalidates(library, monkeypatch):
+  import httpx
+  answers = [httpx.Response(503), httpx.Response(200, content=b"fresh", headers={"ETag": '"v1"'}),
+             httpx.Response(304)]
+  sent = []
+  def handler(request):
+    sent.append(request.headers.get("If-None-Match"))
+    return answers.pop(0)
+  client = httpx.AsyncClient
+  monkeypatch.setattr(httpx, "AsyncClient", lambda: client(transport=httpx.MockTransport(handler)))
+  monkeypatch.setattr(httpclient, "RETRY_BACKOFF", 0)
+  throttled = []
+  async def throttle():
+    throttled.append(1)
+
+  url = "https://example.com/async"
+  resp = asyncio.run(httpclient.async_http_get(url, ttl=60, throttle=throttle))
+  assert (resp.status_code, resp.content, resp.from_cache) == (200, b"fresh", False)
+  assert len(throttled) == 2
+
+  # Within the TTL nothing goes out, after it the entry is revalidated
+  assert asyncio.run(httpclient.async_http_get(url, ttl=60, throttle=throttle)).from_cache
+  resp = asyncio.run(httpclient.async_http_get(url, ttl=0, throttle=throttle))
+  assert (resp.status_code, resp.content, resp.from_cache) == (200, b"fresh", True)
+  assert sent == [None, None, '"v1"'] and len(throttled) == 3
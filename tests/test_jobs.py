@@ -0,0 +1,43 @@
+import jobs
+
+def test_queued_job_runs_and_reports(library, monkeypatch):
+  monkeypatch.setattr(jobs, "start_worker", lambda: None)
+  seen = []
+
+  def handler(params, report):
+    report.start(len(params["names"]))
+    for name in params["names"]:
+      seen.append(name)
+      report.row(None, name, error="broken" if name == "b" else None)
+    return "done", "success"
+
+  monkeypatch.setitem(jobs.JOB_HANDLERS, "test_job", handler)
+  job_id = jobs.submit_job("test_job", {"names": ["a", "b", "c"]})
+  assert jobs.get_job(job_id)["status"] == "queued"
+
+  assert jobs.run_next_job() is True
+  assert jobs.run_next_job() is False
+  job = jobs.get_job(job_id)
+  assert seen == ["a", "b", "c"]
+  assert (job["status"], job["total"], job["done"], job["errors"]) == ("done", 3, 3, 1)
+  assert [e["message"] for e in job["events"]] == ["broken"]
+
+def test_failing_job_is_marked_error(library, monkeypatch):
+  monkeypatch.setattr(jobs, "start_worker", lambda: None)
+  def handler(params, report):
+    raise RuntimeError("boom")
+  monkeypatch.setitem(jobs.JOB_HANDLERS, "test_fail", handler)
+  job_id = jobs.submit_job("test_fail", {})
+  assert jobs.run_next_job() is True
+  job = jobs.get_job(job_id)
+  assert (job["status"], job["message"]) == ("error", "boom")
+
+def test_event_stream_ignores_bad_resume_ids(client, monkeypatch):
+  monkeypatch.setattr(jobs, "start_worker", lambda: None)
+  monkeypatch.setitem(jobs.JOB_HANDLERS, "test_job", lambda params, report: ("done", "success"))
+  job_id = jobs.submit_job("test_job", {})
+  jobs.run_next_job()
+  for headers, query in (({"Last-Event-ID": "abc"}, ""), ({}, "?after=xyz")):
+    resp = client.get(f"/jobs/{job_id}/events{query}", headers=headers)
+    assert resp.status_code == 200
+    assert "event: end" in resp.get_data(as_text=True)
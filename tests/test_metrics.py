@@ -0,0 +1,34 @@
+import os, subprocess, sys
+import db, metrics
+
+OTHER_WORKER = """
+import sys, db, metrics
+db.DEFAULT_DB = sys.argv[1]
+metrics.STAGE_SECONDS.observe(2.0, stage="epub", detail="other worker")
+metrics.flush_metrics()
+"""
+
+def stage_lines(text, detail):
+  return [line for line in text.splitlines() if f'detail="{detail}"' in line]
+
+def test_metrics_add_up_all_workers(library):
+  metrics.STAGE_SECONDS.observe(0.02, stage="epub", detail="other worker")
+  metrics.flush_metrics()
+  subprocess.run([sys.executable, "-c", OTHER_WORKER, db.DEFAULT_DB], check=True, cwd=os.path.dirname(os.path.abspath(db.__file__)))
+  metrics.STAGE_SECONDS.observe(0.5, stage="epub", detail="other worker")  # not flushed yet
+
+  lines = stage_lines(metrics.render_metrics(), "other worker")
+  assert 'novel_tracker_stage_seconds_count{stage="epub",detail="other worker"} 3' in lines
+  assert 'novel_tracker_stage_seconds_sum{stage="epub",detail="other worker"} 2.52' in lines
+  assert 'novel_tracker_stage_seconds_bucket{stage="epub",detail="other worker",le="0.025"} 1' in lines
+  assert 'novel_tracker_stage_seconds_bucket{stage="epub",detail="other worker",le="+Inf"} 3' in lines
+
+def test_row_iteration_counts_as_sql_time(library, monkeypatch):
+  calls = []
+  monkeypatch.setattr(db, "add_time", lambda stage, seconds: calls.append(stage))
+  conn = db.get_db_conn()
+  cursor = conn.execute("WITH n(x) AS (VALUES (1), (2), (3)) SELECT x FROM n")
+  executed = len(calls)
+  assert [row[0] for row in cursor] == [1, 2, 3]
+  conn.close()
+  assert len(calls) - executed == 4  # three rows and the end of the rows
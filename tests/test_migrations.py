@@ -0,0 +1,38 @@
+import sqlite3
+import db
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+  conn = sqlite3.connect(tmp_path / "novels.db")
+  assert db.migrate(conn) == len(db.MIGRATIONS)
+  assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+  settings = dict(conn.execute("SELECT key, value FROM settings"))
+  assert settings.keys() >= db.DEFAULT_SETTINGS.keys()
+
+  # Running again changes nothing and keeps edited settings
+  conn.execute("UPDATE settings SET value='7' WHERE key='BULK_WORKERS'")
+  conn.commit()
+  assert db.migrate(conn) == len(db.MIGRATIONS)
+  assert conn.execute("SELECT value FROM settings WHERE key='BULK_WORKERS'").fetchone()[0] == "7"
+  conn.close()
+
+def test_upgrade_keeps_novels(tmp_path):
+  """A database made by the first schema version upgrades in place."""
+  conn = sqlite3.connect(tmp_path / "novels.db")
+  for step in db.MIGRATIONS[0]:
+    conn.execute(step)
+  conn.execute("PRAGMA user_version = 1")
+  conn.execute("INSERT INTO novels (name, localchap, onlinechap, latestchaptime) VALUES ('Old Novel', 10, 25, '2024-01-02 03:04:05.000000')")
+  conn.commit()
+
+  assert db.migrate(conn) == len(db.MIGRATIONS)
+  row = conn.execute("SELECT name, chapter_gap, latestchap_day IS NOT NULL FROM novels").fetchone()
+  assert row == ("Old Novel", 15, 1)
+  # The search index was filled from the existing rows
+  assert conn.execute("SELECT rowid FROM novels_fts WHERE novels_fts MATCH 'old'").fetchall() == [(1,)]
+
+  # Writes through update_novel() are tracked like on a new database
+  assert db.update_novel(conn, 1, {"onlinechap": 30}) == 1
+  conn.commit()
+  assert conn.execute("SELECT updated_count FROM novels").fetchone()[0] == 1
+  assert conn.execute("SELECT field, old_value, new_value FROM novel_changes").fetchall() == [("onlinechap", 25.0, 30)]
+  conn.close()
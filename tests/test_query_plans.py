@@ -0,0 +1,9 @@
+import sqlite3
+import db
+
+def test_hot_queries_use_indexes(tmp_path):
+  """Every HOT_QUERIES entry is served by an index on a freshly migrated database."""
+  conn = sqlite3.connect(tmp_path / "novels.db")
+  assert db.migrate(conn) == len(db.MIGRATIONS)
+  assert db.check_query_plans(conn) == []
+  conn.close()
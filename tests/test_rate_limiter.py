@@ -0,0 +1,76 @@
+import asyncio, threading, time
+import sources
+from sources import HostRateLimiter
+
+class FakeClock:
+  """time.monotonic/time.sleep stand-in: sleeping only moves the clock forward."""
+  def __init__(self):
+    self.now = 100.0
+    self.sleeps = []
+
+  def monotonic(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.sleeps.append(seconds)
+    self.now += seconds
+
+def test_calls_to_one_host_are_spaced_by_the_delay(monkeypatch):
+  clock = FakeClock()
+  monkeypatch.setattr(sources, "time", clock)
+  limiter = HostRateLimiter()
+
+  starts = []
+  for _ in range(3):
+    limiter.wait("webnovel", (2, 2))
+    starts.append(clock.now)
+  assert starts == [100.0, 102.0, 104.0]
+
+  # Another host has its own budget, time already passed counts toward the gap
+  limiter.wait("other", (2, 2))
+  assert clock.now == 104.0
+  clock.now += 5
+  limiter.wait("webnovel", (2, 2))
+  assert clock.sleeps == [2.0, 2.0]
+
+def test_threads_share_one_budget_per_host():
+  limiter = HostRateLimiter()
+  starts = []
+  lock = threading.Lock()
+
+  def call():
+    limiter.wait("webnovel", (0.05, 0.05))
+    with lock:
+      starts.append(time.monotonic())
+
+  threads = [threading.Thread(target=call) for _ in range(4)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  starts.sort()
+  assert all(b - a >= 0.04 for a, b in zip(starts, starts[1:]))
+
+def test_async_waits_share_the_budget_without_blocking_the_loop():
+  limiter = HostRateLimiter()
+  limiter.wait("webnovel", (0.05, 0.05))  # a worker thread took the first slot
+
+  async def run():
+    starts, ticks = [], []
+    async def call():
+      await limiter.wait_async("webnovel", (0.05, 0.05))
+      starts.append(time.monotonic())
+    async def ticker():
+      while len(starts) < 3:
+        ticks.append(1)
+        await asyncio.sleep(0.01)
+    await asyncio.gather(call(), call(), call(), ticker())
+    return starts, ticks
+
+  begun = time.monotonic()
+  starts, ticks = asyncio.run(run())
+  starts.sort()
+  assert starts[0] - begun >= 0.04
+  assert all(b - a >= 0.04 for a, b in zip(starts, starts[1:]))
+  # The loop kept running other tasks while the calls slept
+  assert len(ticks) >= 10
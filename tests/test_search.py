@@ -0,0 +1,36 @@
+import pytest
+import db
+from app import fts_query
+from conftest import add_novels
+
+def set_fields(novel_id, **fields):
+  conn = db.get_db_conn()
+  with conn:
+    db.update_novel(conn, novel_id, fields)
+  conn.close()
+
+def test_fts_query_quotes_every_word():
+  assert fts_query("drag king") == '"drag"* "king"*'
+  assert fts_query("author:smith dragon") == 'author : "smith"* "dragon"*'
+  # Not a column of the index, so both words are searched everywhere
+  assert fts_query("foo:bar") == '"foo"* "bar"*'
+  assert fts_query('"" * - : ()') == ""
+
+@pytest.mark.parametrize("q", [
+  '"unterminated', 'dragon"', "AND", "dragon OR", "NOT king", "NEAR(dragon king)", "(dragon",
+  "dragon*", "-dragon", "^dragon", "name:", ":dragon", "author:", "rowid:1", "dragon's", "a + b", "{name author}:x",
+])
+def test_operators_and_quotes_do_not_break_search(client, q):
+  add_novels([("Dragon King's Return", "", "local", "dk.epub")])
+  resp = client.get("/api/search", query_string={"q": q})
+  assert resp.status_code == 200
+  assert resp.get_json()["total"] in (0, 1)
+
+def test_search_ranks_name_matches_first(client):
+  first, second = add_novels([("Quiet Mountain", "", "local", "a.epub"), ("Dragon Path", "", "local", "b.epub")])
+  set_fields(first, description="A story with one dragon in it.")
+  set_fields(second, author="Someone")
+  body = client.get("/api/search?q=drag").get_json()
+  assert [r["id"] for r in body["results"]] == [second, first]
+  assert "<mark>" in body["results"][1]["snippet"]
+  assert client.get("/api/search?q=author:someone").get_json()["total"] == 1
@@ -0,0 +1,29 @@
+import db
+
+def settings_version():
+  conn = db.get_db_conn()
+  value = conn.execute("SELECT value FROM change_counter WHERE name='settings'").fetchone()[0]
+  conn.close()
+  return value
+
+def write_behind_cache(key, value):
+  """A write from another process: straight to the table, the cached copy is not reloaded."""
+  conn = db.get_db_conn()
+  with conn:
+    conn.execute("UPDATE settings SET value=? WHERE key=?", (value, key))
+  conn.close()
+
+def test_runtime_state_does_not_invalidate_settings(library):
+  before = settings_version()
+  for key in db.STATE_SETTINGS:
+    write_behind_cache(key, "123")
+  assert settings_version() == before
+  assert db.get_state() == {key: "123" for key in db.STATE_SETTINGS}
+
+def test_other_process_changes_are_picked_up(library, monkeypatch):
+  assert db.get_setting("BULK_WORKERS") == 4
+  before = settings_version()
+  write_behind_cache("BULK_WORKERS", "9")
+  assert settings_version() == before + 1
+  monkeypatch.setattr(db, "_settings_checked", float("-inf"))
+  assert db.get_setting("BULK_WORKERS") == 9